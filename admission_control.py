@@ -0,0 +1,147 @@
+import os
+import re
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+BUSY_MESSAGE = ":hourglass_flowing_sand: Estoy ocupada atendiendo otras solicitudes. Por favor, inténtalo de nuevo en un momento."
+
+REMINDER_REQUEST_PATTERN = re.compile(r'recu[eé]rda|recordatorio', re.IGNORECASE)
+
+
+def message_priority(text: str, is_dm: bool) -> int:
+    # Los DMs y las solicitudes de recordatorio se atienden antes que la conversación general
+    if is_dm or REMINDER_REQUEST_PATTERN.search(text or ''):
+        return PRIORITY_HIGH
+    return PRIORITY_NORMAL
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def idle(self, now: float) -> bool:
+        # Tras un vaciado completo sin uso el cubo está lleno: equivale a uno nuevo y se puede descartar
+        return now - self.updated >= self.capacity / self.rate
+
+    def try_take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class AdmissionController:
+    """Controla qué mensajes entran a procesamiento con límites por usuario y prioridades."""
+
+    def __init__(self, workers: int = None, max_queue: int = None, user_concurrency: int = None,
+                 user_rate_per_minute: float = None, user_burst: int = None):
+        self.logger = logging.getLogger(__name__)
+        self.workers = workers or int(os.getenv('ADMISSION_WORKERS', '4'))
+        self.max_queue = max_queue or int(os.getenv('ADMISSION_MAX_QUEUE', '20'))
+        self.user_concurrency = user_concurrency or int(os.getenv('ADMISSION_USER_CONCURRENCY', '1'))
+        self.user_rate = (user_rate_per_minute or float(os.getenv('ADMISSION_USER_RATE_PER_MINUTE', '10'))) / 60
+        self.user_burst = user_burst or int(os.getenv('ADMISSION_USER_BURST', '5'))
+        
+        self._queues = {PRIORITY_HIGH: deque(), PRIORITY_NORMAL: deque()}
+        self._condition = threading.Condition()
+        self._active = {}
+        self._buckets = {}
+        self._last_sweep = time.monotonic()
+        self.admitted = 0
+        self.rejected_busy = 0
+        self.rejected_rate = 0
+        self.completed = 0
+        
+        for number in range(self.workers):
+            worker = threading.Thread(target=self._worker, name=f"admission-worker-{number}", daemon=True)
+            worker.start()
+
+    def submit(self, user_id: str, priority: int, fn) -> bool:
+        with self._condition:
+            self._sweep_buckets()
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+            if not bucket.try_take():
+                self.rejected_rate += 1
+                self.logger.warning(f"Usuario {user_id} superó su límite de mensajes")
+                return False
+            
+            if self._queued() >= self.max_queue:
+                self.rejected_busy += 1
+                self.logger.warning("Cola de procesamiento saturada, rechazando mensaje")
+                return False
+            
+            # Conservar el contexto del llamador (trazas, etc.) en el hilo de trabajo
+            self._queues[priority].append((user_id, fn, contextvars.copy_context()))
+            self.admitted += 1
+            self._condition.notify()
+            return True
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                'queued': self._queued(),
+                'active': sum(self._active.values()),
+                'admitted': self.admitted,
+                'rejected_busy': self.rejected_busy,
+                'rejected_rate': self.rejected_rate,
+                'completed': self.completed,
+                'tracked_users': len(self._buckets)
+            }
+
+    def _sweep_buckets(self) -> None:
+        # Como mucho una vez por periodo de recarga, para no recorrer todos los cubos en cada mensaje
+        now = time.monotonic()
+        if now - self._last_sweep < self.user_burst / self.user_rate:
+            return
+        self._last_sweep = now
+        for user_id in [user_id for user_id, bucket in self._buckets.items() if bucket.idle(now)]:
+            del self._buckets[user_id]
+
+    def _queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _next_item(self):
+        # Primer elemento de la prioridad más alta cuyo usuario no está en su límite de concurrencia
+        for priority in sorted(self._queues):
+            queue = self._queues[priority]
+            for index, item in enumerate(queue):
+                if self._active.get(item[0], 0) < self.user_concurrency:
+                    del queue[index]
+                    return item
+        return None
+
+    def _worker(self) -> None:
+        while True:
+            with self._condition:
+                item = self._next_item()
+                while item is None:
+                    self._condition.wait()
+                    item = self._next_item()
+                user_id, fn, context = item
+                self._active[user_id] = self._active.get(user_id, 0) + 1
+            
+            try:
+                context.run(fn)
+            except Exception as e:
+                self.logger.error(f"Error al procesar mensaje admitido: {str(e)}")
+            finally:
+                with self._condition:
+                    self._active[user_id] -= 1
+                    if not self._active[user_id]:
+                        del self._active[user_id]
+                    self.completed += 1
+                    self._condition.notify_all()
@@ -0,0 +1,337 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pytz
+
+try:
+    from google.cloud import bigquery_storage_v1
+    from google.cloud.bigquery_storage_v1 import types as storage_types, writer as storage_writer
+    from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+    from google.api_core import exceptions as api_exceptions
+except ImportError:  # google-cloud-bigquery-storage es opcional: sin él se usa insert_rows_json
+    bigquery_storage_v1 = None
+
+
+class OffsetAlreadyWritten(Exception):
+    """El stream ya tiene filas en ese offset: un intento anterior sí se escribió."""
+
+
+class InMemoryWriteBackend:
+    """Backend en memoria con la semántica de offsets de un stream COMMITTED, para pruebas."""
+
+    def __init__(self):
+        self.append_calls = 0
+        # Fallos simulados: fail_next falla sin escribir; lose_ack_next escribe y luego falla
+        self.fail_next = 0
+        self.lose_ack_next = 0
+        self._tables = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def open_stream(self, table_ref: str) -> str:
+        with self._lock:
+            name = f"{table_ref}/streams/{len(self._streams)}"
+            self._streams[name] = (table_ref, [])
+            self._tables.setdefault(table_ref, [])
+            return name
+
+    def append(self, stream: str, rows: List[dict], offset: int) -> None:
+        with self._lock:
+            self.append_calls += 1
+            if self.fail_next:
+                self.fail_next -= 1
+                raise ConnectionError("fallo simulado del stream")
+            table_ref, committed = self._streams[stream]
+            if offset < len(committed):
+                raise OffsetAlreadyWritten(f"offset {offset} ya escrito en {stream}")
+            if offset > len(committed):
+                raise ValueError(f"offset {offset} fuera de rango en {stream} ({len(committed)})")
+            committed.extend(rows)
+            self._tables[table_ref].extend(rows)
+            if self.lose_ack_next:
+                self.lose_ack_next -= 1
+                raise ConnectionError("confirmación perdida")
+
+    def rows(self, table_ref: str) -> List[dict]:
+        with self._lock:
+            return list(self._tables.get(table_ref, []))
+
+
+class LegacyInsertBackend:
+    """insert_rows_json (streaming insert) con insertId derivado del offset para deduplicar reintentos."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def open_stream(self, table_ref: str) -> str:
+        # El sufijo evita que un proceso nuevo repita los insertId del anterior
+        return f"{table_ref}#{uuid.uuid4().hex[:12]}"
+
+    def append(self, stream: str, rows: List[dict], offset: int) -> None:
+        table_ref, prefix = stream.split('#')
+        row_ids = [f"{prefix}-{offset + i}" for i in range(len(rows))]
+        errors = self.client.insert_rows_json(table_ref, rows, row_ids=row_ids)
+        if errors:
+            raise Exception(errors)
+
+
+def _proto_for_schema(schema):
+    # Mensaje proto2 equivalente al esquema de la tabla; TIMESTAMP viaja en microsegundos (INT64)
+    field_types = {
+        'TIMESTAMP': descriptor_pb2.FieldDescriptorProto.TYPE_INT64,
+        'INTEGER': descriptor_pb2.FieldDescriptorProto.TYPE_INT64,
+        'INT64': descriptor_pb2.FieldDescriptorProto.TYPE_INT64,
+        'FLOAT': descriptor_pb2.FieldDescriptorProto.TYPE_DOUBLE,
+        'FLOAT64': descriptor_pb2.FieldDescriptorProto.TYPE_DOUBLE,
+        'BOOLEAN': descriptor_pb2.FieldDescriptorProto.TYPE_BOOL,
+        'BOOL': descriptor_pb2.FieldDescriptorProto.TYPE_BOOL,
+    }
+    descriptor = descriptor_pb2.DescriptorProto(name='Row')
+    for number, field in enumerate(schema, start=1):
+        descriptor.field.add(
+            name=field.name,
+            number=number,
+            type=field_types.get(field.field_type, descriptor_pb2.FieldDescriptorProto.TYPE_STRING),
+            label=descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL
+        )
+    file_proto = descriptor_pb2.FileDescriptorProto(name='row.proto', package='rebeca', syntax='proto2')
+    file_proto.message_type.add().CopyFrom(descriptor)
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_proto)
+    message_class = message_factory.GetMessageClass(pool.FindMessageTypeByName('rebeca.Row'))
+    return message_class, descriptor
+
+
+def _timestamp_micros(value) -> int:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = pytz.utc.localize(value)
+    return int(value.timestamp() * 1_000_000)
+
+
+class StorageWriteBackend:
+    """Storage Write API con un stream COMMITTED por tabla; las filas son visibles al confirmar cada append."""
+
+    def __init__(self, client):
+        if bigquery_storage_v1 is None:
+            raise RuntimeError("google-cloud-bigquery-storage no está instalado")
+        self.client = client
+        self._write_client = bigquery_storage_v1.BigQueryWriteClient(
+            credentials=getattr(client, '_credentials', None)
+        )
+        self._streams = {}
+
+    def open_stream(self, table_ref: str) -> str:
+        project, dataset, table = table_ref.split('.')
+        write_stream = self._write_client.create_write_stream(
+            parent=self._write_client.table_path(project, dataset, table),
+            write_stream=storage_types.WriteStream(type_=storage_types.WriteStream.Type.COMMITTED)
+        )
+        schema = self.client.get_table(table_ref).schema
+        message_class, descriptor = _proto_for_schema(schema)
+        template = storage_types.AppendRowsRequest(
+            write_stream=write_stream.name,
+            proto_rows=storage_types.AppendRowsRequest.ProtoData(
+                writer_schema=storage_types.ProtoSchema(proto_descriptor=descriptor)
+            )
+        )
+        self._streams[write_stream.name] = {
+            'template': template,
+            'connection': None,
+            'message_class': message_class,
+            'timestamps': {field.name for field in schema if field.field_type == 'TIMESTAMP'}
+        }
+        return write_stream.name
+
+    def append(self, stream: str, rows: List[dict], offset: int) -> None:
+        state = self._streams[stream]
+        proto_rows = storage_types.ProtoRows()
+        for row in rows:
+            message = state['message_class']()
+            for name, value in row.items():
+                if value is None:
+                    continue
+                setattr(message, name, _timestamp_micros(value) if name in state['timestamps'] else value)
+            proto_rows.serialized_rows.append(message.SerializeToString())
+
+        if state['connection'] is None:
+            state['connection'] = storage_writer.AppendRowsStream(self._write_client, state['template'])
+        request = storage_types.AppendRowsRequest(
+            offset=offset,
+            proto_rows=storage_types.AppendRowsRequest.ProtoData(rows=proto_rows)
+        )
+        try:
+            state['connection'].send(request).result()
+        except api_exceptions.AlreadyExists as e:
+            raise OffsetAlreadyWritten(str(e))
+        except Exception:
+            # La conexión queda inservible tras un error; el stream y sus offsets se conservan
+            state['connection'].close()
+            state['connection'] = None
+            raise
+
+
+class _TableBuffer:
+    __slots__ = ('rows', 'futures', 'first_at', 'stream', 'next_offset')
+
+    def __init__(self):
+        self.rows = []
+        self.futures = []
+        self.first_at = None
+        self.stream = None
+        self.next_offset = 0
+
+
+class BigQueryRowWriter:
+    """Escrituras agrupadas por tabla con flush por tamaño o por tiempo y appends por offset (exactamente una vez)."""
+
+    def __init__(self, backend, batch_rows: int = None, flush_ms: int = None, max_retries: int = 3):
+        self.logger = logging.getLogger(__name__)
+        self.backend = backend
+        self.batch_rows = batch_rows or int(os.getenv('BIGQUERY_WRITE_BATCH_ROWS', '500'))
+        if flush_ms is None:
+            flush_ms = int(os.getenv('BIGQUERY_WRITE_FLUSH_MS', '100'))
+        self.flush_interval = flush_ms / 1000
+        self.max_retries = max_retries
+        self._buffers: Dict[str, _TableBuffer] = {}
+        self._cond = threading.Condition()
+        self._flush_requested = False
+        self._closed = False
+        self._thread = None
+        self._stats = {'rows': 0, 'appends': 0, 'retries': 0, 'failed': 0}
+
+    def append(self, table_ref: str, rows: List[dict]) -> Future:
+        # La escritura se agrupa con las de otros hilos; el Future se resuelve cuando BigQuery la confirma
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("El escritor de BigQuery está cerrado")
+            buffer = self._buffers.setdefault(table_ref, _TableBuffer())
+            if not buffer.rows:
+                buffer.first_at = time.monotonic()
+            buffer.rows.extend(rows)
+            buffer.futures.append(future)
+            self._ensure_thread()
+            self._cond.notify()
+        return future
+
+    def write(self, table_ref: str, rows: List[dict], timeout: float = None) -> None:
+        self.append(table_ref, rows).result(timeout)
+
+    def flush(self, timeout: float = None) -> None:
+        with self._cond:
+            futures = [future for buffer in self._buffers.values() for future in buffer.futures]
+            if not futures:
+                return
+            self._flush_requested = True
+            self._cond.notify()
+        for future in futures:
+            future.exception(timeout)
+
+    def close(self) -> None:
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self._stats, buffered=sum(len(buffer.rows) for buffer in self._buffers.values()))
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="bigquery_writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    ready, wait = [], None
+                    for table_ref, buffer in self._buffers.items():
+                        if not buffer.rows:
+                            continue
+                        remaining = buffer.first_at + self.flush_interval - now
+                        if self._flush_requested or self._closed or len(buffer.rows) >= self.batch_rows or remaining <= 0:
+                            ready.append(table_ref)
+                        else:
+                            wait = remaining if wait is None else min(wait, remaining)
+                    if ready:
+                        break
+                    self._flush_requested = False
+                    if self._closed:
+                        return
+                    self._cond.wait(wait)
+                batches = []
+                for table_ref in ready:
+                    buffer = self._buffers[table_ref]
+                    batches.append((table_ref, buffer, buffer.rows, buffer.futures))
+                    buffer.rows, buffer.futures, buffer.first_at = [], [], None
+            for batch in batches:
+                self._commit(*batch)
+
+    def _commit(self, table_ref: str, buffer: _TableBuffer, rows: List[dict], futures: List[Future]) -> None:
+        # Solo el hilo del escritor toca stream y next_offset, así que los offsets quedan en orden
+        offset = buffer.next_offset
+        sent_to = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                if buffer.stream is None:
+                    buffer.stream = self.backend.open_stream(table_ref)
+                    offset = buffer.next_offset = 0
+                previous, sent_to = sent_to, buffer.stream
+                self.backend.append(buffer.stream, rows, offset)
+                break
+            except OffsetAlreadyWritten as e:
+                # Reintento con el mismo offset en el mismo stream: el intento anterior llegó y no se duplica
+                if previous == buffer.stream:
+                    break
+                # El offset no es de este lote: el stream quedó desfasado y el lote va a uno nuevo
+                buffer.stream = sent_to = None
+                error = str(e)
+            except Exception as e:
+                error = str(e)
+            if attempt < self.max_retries:
+                with self._cond:
+                    self._stats['retries'] += 1
+                time.sleep(min(0.1 * 2 ** attempt, 2))
+        else:
+            # Sin confirmación no se sabe si el lote llegó; el siguiente usa un stream nuevo para no perder filas
+            buffer.stream = None
+            with self._cond:
+                self._stats['failed'] += len(rows)
+            self.logger.error(f"No se pudieron escribir {len(rows)} filas en {table_ref}: {error}")
+            for future in futures:
+                future.set_exception(Exception(error))
+            return
+
+        buffer.next_offset = offset + len(rows)
+        with self._cond:
+            self._stats['rows'] += len(rows)
+            self._stats['appends'] += 1
+        for future in futures:
+            future.set_result(None)
+
+
+def create_row_writer(client, mode: Optional[str] = None) -> BigQueryRowWriter:
+    mode = mode or os.getenv('BIGQUERY_WRITE_MODE', 'storage')
+    if mode == 'storage':
+        if bigquery_storage_v1 is not None:
+            return BigQueryRowWriter(StorageWriteBackend(client))
+        logging.getLogger(__name__).warning(
+            "google-cloud-bigquery-storage no está instalado; se usa insert_rows_json"
+        )
+        mode = 'legacy'
+    if mode == 'legacy':
+        return BigQueryRowWriter(LegacyInsertBackend(client))
+    if mode == 'memory':
+        return BigQueryRowWriter(InMemoryWriteBackend())
+    raise ValueError(f"¡Error! BIGQUERY_WRITE_MODE desconocido: {mode}")
@@ -0,0 +1,127 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from gemini_usage import estimate_tokens
+
+SUMMARY_LINE_CHARS = 160
+ROLE_USER = 'user'
+ROLE_MODEL = 'model'
+
+
+class _Conversation:
+    __slots__ = ('summary', 'turns', 'tokens', 'summary_tokens', 'last_used')
+
+    def __init__(self):
+        self.summary = deque()
+        self.turns = deque()
+        self.tokens = 0
+        self.summary_tokens = 0
+        self.last_used = time.monotonic()
+
+
+class ConversationMemory:
+    """Historial reciente de cada hilo o DM acotado por tokens; los turnos viejos pasan a un resumen."""
+
+    def __init__(self, token_budget: int = None, max_conversations: int = None, idle_ttl: int = None):
+        self.logger = logging.getLogger(__name__)
+        if token_budget is None:
+            token_budget = int(os.getenv('CONVERSATION_TOKEN_BUDGET', '1500'))
+        self.token_budget = token_budget
+        self.summary_budget = token_budget // 4
+        self.max_conversations = max_conversations or int(os.getenv('CONVERSATION_MAX_ACTIVE', '500'))
+        self.idle_ttl = idle_ttl or int(os.getenv('CONVERSATION_IDLE_TTL', '3600'))
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.token_budget > 0
+
+    def history(self, key) -> list:
+        # Turnos en el formato de contenido de Gemini, con el resumen como primer turno
+        if not self.enabled:
+            return []
+        with self._lock:
+            conversation = self._get(key)
+            if conversation is None:
+                return []
+            contents = []
+            if conversation.summary:
+                contents.append({
+                    'role': ROLE_USER,
+                    'parts': ["Resumen de la conversación anterior:\n" + "\n".join(conversation.summary)]
+                })
+                contents.append({'role': ROLE_MODEL, 'parts': ["Entendido."]})
+            contents.extend({'role': role, 'parts': [text]} for role, text, _ in conversation.turns)
+            return contents
+
+    def append(self, key, user_text: str, model_text: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            conversation = self._get(key)
+            if conversation is None:
+                conversation = _Conversation()
+                self._conversations[key] = conversation
+            conversation.last_used = time.monotonic()
+            for role, text in ((ROLE_USER, user_text), (ROLE_MODEL, model_text)):
+                tokens = estimate_tokens(text)
+                conversation.turns.append((role, text, tokens))
+                conversation.tokens += tokens
+            self._compact(conversation)
+            self._evict()
+
+    def clear(self, key) -> None:
+        with self._lock:
+            self._conversations.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'conversations': len(self._conversations),
+                'tokens': sum(c.tokens + c.summary_tokens for c in self._conversations.values()),
+                'evicted': self.evicted
+            }
+
+    def _get(self, key):
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            return None
+        if time.monotonic() - conversation.last_used > self.idle_ttl:
+            del self._conversations[key]
+            self.evicted += 1
+            return None
+        self._conversations.move_to_end(key)
+        return conversation
+
+    def _compact(self, conversation: _Conversation) -> None:
+        # Conservar siempre el último intercambio completo; lo anterior se resume en una línea por turno
+        while conversation.tokens + conversation.summary_tokens > self.token_budget and len(conversation.turns) > 2:
+            role, text, tokens = conversation.turns.popleft()
+            conversation.tokens -= tokens
+            line = self._summary_line(role, text)
+            conversation.summary.append(line)
+            conversation.summary_tokens += estimate_tokens(line)
+            while conversation.summary_tokens > self.summary_budget and conversation.summary:
+                conversation.summary_tokens -= estimate_tokens(conversation.summary.popleft())
+
+    def _summary_line(self, role: str, text: str) -> str:
+        text = re.sub(r'\s+', ' ', text).strip()
+        if len(text) > SUMMARY_LINE_CHARS:
+            text = text[:SUMMARY_LINE_CHARS - 1].rstrip() + '…'
+        speaker = 'Usuario' if role == ROLE_USER else 'Rebeca'
+        return f"- {speaker}: {text}"
+
+    def _evict(self) -> None:
+        # Las conversaciones al frente del OrderedDict son las que llevan más tiempo sin usarse
+        now = time.monotonic()
+        while self._conversations:
+            key, conversation = next(iter(self._conversations.items()))
+            if len(self._conversations) <= self.max_conversations and now - conversation.last_used <= self.idle_ttl:
+                break
+            del self._conversations[key]
+            self.evicted += 1
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+@dataclass
+class OutboxEntry:
+    entry_id: int
+    reminder_ids: List[str]
+    channel_id: str
+    team_id: Optional[str]
+    message: str
+    blocks: Optional[list]
+    attempts: int
+    sent: bool
+
+
+class DeliveryOutbox:
+    """Bandeja local (SQLite) de envíos de recordatorios con reintentos y cola de fallidos."""
+
+    def __init__(self, path: str = None, max_attempts: int = None, base_delay: float = None,
+                 max_delay: float = None):
+        self.logger = logging.getLogger(__name__)
+        self.path = path or os.getenv('REMINDER_OUTBOX_PATH', 'data/reminder_outbox.sqlite3')
+        self.max_attempts = max_attempts or int(os.getenv('REMINDER_OUTBOX_MAX_ATTEMPTS', '8'))
+        self.base_delay = base_delay or float(os.getenv('REMINDER_OUTBOX_BASE_DELAY', '30'))
+        self.max_delay = max_delay or float(os.getenv('REMINDER_OUTBOX_MAX_DELAY', '3600'))
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory and self.path != ':memory:':
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                reminder_ids TEXT NOT NULL,
+                channel_id TEXT NOT NULL,
+                team_id TEXT,
+                message TEXT NOT NULL,
+                blocks TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                sent INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_next_attempt ON outbox (next_attempt_at)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letter (
+                id INTEGER PRIMARY KEY,
+                reminder_ids TEXT NOT NULL,
+                channel_id TEXT NOT NULL,
+                team_id TEXT,
+                message TEXT NOT NULL,
+                blocks TEXT,
+                attempts INTEGER NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                failed_at REAL NOT NULL
+            )
+        """)
+
+        # Ids con un envío en curso o fallido, para que el monitoreo no los vuelva a encolar
+        self._tracked_ids = set()
+        for table in ('outbox', 'dead_letter'):
+            for (reminder_ids,) in self._conn.execute(f"SELECT reminder_ids FROM {table}"):
+                self._tracked_ids.update(json.loads(reminder_ids))
+
+    def enqueue(self, reminder_ids: List[str], channel_id: str, message: str,
+                team_id: str = None, blocks: list = None) -> OutboxEntry:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO outbox (reminder_ids, channel_id, team_id, message, blocks, next_attempt_at, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (json.dumps(reminder_ids), channel_id, team_id, message,
+                 json.dumps(blocks) if blocks is not None else None, now, now)
+            )
+            self._tracked_ids.update(reminder_ids)
+        return OutboxEntry(cursor.lastrowid, list(reminder_ids), channel_id, team_id, message, blocks, 0, False)
+
+    def contains(self, reminder_id: str) -> bool:
+        with self._lock:
+            return reminder_id in self._tracked_ids
+
+    def due(self, limit: int = 50) -> List[OutboxEntry]:
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT id, reminder_ids, channel_id, team_id, message, blocks, attempts, sent
+                FROM outbox
+                WHERE next_attempt_at <= ?
+                ORDER BY next_attempt_at
+                LIMIT ?
+                """,
+                (time.time(), limit)
+            ).fetchall()
+        return [
+            OutboxEntry(row[0], json.loads(row[1]), row[2], row[3], row[4],
+                        json.loads(row[5]) if row[5] else None, row[6], bool(row[7]))
+            for row in rows
+        ]
+
+    def mark_sent(self, entry: OutboxEntry) -> None:
+        # chat_postMessage confirmó el envío; si luego falla BigQuery solo se reintenta el registro
+        with self._lock:
+            self._conn.execute("UPDATE outbox SET sent = 1 WHERE id = ?", (entry.entry_id,))
+        entry.sent = True
+
+    def complete(self, entry: OutboxEntry) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM outbox WHERE id = ?", (entry.entry_id,))
+            self._tracked_ids.difference_update(entry.reminder_ids)
+
+    def fail(self, entry: OutboxEntry, error: str) -> bool:
+        # Backoff exponencial con jitter; tras max_attempts el envío pasa a dead_letter. Devuelve True si se descartó
+        attempts = entry.attempts + 1
+        now = time.time()
+        with self._lock:
+            if attempts >= self.max_attempts:
+                self._conn.execute("BEGIN")
+                self._conn.execute(
+                    """
+                    INSERT INTO dead_letter (id, reminder_ids, channel_id, team_id, message, blocks,
+                                             attempts, last_error, created_at, failed_at)
+                    SELECT id, reminder_ids, channel_id, team_id, message, blocks, ?, ?, created_at, ?
+                    FROM outbox WHERE id = ?
+                    """,
+                    (attempts, error, now, entry.entry_id)
+                )
+                self._conn.execute("DELETE FROM outbox WHERE id = ?", (entry.entry_id,))
+                self._conn.execute("COMMIT")
+                self.logger.error(
+                    f"Recordatorios {entry.reminder_ids} enviados a dead_letter tras {attempts} intentos: {error}"
+                )
+                return True
+
+            delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay) * random.uniform(0.5, 1.5)
+            self._conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, now + delay, error, entry.entry_id)
+            )
+        entry.attempts = attempts
+        self.logger.warning(f"Reintento de {entry.reminder_ids} en {delay:.0f} s (intento {attempts}): {error}")
+        return False
+
+    def dead_letters(self, limit: int = 10) -> List[dict]:
+        # Los envíos descartados más recientes, para el comando admin fallidos
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT reminder_ids, channel_id, team_id, attempts, last_error, failed_at
+                FROM dead_letter
+                ORDER BY failed_at DESC
+                LIMIT ?
+                """,
+                (limit,)
+            ).fetchall()
+        return [
+            {'reminder_ids': json.loads(row[0]), 'channel_id': row[1], 'team_id': row[2],
+             'attempts': row[3], 'last_error': row[4], 'failed_at': row[5]}
+            for row in rows
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+            dead = self._conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+        return {'pending': pending, 'dead_letter': dead}
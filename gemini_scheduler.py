@@ -0,0 +1,227 @@
+import os
+import re
+import time
+import heapq
+import random
+import logging
+import threading
+from collections import deque
+from itertools import count
+
+try:
+    from google.api_core import exceptions as api_exceptions
+    RATE_LIMIT_ERRORS = (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)
+except ImportError:
+    RATE_LIMIT_ERRORS = ()
+
+# Clases de prioridad: primero las respuestas al usuario, luego el intent y al final el trabajo de fondo
+PRIORITY_INTERACTIVE = 0
+PRIORITY_INTENT = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_INTENT: 'intent', PRIORITY_BACKGROUND: 'background'}
+ROUTE_PRIORITIES = {
+    'chat': PRIORITY_INTERACTIVE,
+    'confirmation': PRIORITY_INTERACTIVE,
+    'embedding': PRIORITY_INTERACTIVE,
+    'intent': PRIORITY_INTENT,
+    'reminder_schedule': PRIORITY_INTENT,
+    'reminder_format': PRIORITY_BACKGROUND,
+    'reminder_format_batch': PRIORITY_BACKGROUND,
+}
+RESPONSE_TOKEN_ESTIMATE = 256
+RETRY_HINT_PATTERNS = (
+    re.compile(r'retry in ([\d.]+)\s*s', re.IGNORECASE),
+    re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)'),
+)
+
+
+class GeminiQuotaExceeded(Exception):
+    """La solicitud esperó en la cola más que el máximo de su clase de prioridad."""
+
+
+def retry_after_seconds(error) -> float:
+    # Pista de reintento del servidor: RetryInfo en los detalles o "retry in Ns" en el mensaje
+    for detail in getattr(error, 'details', None) or []:
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None and getattr(delay, 'seconds', None) is not None:
+            return delay.seconds + getattr(delay, 'nanos', 0) / 1e9
+    for pattern in RETRY_HINT_PATTERNS:
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class GeminiScheduler:
+    """Cola de prioridad del proceso para Gemini con presupuestos de solicitudes y tokens por minuto."""
+
+    def __init__(self, rpm: int = None, tpm: int = None, max_retries: int = None, window_seconds: float = 60.0,
+                 max_wait: dict = None):
+        self.logger = logging.getLogger(__name__)
+        self.rpm = rpm if rpm is not None else int(os.getenv('GEMINI_RPM_LIMIT', '0'))
+        self.tpm = tpm if tpm is not None else int(os.getenv('GEMINI_TPM_LIMIT', '0'))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('GEMINI_MAX_RETRIES', '3'))
+        self.window = window_seconds
+        # Lo que cada clase tolera esperar antes de desistir (el trabajo de fondo puede esperar más)
+        self.max_wait = max_wait or {
+            PRIORITY_INTERACTIVE: float(os.getenv('GEMINI_INTERACTIVE_MAX_WAIT', '30')),
+            PRIORITY_INTENT: float(os.getenv('GEMINI_INTENT_MAX_WAIT', '30')),
+            PRIORITY_BACKGROUND: float(os.getenv('GEMINI_BACKGROUND_MAX_WAIT', '600')),
+        }
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._sequence = count()
+        # Llamadas admitidas en la ventana: [timestamp, tokens]
+        self._admitted = deque()
+        self._tokens_in_window = 0
+        self._blocked_until = 0.0
+        self._stats = {
+            priority: {'calls': 0, 'wait_total': 0.0, 'wait_max': 0.0, 'rate_limited': 0, 'rejected': 0}
+            for priority in PRIORITY_NAMES
+        }
+
+    def run(self, route: str, call, estimated_tokens: int = 0, count_tokens=None,
+            response_tokens: int = RESPONSE_TOKEN_ESTIMATE):
+        # Ejecuta call() cuando hay cupo; devuelve (respuesta, segundos en cola)
+        priority = ROUTE_PRIORITIES.get(route, PRIORITY_BACKGROUND)
+        estimated_tokens += response_tokens
+        deadline = time.monotonic() + self.max_wait[priority]
+        waited = 0.0
+        attempt = 0
+        while True:
+            reservation, wait = self._acquire(priority, estimated_tokens, deadline)
+            waited += wait
+            try:
+                response = call()
+            except RATE_LIMIT_ERRORS as e:
+                attempt += 1
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = min(2 ** attempt, 60) * random.uniform(0.5, 1.5)
+                self._rate_limited(priority, delay)
+                if attempt > self.max_retries or time.monotonic() + delay > deadline:
+                    raise
+                self.logger.warning(f"Gemini 429 en {route}; reintento en {delay:.1f} s (intento {attempt})")
+                continue
+            actual_tokens = count_tokens(response) if count_tokens is not None else None
+            if actual_tokens is not None:
+                self._settle(reservation, actual_tokens)
+            return response, waited
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._expire(time.monotonic())
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiting:
+                queued[PRIORITY_NAMES[priority]] += 1
+            return {
+                'requests_in_window': len(self._admitted),
+                'tokens_in_window': self._tokens_in_window,
+                'queued': queued,
+                'classes': {
+                    PRIORITY_NAMES[priority]: {
+                        'calls': s['calls'],
+                        'avg_wait_ms': s['wait_total'] / s['calls'] * 1000 if s['calls'] else 0.0,
+                        'max_wait_ms': s['wait_max'] * 1000,
+                        'rate_limited': s['rate_limited'],
+                        'rejected': s['rejected']
+                    }
+                    for priority, s in self._stats.items()
+                }
+            }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        limits = f"{self.rpm or '∞'} RPM / {self.tpm or '∞'} TPM"
+        lines = [
+            f":traffic_light: *Cola de Gemini* ({limits}): {stats['requests_in_window']} solicitudes y "
+            f"{stats['tokens_in_window']} tokens en el último minuto"
+        ]
+        for name, s in stats['classes'].items():
+            lines.append(
+                f"• `{name}`: {s['calls']} llamadas, espera media {s['avg_wait_ms']:.0f} ms, "
+                f"máx {s['max_wait_ms']:.0f} ms, {stats['queued'][name]} en cola, "
+                f"{s['rate_limited']} 429, {s['rejected']} descartadas"
+            )
+        return "\n".join(lines)
+
+    def _acquire(self, priority: int, tokens: int, deadline: float):
+        ticket = (priority, next(self._sequence))
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._wait_time(now, tokens)
+                    if self._waiting[0] == ticket and wait <= 0:
+                        break
+                    if now >= deadline:
+                        self._stats[priority]['rejected'] += 1
+                        raise GeminiQuotaExceeded(
+                            f"Sin cupo de Gemini tras {now - started:.1f} s ({PRIORITY_NAMES[priority]})"
+                        )
+                    # Sin ser el primero de la cola se espera a que alguien avise; si lo es, lo que falte de la ventana
+                    timeout = deadline - now
+                    if self._waiting[0] == ticket:
+                        timeout = min(timeout, wait)
+                    self._cond.wait(timeout)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+            reservation = [now, tokens]
+            self._admitted.append(reservation)
+            self._tokens_in_window += tokens
+            waited = now - started
+            stats = self._stats[priority]
+            stats['calls'] += 1
+            stats['wait_total'] += waited
+            stats['wait_max'] = max(stats['wait_max'], waited)
+        return reservation, waited
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        # Segundos hasta que la ventana deslizante admita otra llamada de este tamaño
+        self._expire(now)
+        wait = self._blocked_until - now
+        if self.rpm and len(self._admitted) >= self.rpm:
+            wait = max(wait, self._admitted[len(self._admitted) - self.rpm][0] + self.window - now)
+        if self.tpm and self._tokens_in_window + tokens > self.tpm and self._admitted:
+            freed = self._tokens_in_window + tokens - self.tpm
+            for admitted_at, admitted_tokens in self._admitted:
+                freed -= admitted_tokens
+                if freed <= 0:
+                    wait = max(wait, admitted_at + self.window - now)
+                    break
+        return wait
+
+    def _expire(self, now: float) -> None:
+        while self._admitted and self._admitted[0][0] <= now - self.window:
+            self._tokens_in_window -= self._admitted.popleft()[1]
+
+    def _settle(self, reservation: list, actual_tokens: int) -> None:
+        # Reemplazar la estimación por los tokens que reportó el modelo
+        with self._cond:
+            if reservation[0] > time.monotonic() - self.window:
+                self._tokens_in_window += actual_tokens - reservation[1]
+            reservation[1] = actual_tokens
+            self._cond.notify_all()
+
+    def _rate_limited(self, priority: int, delay: float) -> None:
+        # Un 429 pausa toda la cola, no solo a quien lo recibió
+        with self._cond:
+            self._stats[priority]['rate_limited'] += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            self._cond.notify_all()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_gemini_scheduler() -> GeminiScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = GeminiScheduler()
+        return _scheduler
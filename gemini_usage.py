@@ -0,0 +1,195 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+import pytz
+from google.cloud import bigquery
+
+USAGE_TABLE_ID = 'gemini_usage'
+
+
+def estimate_tokens(text) -> int:
+    # Aproximación de ~4 caracteres por token cuando el modelo no reporta el uso
+    return max(1, len(str(text or '')) // 4)
+
+
+class GeminiUsageTracker:
+    """Registra tokens y latencia de cada llamada a Gemini por usuario, canal y ruta."""
+
+    def __init__(self, client=None, table_ref: str = None, capacity: int = None, flush_interval: int = None):
+        self.logger = logging.getLogger(__name__)
+        self.client = client
+        self.table_ref = table_ref
+        self.capacity = capacity or int(os.getenv('GEMINI_USAGE_BUFFER_SIZE', '10000'))
+        self.flush_interval = flush_interval or int(os.getenv('GEMINI_USAGE_FLUSH_INTERVAL', '300'))
+        
+        # Buffer circular de tuplas (timestamp, user, channel, route, prompt, response, latency_ms)
+        self._records = deque(maxlen=self.capacity)
+        self._unflushed = deque(maxlen=self.capacity)
+        self._aggregates = {'user': {}, 'channel': {}, 'route': {}}
+        # Registros sin guardar que se perdieron por tener el buffer lleno (se reportan al enviar)
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(self, route: str, prompt_tokens: int, response_tokens: int, latency_ms: float,
+               user_id: str = None, channel_id: str = None) -> None:
+        self._add(route, [(user_id, channel_id, prompt_tokens, response_tokens)], latency_ms)
+
+    def record_split(self, route: str, prompt_tokens: int, response_tokens: int, latency_ms: float,
+                     owners: list) -> None:
+        # Una llamada por lotes: los tokens se reparten entre los (usuario, canal) de cada elemento,
+        # en proporción a cuántos elementos tiene cada uno; la ruta cuenta una sola llamada
+        counts = {}
+        for owner in owners:
+            counts[owner] = counts.get(owner, 0) + 1
+        shares = []
+        done = 0
+        for (user_id, channel_id), count in counts.items():
+            start, done = done, done + count
+            shares.append((
+                user_id, channel_id,
+                prompt_tokens * done // len(owners) - prompt_tokens * start // len(owners),
+                response_tokens * done // len(owners) - response_tokens * start // len(owners)
+            ))
+        self._add(route, shares, latency_ms)
+
+    def _add(self, route: str, shares: list, latency_ms: float) -> None:
+        now = time.time()
+        with self._lock:
+            for user_id, channel_id, prompt_tokens, response_tokens in shares:
+                record = (now, user_id, channel_id, route, prompt_tokens, response_tokens, latency_ms)
+                self._records.append(record)
+                if len(self._unflushed) == self.capacity:
+                    self._dropped += 1
+                self._unflushed.append(record)
+                for dimension, key in (('user', user_id), ('channel', channel_id)):
+                    if key is not None:
+                        self._accumulate(dimension, key, prompt_tokens, response_tokens, latency_ms)
+            self._accumulate(
+                'route', route, sum(share[2] for share in shares), sum(share[3] for share in shares), latency_ms
+            )
+
+    def _accumulate(self, dimension: str, key: str, prompt_tokens: int, response_tokens: int,
+                    latency_ms: float) -> None:
+        totals = self._aggregates[dimension].setdefault(key, [0, 0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += prompt_tokens
+        totals[2] += response_tokens
+        totals[3] += latency_ms
+
+    def record_response(self, route: str, prompt, response, latency_ms: float,
+                        user_id: str = None, channel_id: str = None, owners: list = None) -> None:
+        usage = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(usage, 'prompt_token_count', None)
+        response_tokens = getattr(usage, 'candidates_token_count', None)
+        if not isinstance(prompt_tokens, int):
+            prompt_tokens = estimate_tokens(prompt)
+        if not isinstance(response_tokens, int):
+            parts = getattr(response, 'parts', None) or []
+            response_tokens = estimate_tokens(parts[0].text) if parts else 0
+        if owners:
+            self.record_split(route, prompt_tokens, response_tokens, latency_ms, owners)
+            return
+        self.record(route, prompt_tokens, response_tokens, latency_ms, user_id=user_id, channel_id=channel_id)
+
+    def aggregates(self, dimension: str) -> dict:
+        with self._lock:
+            return {
+                key: {'calls': t[0], 'prompt_tokens': t[1], 'response_tokens': t[2], 'avg_latency_ms': t[3] / t[0]}
+                for key, t in self._aggregates[dimension].items()
+            }
+
+    def recent(self, limit: int = 20) -> list:
+        with self._lock:
+            return list(self._records)[-limit:]
+
+    def maybe_flush(self) -> int:
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return 0
+        return self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            self._last_flush = time.monotonic()
+            records = list(self._unflushed)
+            self._unflushed.clear()
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            self.logger.warning(f"Buffer de uso de Gemini lleno: se descartaron {dropped} registros sin guardar")
+        if not records or self.client is None or not self.table_ref:
+            return 0
+        
+        rows = [
+            {
+                'timestamp': datetime.fromtimestamp(ts, pytz.utc).isoformat(),
+                'slack_user_id': user_id,
+                'channel_id': channel_id,
+                'route': route,
+                'prompt_tokens': prompt_tokens,
+                'response_tokens': response_tokens,
+                'latency_ms': latency_ms
+            }
+            for ts, user_id, channel_id, route, prompt_tokens, response_tokens, latency_ms in records
+        ]
+        
+        # Una sola inserción por lote; si falla se reintenta en el siguiente ciclo
+        try:
+            errors = self.client.insert_rows_json(self.table_ref, rows)
+            if errors:
+                raise Exception(errors)
+        except Exception as e:
+            self.logger.error(f"Error al guardar uso de Gemini: {str(e)}")
+            with self._lock:
+                # Los registros nuevos llegados durante el envío se conservan; del lote fallido se descartan los más viejos
+                requeued = records[max(0, len(records) - (self.capacity - len(self._unflushed))):]
+                self._unflushed.extendleft(reversed(requeued))
+            if len(requeued) < len(records):
+                self.logger.warning(
+                    f"Buffer de uso de Gemini lleno: se descartaron {len(records) - len(requeued)} registros sin guardar"
+                )
+            return 0
+        return len(rows)
+
+    def summary(self, top: int = 5) -> str:
+        lines = [":bar_chart: *Uso de Gemini desde el inicio*"]
+        titles = {'route': 'Por ruta', 'user': 'Por usuario', 'channel': 'Por canal'}
+        for dimension, title in titles.items():
+            aggregates = self.aggregates(dimension)
+            if not aggregates:
+                continue
+            lines.append(f"*{title}:*")
+            ranked = sorted(
+                aggregates.items(),
+                key=lambda item: item[1]['prompt_tokens'] + item[1]['response_tokens'],
+                reverse=True
+            )
+            for key, totals in ranked[:top]:
+                label = f"<@{key}>" if dimension == 'user' else f"<#{key}>" if dimension == 'channel' else f"`{key}`"
+                lines.append(
+                    f"• {label}: {totals['calls']} llamadas, "
+                    f"{totals['prompt_tokens']} + {totals['response_tokens']} tokens, "
+                    f"{totals['avg_latency_ms']:.0f} ms promedio"
+                )
+        if len(lines) == 1:
+            lines.append("Todavía no hay llamadas registradas.")
+        return "\n".join(lines)
+
+    def ensure_table(self) -> None:
+        if self.client is None or not self.table_ref:
+            return
+        schema = [
+            bigquery.SchemaField("timestamp", "TIMESTAMP", mode="REQUIRED"),
+            bigquery.SchemaField("slack_user_id", "STRING"),
+            bigquery.SchemaField("channel_id", "STRING"),
+            bigquery.SchemaField("route", "STRING", mode="REQUIRED"),
+            bigquery.SchemaField("prompt_tokens", "INT64", mode="REQUIRED"),
+            bigquery.SchemaField("response_tokens", "INT64", mode="REQUIRED"),
+            bigquery.SchemaField("latency_ms", "FLOAT64", mode="REQUIRED")
+        ]
+        try:
+            self.client.get_table(self.table_ref)
+        except Exception:
+            self.client.create_table(bigquery.Table(self.table_ref, schema=schema), exists_ok=True)
@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import time
+import hmac
+import hashlib
+import logging
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from slack_sdk.signature import SignatureVerifier
+from slack_bolt.request import BoltRequest
+
+EVENTS_PATH = '/slack/events'
+HEALTH_PATH = '/health'
+
+
+def sign_request(body: str, signing_secret: str, timestamp: int = None) -> dict:
+    # Encabezados firmados como los envía Slack, para probar localmente con payloads de ejemplo
+    timestamp = str(timestamp or int(time.time()))
+    base = f"v0:{timestamp}:{body}".encode('utf-8')
+    signature = 'v0=' + hmac.new(signing_secret.encode('utf-8'), base, hashlib.sha256).hexdigest()
+    return {'X-Slack-Request-Timestamp': timestamp, 'X-Slack-Signature': signature}
+
+
+class SlackIngressHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.split('?')[0] != HEALTH_PATH:
+            self._reply(404, {'ok': False, 'error': 'not_found'})
+            return
+        self._reply(200, self.server.health())
+
+    def do_POST(self):
+        path, _, query = self.path.partition('?')
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        if path != EVENTS_PATH or self.server.app is None:
+            self._reply(404, {'ok': False, 'error': 'not_found'})
+            return
+
+        headers = {name.lower(): value for name, value in self.headers.items()}
+        if not self.server.verifier.is_valid_request(body, headers):
+            self.server.count('rejected')
+            self._reply(401, {'ok': False, 'error': 'invalid_signature'})
+            return
+
+        # Un reintento por timeout ya llegó a otra réplica o a esta; se confirma sin procesarlo de nuevo
+        if headers.get('x-slack-retry-num') and headers.get('x-slack-retry-reason') == 'http_timeout':
+            self.server.count('retries_skipped')
+            self._reply(200, {'ok': True}, extra_headers={'X-Slack-No-Retry': '1'})
+            return
+
+        # Bolt confirma (ack) de inmediato y ejecuta los listeners en su pool de hilos
+        response = self.server.app.dispatch(BoltRequest(body=body, query=query, headers=headers))
+        self.server.count('dispatched')
+        self.send_response(response.status)
+        response_body = (response.body or '').encode('utf-8')
+        for name, values in response.headers.items():
+            if name.lower() == 'content-length':
+                continue
+            for value in values:
+                self.send_header(name, value)
+        self.send_header('Content-Length', str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    def _reply(self, status: int, payload: dict, extra_headers: dict = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.logger.debug(format % args)
+
+
+class SlackIngressServer(ThreadingHTTPServer):
+    """Servidor HTTP del Events API de Slack (/slack/events) y del healthcheck (/health)."""
+
+    daemon_threads = True
+
+    def __init__(self, app=None, port: int = None, signing_secret: str = None, host: str = '0.0.0.0'):
+        self.logger = logging.getLogger(__name__)
+        signing_secret = signing_secret or os.getenv('SLACK_SIGNING_SECRET')
+        if app is not None and not signing_secret:
+            raise ValueError("¡Error! SLACK_SIGNING_SECRET no encontrado en variables de entorno")
+        port = port if port is not None else int(os.getenv('PORT', '3000'))
+        super().__init__((host, port), SlackIngressHandler)
+        self.app = app
+        # Sin app (modo socket) el servidor solo atiende /health
+        self.verifier = SignatureVerifier(signing_secret) if app is not None else None
+        self.started_at = time.time()
+        self._stats = {'dispatched': 0, 'rejected': 0, 'retries_skipped': 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def count(self, key: str) -> None:
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def health(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {
+            'ok': True,
+            'mode': 'http' if self.app is not None else 'socket',
+            'uptime_seconds': int(time.time() - self.started_at),
+            **stats
+        }
+
+    def serve_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name="http_ingress", daemon=True)
+        thread.start()
+        return thread
+
+
+def send_sample(path: str, url: str, signing_secret: str) -> int:
+    # Enviar un payload de ejemplo firmado a una instancia local
+    with open(path, encoding='utf-8') as f:
+        body = f.read()
+    content_type = 'application/x-www-form-urlencoded' if body.startswith('payload=') else 'application/json'
+    request = urllib.request.Request(
+        url,
+        data=body.encode('utf-8'),
+        headers={'Content-Type': content_type, **sign_request(body, signing_secret)},
+        method='POST'
+    )
+    with urllib.request.urlopen(request) as response:
+        print(response.status, response.read().decode('utf-8'))
+        return response.status
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python http_ingress.py <payload.json> [url]")
+        sys.exit(1)
+    secret = os.getenv('SLACK_SIGNING_SECRET')
+    if not secret:
+        print("Define SLACK_SIGNING_SECRET para firmar el payload")
+        sys.exit(1)
+    target = sys.argv[2] if len(sys.argv) > 2 else f"http://localhost:{os.getenv('PORT', '3000')}{EVENTS_PATH}"
+    send_sample(sys.argv[1], target, secret)
@@ -2,6 +2,8 @@ import os
 from dotenv import load_dotenv
 from slack_handler import start_slack_handler
 from rebeca_agent import create_agent
+from workspace_store import get_installation_store
+from profiling import install_signal_handlers
 from threading import Thread
 import time
 
@@ -12,23 +14,67 @@ def verificar_variables_entorno():
     ]
     variables_faltantes = []
     
+    # Con varios workspaces los tokens de bot vienen en SLACK_WORKSPACES
+    if os.getenv('SLACK_WORKSPACES'):
+        variables_requeridas[0] = 'SLACK_WORKSPACES'
+    
+    # En modo HTTP (Events API) Slack firma cada petición con SLACK_SIGNING_SECRET en lugar del app token
+    if os.getenv('SLACK_MODE', 'socket').lower() == 'http':
+        variables_requeridas[1] = 'SLACK_SIGNING_SECRET'
+    
     for var in variables_requeridas:
         valor = os.getenv(var)
         if not valor:
             variables_faltantes.append(var)
         print(f"Variable {var}: {'PRESENTE' if valor else 'FALTANTE'}")
-        if valor and var != 'GOOGLE_APPLICATION_CREDENTIALS_JSON':
+        if valor and var not in ('GOOGLE_APPLICATION_CREDENTIALS_JSON', 'SLACK_WORKSPACES'):
             print(f"Longitud de {var}: {len(valor)} caracteres")
     
     return len(variables_faltantes) == 0
 
-def check_reminders_loop(agent):
-    """Función que se ejecuta en un hilo separado para verificar recordatorios."""
-    while True:
+def run_reminder_cycle(agent, deliver=True):
+    """Un ciclo del monitoreo: sincroniza el índice en todas las réplicas y envía solo en la que tiene el envío activo."""
+    if deliver:
         try:
             agent.check_reminders()
         except Exception as e:
             print(f"Error al verificar recordatorios: {str(e)}")
+        try:
+            # Registrar los recordatorios que Slack ya entregó con chat.scheduleMessage
+            agent.reconcile_scheduled_reminders()
+        except Exception as e:
+            print(f"Error al reconciliar mensajes programados: {str(e)}")
+        try:
+            # Guardar el estado del programador para un arranque en caliente
+            agent.reminder_handler.save_snapshot()
+        except Exception as e:
+            print(f"Error al guardar snapshot de recordatorios: {str(e)}")
+    else:
+        try:
+            # Sin envíos, el índice se mantiene al día para "mis recordatorios" y las cancelaciones
+            agent.reminder_handler.sync_pending_index()
+        except Exception as e:
+            print(f"Error al sincronizar recordatorios: {str(e)}")
+    try:
+        # Persistir la caché semántica de respuestas
+        agent.semantic_cache.save()
+    except Exception as e:
+        print(f"Error al guardar la caché semántica: {str(e)}")
+    try:
+        # Enviar a BigQuery el uso acumulado de Gemini cuando toque
+        agent.usage_tracker.maybe_flush()
+    except Exception as e:
+        print(f"Error al enviar el uso de Gemini: {str(e)}")
+    try:
+        # Mensajes recibidos, solicitudes despachadas y llamadas ahorradas por la agrupación
+        agent.log_ingress_stats()
+    except Exception as e:
+        print(f"Error al registrar las estadísticas de entrada: {str(e)}")
+
+def check_reminders_loop(agent, deliver=True):
+    """Función que se ejecuta en un hilo separado para verificar recordatorios."""
+    while True:
+        run_reminder_cycle(agent, deliver)
         time.sleep(60)  # Verificar cada minuto
 
 def main():
@@ -48,10 +94,30 @@ def main():
         # Crear la instancia del agente
         agent = create_agent()
         
-        # Iniciar el hilo de monitoreo de recordatorios
-        reminder_thread = Thread(target=check_reminders_loop, args=(agent,), daemon=True)
+        # Precargar las zonas horarias de los usuarios de cada workspace en segundo plano
+        team_ids = get_installation_store().team_ids() or [None]
+        for team_id in team_ids:
+            Thread(target=agent.timezone_resolver.warm_up, args=(team_id,), daemon=True).start()
+        
+        # Perfilado bajo demanda: kill -USR1 <pid> perfila, kill -USR2 <pid> guarda las pilas de hilos
+        if install_signal_handlers(agent.profiler):
+            print("Señales de perfilado instaladas (SIGUSR1/SIGUSR2)")
+        
+        # Con varias réplicas detrás del balanceador solo una debe enviar los recordatorios
+        deliver = os.getenv('REMINDER_SCHEDULER_ENABLED', '1') == '1'
+        if deliver:
+            # Recuperar recordatorios del snapshot local antes de empezar a monitorear
+            agent.warm_start()
+        
+        # Todas las réplicas sincronizan el índice de recordatorios y hacen el mantenimiento periódico
+        reminder_thread = Thread(
+            target=check_reminders_loop, args=(agent, deliver), name="check_reminders_loop", daemon=True
+        )
         reminder_thread.start()
-        print("Monitoreo de recordatorios iniciado!")
+        if deliver:
+            print("Monitoreo de recordatorios iniciado!")
+        else:
+            print("Envío de recordatorios deshabilitado en esta réplica (REMINDER_SCHEDULER_ENABLED=0)")
         
         # Iniciar el manejador de Slack con la instancia del agente
         print("Rebeca está lista y escuchando mensajes de Slack!")
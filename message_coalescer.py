@@ -0,0 +1,96 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+
+
+class _PendingBatch:
+    def __init__(self, first_at: float):
+        self.first_at = first_at
+        self.events = []
+        self.say = None
+        self.timer = None
+        self.context = contextvars.copy_context()
+
+
+class MessageCoalescer:
+    """Agrupa los mensajes que un usuario envía seguidos en un canal antes de procesarlos."""
+
+    def __init__(self, dispatch, window_ms: int = None, max_wait_ms: int = None):
+        self.logger = logging.getLogger(__name__)
+        self.dispatch = dispatch
+        if window_ms is None:
+            window_ms = int(os.getenv('MESSAGE_COALESCE_WINDOW_MS', '0'))
+        if max_wait_ms is None:
+            max_wait_ms = int(os.getenv('MESSAGE_COALESCE_MAX_WAIT_MS', '3000'))
+        self.window = window_ms / 1000
+        self.max_wait = max(max_wait_ms, window_ms) / 1000
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.messages_received = 0
+        self.batches_dispatched = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def submit(self, key, event, say) -> None:
+        if not self.enabled:
+            with self._lock:
+                self.messages_received += 1
+                self.batches_dispatched += 1
+            self.dispatch([event], say)
+            return
+        
+        with self._lock:
+            self.messages_received += 1
+            now = time.monotonic()
+            batch = self._pending.get(key)
+            if batch is None:
+                batch = _PendingBatch(first_at=now)
+                self._pending[key] = batch
+            else:
+                batch.timer.cancel()
+            batch.events.append(event)
+            batch.say = say
+            
+            # Reiniciar la ventana sin superar la espera máxima desde el primer mensaje
+            delay = max(0.0, min(self.window, batch.first_at + self.max_wait - now))
+            batch.timer = threading.Timer(delay, self._flush, args=(key, batch))
+            batch.timer.daemon = True
+            batch.timer.start()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'messages_received': self.messages_received,
+                'batches_dispatched': self.batches_dispatched,
+                'calls_saved': self.messages_received - self.batches_dispatched - self._pending_messages(),
+                'pending_batches': len(self._pending)
+            }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (
+            f":package: Agrupación de mensajes: {stats['messages_received']} recibidos en "
+            f"{stats['batches_dispatched']} solicitudes, {stats['calls_saved']} llamadas al modelo ahorradas"
+        )
+
+    def _flush(self, key, batch) -> None:
+        with self._lock:
+            if self._pending.get(key) is not batch:
+                return
+            del self._pending[key]
+            self.batches_dispatched += 1
+        
+        if len(batch.events) > 1:
+            self.logger.info(f"Se agruparon {len(batch.events)} mensajes en una sola solicitud")
+        try:
+            # Ejecutar con el contexto del primer mensaje para conservar la traza
+            batch.context.run(self.dispatch, batch.events, batch.say)
+        except Exception as e:
+            self.logger.error(f"Error al procesar mensajes agrupados: {str(e)}")
+
+    def _pending_messages(self) -> int:
+        return sum(len(batch.events) for batch in self._pending.values())
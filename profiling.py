@@ -0,0 +1,169 @@
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+import traceback
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+MAX_PROFILE_SECONDS = 300
+
+
+def dump_thread_stacks() -> str:
+    # Pila actual de cada hilo (check_reminders_loop, workers de Socket Mode, admisión...)
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    sections = []
+    for ident, frame in sys._current_frames().items():
+        stack = ''.join(traceback.format_stack(frame))
+        sections.append(f"--- Hilo {names.get(ident, 'desconocido')} ({ident}) ---\n{stack}")
+    return "\n".join(sections)
+
+
+class Profiler:
+    """Muestreo bajo demanda de CPU (pilas de todos los hilos) y memoria (tracemalloc) durante N segundos."""
+
+    def __init__(self, output_dir: str = None, interval_ms: int = None, top: int = 10):
+        self.logger = logging.getLogger(__name__)
+        self.output_dir = output_dir or os.getenv('PROFILE_OUTPUT_DIR', 'data/profiles')
+        self.interval = (interval_ms or int(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '10'))) / 1000
+        self.top = top
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: int, on_done=None) -> bool:
+        # on_done recibe el resumen en texto al terminar
+        with self._lock:
+            if self.running:
+                return False
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(min(max(seconds, 1), MAX_PROFILE_SECONDS), on_done),
+                name="profiler",
+                daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def stop(self) -> bool:
+        if not self.running:
+            return False
+        self._stop.set()
+        return True
+
+    def wait(self, timeout: float = None) -> None:
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def dump_stacks(self) -> str:
+        path = self._output_path('threads', 'txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(dump_thread_stacks())
+        self.logger.info(f"Pilas de hilos guardadas en {path}")
+        return path
+
+    def _run(self, seconds: int, on_done) -> None:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(10)
+        try:
+            self_samples, total_samples, stacks, count = self._sample(seconds)
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        summary = self._write_results(self_samples, total_samples, stacks, count, snapshot)
+        self.logger.info(summary)
+        if on_done is not None:
+            try:
+                on_done(summary)
+            except Exception as e:
+                self.logger.error(f"Error al enviar el resumen del perfil: {str(e)}")
+
+    def _sample(self, seconds: int):
+        # cProfile solo instrumenta el hilo que lo activa; el muestreo cubre todos los hilos
+        own_ident = threading.get_ident()
+        self_samples = Counter()
+        total_samples = Counter()
+        stacks = Counter()
+        count = 0
+        names = {}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and not self._stop.is_set():
+            if count % 100 == 0:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                functions = []
+                while frame is not None:
+                    code = frame.f_code
+                    functions.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self_samples[functions[0]] += 1
+                total_samples.update(set(functions))
+                stacks[(names.get(ident, str(ident)),) + tuple(reversed(functions))] += 1
+            count += 1
+            self._stop.wait(self.interval)
+        return self_samples, total_samples, stacks, count
+
+    def _write_results(self, self_samples, total_samples, stacks, count, snapshot) -> str:
+        # Pilas colapsadas (compatibles con flamegraph.pl / speedscope) y snapshot de tracemalloc
+        stacks_path = self._output_path('cpu', 'collapsed')
+        with open(stacks_path, 'w', encoding='utf-8') as f:
+            for stack, samples in stacks.most_common():
+                f.write(f"{';'.join(stack)} {samples}\n")
+        memory_path = self._output_path('memory', 'tracemalloc')
+        snapshot.dump(memory_path)
+
+        lines = [f":stopwatch: *Perfil de {count} muestras* (`{stacks_path}`)", "*Funciones con más tiempo propio:*"]
+        for function, samples in self_samples.most_common(self.top):
+            lines.append(
+                f"• `{function}`: {samples / max(count, 1):.0%} propio, "
+                f"{total_samples[function] / max(count, 1):.0%} acumulado"
+            )
+        lines.append(f"*Sitios con más memoria asignada* (`{memory_path}`):")
+        for stat in snapshot.statistics('lineno')[:self.top]:
+            frame = stat.traceback[0]
+            lines.append(
+                f"• `{os.path.basename(frame.filename)}:{frame.lineno}`: "
+                f"{stat.size / 1024:.1f} KiB en {stat.count} bloques"
+            )
+
+        summary = "\n".join(lines)
+        with open(self._output_path('summary', 'txt'), 'w', encoding='utf-8') as f:
+            f.write(summary)
+        return summary
+
+    def _output_path(self, kind: str, extension: str) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        return os.path.join(self.output_dir, f"{kind}-{stamp}.{extension}")
+
+
+def install_signal_handlers(profiler: Profiler) -> bool:
+    # SIGUSR1 inicia un perfil de PROFILE_SIGNAL_SECONDS; SIGUSR2 guarda las pilas de todos los hilos
+    if not hasattr(signal, 'SIGUSR1') or threading.current_thread() is not threading.main_thread():
+        return False
+    seconds = int(os.getenv('PROFILE_SIGNAL_SECONDS', '30'))
+
+    def start_profile(signum, frame):
+        if not profiler.start(seconds):
+            profiler.stop()
+
+    def dump_stacks(signum, frame):
+        profiler.dump_stacks()
+
+    signal.signal(signal.SIGUSR1, start_profile)
+    signal.signal(signal.SIGUSR2, dump_stacks)
+    return True
@@ -1,29 +1,86 @@
 import os
+import re
 import json
 import datetime
+import time
 import logging
 import google.generativeai as genai
 from datetime import datetime
+from threading import Lock, Thread
 from slack_handler import SlackHandler
 from reminder_handler import ReminderHandler
+from reminder_index import format_reminder_time, reminder_due_at
+from timezone_resolver import TimezoneResolver, DEFAULT_TIMEZONE
+from gemini_usage import GeminiUsageTracker, USAGE_TABLE_ID, estimate_tokens
+from gemini_scheduler import get_gemini_scheduler
+from semantic_cache import SemanticCache
+from conversation_memory import ConversationMemory
+from profiling import Profiler, MAX_PROFILE_SECONDS
+from reminder_actions import build_reminder_blocks, build_digest_blocks, MAX_DIGEST_ITEMS
+from delivery_outbox import DeliveryOutbox
+from scheduled_reminders import SlackReminderOffloader
+from tracing import start_span, traced
+from traffic_recorder import get_recorder
+from dataclasses import asdict
+import pytz
+
+# Comandos de recordatorios que se resuelven sin llamar al modelo: deben ser el mensaje completo,
+# para no confundirlos con un recordatorio que los menciona ("recuérdame revisar mis recordatorios")
+LIST_REMINDERS_PATTERN = re.compile(
+    r'^[¿¡\s]*(?:(?:ver|listar?|lista de)\s+)?(?:mis\s+)?recordatorios[\s.!?]*$'
+)
+# La referencia es la posición en la lista o al menos 6 caracteres del inicio del id
+CANCEL_REMINDER_PATTERN = re.compile(
+    r'^[¿¡\s]*(cancela|cancelar|elimina|eliminar|borra|borrar)\s+(?:el\s+)?recordatorio\s+'
+    r'#?(\d{1,3}|[0-9a-f]{6}[0-9a-f-]*)[\s.!?]*$'
+)
+ADMIN_COMMAND_PATTERN = re.compile(r'^admin\s+(\w+)(?:\s+(.*))?$')
+
+def _total_tokens(response):
+    total = getattr(getattr(response, 'usage_metadata', None), 'total_token_count', None)
+    return total if isinstance(total, int) else None
 
 class RebecaAgent:
-    def __init__(self):
+    def __init__(self, slack_handler=None, reminder_handler=None, model=None, outbox=None):
         # Configurar logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
         
         # Inicializar el cliente de Slack y el ReminderHandler
-        self.slack_handler = SlackHandler()
-        self.reminder_handler = ReminderHandler(
+        self.slack_handler = slack_handler or SlackHandler()
+        self.reminder_handler = reminder_handler or ReminderHandler(
             project_id=os.getenv('BIGQUERY_PROJECT_ID'),
             dataset_id=os.getenv('BIGQUERY_DATASET')
         )
         
+        # Resolver la zona horaria de cada usuario desde su perfil de Slack
+        self.timezone_resolver = TimezoneResolver(
+            self.slack_handler.client,
+            client_factory=getattr(self.slack_handler, 'client_for_team', None)
+        )
+        self._delivery_lock = Lock()
+        self._reconcile_lock = Lock()
+        # Los asigna start_slack_handler: viven en la capa de Slack pero se reportan desde aquí
+        self.message_coalescer = None
+        self.admission_controller = None
+        # Canales que prefieren recibir cada recordatorio por separado en lugar de un resumen
+        self.digest_opt_out_channels = {
+            c.strip() for c in os.getenv('REMINDER_DIGEST_OPT_OUT_CHANNELS', '').split(',') if c.strip()
+        }
+        # Bandeja local de envíos: un recordatorio se marca ejecutado solo cuando Slack confirma
+        self.outbox = outbox or DeliveryOutbox()
+        self.outbox_batch_size = int(os.getenv('REMINDER_OUTBOX_BATCH', '50'))
+        
+        # Recordatorios que se formatean en una sola llamada al modelo (1 = una llamada por recordatorio)
+        self.format_batch_size = max(1, int(os.getenv('REMINDER_FORMAT_BATCH_SIZE', '10')))
+        
+        # Recordatorios de hora fija entregados por Slack con chat.scheduleMessage (REMINDER_SLACK_SCHEDULE=1)
+        self.slack_offloader = SlackReminderOffloader(self.slack_handler, render=self._render_scheduled_reminders)
+        
         # Configurar Gemini
         genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
         # Usar la versión más reciente y estable del modelo
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        self.model = model or genai.GenerativeModel('gemini-2.5-flash')
         # Configurar la generación
         self.generation_config = genai.types.GenerationConfig(
             temperature=0.7,
@@ -34,13 +91,82 @@ class RebecaAgent:
             top_k=40
         )
         
-    def _analyze_intent(self, message):
+        # Contabilidad de tokens y latencia de Gemini
+        self.admin_users = {u.strip() for u in os.getenv('REBECA_ADMIN_USERS', '').split(',') if u.strip()}
+        self.usage_tracker = GeminiUsageTracker(
+            client=self.reminder_handler.client,
+            table_ref=f"{self.reminder_handler.project_id}.{self.reminder_handler.dataset_id}.{USAGE_TABLE_ID}"
+        )
+        try:
+            self.usage_tracker.ensure_table()
+        except Exception as e:
+            self.logger.error(f"Error al crear la tabla de uso de Gemini: {str(e)}")
+        
+        # Cola de prioridad compartida por todas las llamadas a Gemini (GEMINI_RPM_LIMIT / GEMINI_TPM_LIMIT)
+        self.gemini_scheduler = get_gemini_scheduler()
+        
+        # Perfilado bajo demanda (comando admin perfil y señales SIGUSR1/SIGUSR2)
+        self.profiler = Profiler()
+        
+        # Historial reciente por hilo o DM (CONVERSATION_TOKEN_BUDGET=0 lo desactiva)
+        self.conversation_memory = ConversationMemory()
+        
+        # Caché semántica de respuestas generales (SEMANTIC_CACHE_SIZE=0 la desactiva)
+        self.semantic_cache = SemanticCache()
         try:
-            current_time = datetime.now()
-            prompt = f"""Analiza el siguiente mensaje y determina si es una solicitud para establecer un recordatorio.
-            Si es un recordatorio, extrae la fecha/hora y la descripción. Presta especial atención a expresiones de tiempo relativas como 'en 5 minutos', 'mañana a las 3', etc.
+            self.semantic_cache.load()
+        except Exception as e:
+            self.logger.error(f"Error al cargar la caché semántica: {str(e)}")
+        
+    def _generate(self, route, prompt, user_id=None, channel_id=None, owners=None, **kwargs):
+        # Todas las llamadas al modelo pasan por aquí para registrar tokens y latencia.
+        # owners: [(usuario, canal)] de cada elemento de una llamada por lotes, para repartir su uso
+        kwargs.setdefault('generation_config', self.generation_config)
+        with start_span("gemini.generate_content", route=route) as span:
+            started = time.perf_counter()
+            # La espera en la cola de cuota no cuenta como latencia del modelo
+            response, queue_wait = self.gemini_scheduler.run(
+                route,
+                lambda: self.model.generate_content(prompt, **kwargs),
+                estimated_tokens=estimate_tokens(prompt),
+                count_tokens=_total_tokens
+            )
+            latency_ms = (time.perf_counter() - started - queue_wait) * 1000
+            span.set_attribute("gemini.queue_wait_ms", round(queue_wait * 1000, 2))
+            usage = getattr(response, 'usage_metadata', None)
+            for key in ('prompt_token_count', 'candidates_token_count'):
+                if isinstance(getattr(usage, key, None), int):
+                    span.set_attribute(f"gemini.{key}", getattr(usage, key))
+            
+            recorder = get_recorder()
+            if recorder.enabled:
+                parts = getattr(response, 'parts', None) or []
+                recorder.record(
+                    'gemini',
+                    route=route,
+                    text=parts[0].text if parts else None,
+                    prompt_tokens=getattr(usage, 'prompt_token_count', None),
+                    response_tokens=getattr(usage, 'candidates_token_count', None),
+                    latency_ms=round(latency_ms, 2)
+                )
+        try:
+            self.usage_tracker.record_response(
+                route, prompt, response, latency_ms, user_id=user_id, channel_id=channel_id, owners=owners
+            )
+        except Exception as e:
+            self.logger.error(f"Error al registrar uso de Gemini: {str(e)}")
+        return response
+
+    def _analyze_intent(self, message, timezone=DEFAULT_TIMEZONE, user_id=None, channel_id=None):
+        try:
+            # Usar la hora local del usuario, no la del servidor
+            current_time = datetime.now(pytz.timezone(timezone)).replace(tzinfo=None)
+            prompt = f"""Analiza el siguiente mensaje y determina si es una solicitud para establecer uno o varios recordatorios.
+            Si es un recordatorio, extrae la fecha/hora y la descripción de cada uno. Presta especial atención a expresiones de tiempo relativas como 'en 5 minutos', 'mañana a las 3', etc.
+            Un mismo mensaje puede pedir varios recordatorios (por ejemplo "el pago a las 10, la junta a las 12 y llamar a Juan a las 5"): devuelve uno por cada tarea.
             
             Hora actual: {current_time.strftime('%Y-%m-%d %H:%M')}
+            Zona horaria: {timezone}
             Mensaje: {message}
             
             Si el mensaje contiene una solicitud de recordatorio, convierte la fecha/hora a formato absoluto (YYYY-MM-DD HH:MM) basado en la hora actual proporcionada.
@@ -51,8 +177,12 @@ class RebecaAgent:
             Responde en formato JSON con esta estructura:
             {{
                 "is_reminder": true/false,
-                "datetime": "YYYY-MM-DD HH:MM" (si aplica, en formato absoluto),
-                "description": "descripción del recordatorio" (si aplica)
+                "reminders": [
+                    {{
+                        "datetime": "YYYY-MM-DD HH:MM" (en formato absoluto),
+                        "description": "descripción del recordatorio"
+                    }}
+                ] (si aplica, un elemento por recordatorio)
             }}
             
             La fecha y hora DEBEN estar en formato absoluto, no uses expresiones relativas en la respuesta.
@@ -79,9 +209,11 @@ class RebecaAgent:
             ]
             
             try:
-                response = self.model.generate_content(
+                response = self._generate(
+                    'intent',
                     prompt,
-                    generation_config=self.generation_config,
+                    user_id=user_id,
+                    channel_id=channel_id,
                     safety_settings=safety_settings
                 )
                 
@@ -116,18 +248,10 @@ class RebecaAgent:
                         return {"is_reminder": False}
                     
                     if result.get('is_reminder', False):
-                        if not all(key in result for key in ['datetime', 'description']):
-                            self.logger.error("Faltan campos requeridos en el recordatorio")
-                            return {"is_reminder": False}
-                        
-                        try:
-                            parsed_datetime = datetime.strptime(result['datetime'], "%Y-%m-%d %H:%M")
-                            if parsed_datetime < datetime.now():
-                                self.logger.error("La fecha del recordatorio es en el pasado")
-                                return {"is_reminder": False}
-                        except ValueError as e:
-                            self.logger.error(f"Error al parsear datetime: {str(e)}")
+                        reminders = self._valid_reminders(result, timezone)
+                        if not reminders:
                             return {"is_reminder": False}
+                        result['reminders'] = reminders
                     
                     return result
                     
@@ -165,6 +289,29 @@ class RebecaAgent:
             self.logger.error(f"Error al analizar el intent: {str(e)}")
             return {"is_reminder": False}
     
+    def _valid_reminders(self, result, timezone):
+        # Respuestas de un solo recordatorio (datetime/description en la raíz) se tratan como lista de uno
+        items = result.get('reminders')
+        if not isinstance(items, list):
+            items = [result]
+        
+        now = datetime.now(pytz.timezone(timezone)).replace(tzinfo=None)
+        reminders = []
+        for item in items:
+            if not isinstance(item, dict) or not all(key in item for key in ['datetime', 'description']):
+                self.logger.error(f"Faltan campos requeridos en el recordatorio: {item}")
+                continue
+            try:
+                parsed_datetime = datetime.strptime(item['datetime'], "%Y-%m-%d %H:%M")
+            except (TypeError, ValueError) as e:
+                self.logger.error(f"Error al parsear datetime: {str(e)}")
+                continue
+            if parsed_datetime < now:
+                self.logger.error(f"La fecha del recordatorio es en el pasado: {item['datetime']}")
+                continue
+            reminders.append({'datetime': item['datetime'], 'description': item['description']})
+        return reminders
+
     def _parse_time(self, time_str):
         try:
             return datetime.strptime(time_str, "%Y-%m-%d %H:%M")
@@ -172,46 +319,203 @@ class RebecaAgent:
             self.logger.error(f"Error al parsear el tiempo: {str(e)}")
             return None
 
-    def process_message(self, message, channel_id, user_id):
+    def _handle_reminder_command(self, message, user_id, team_id=None):
+        # Quitar menciones de Slack y normalizar el texto
+        text = re.sub(r'<@[^>]+>', '', message).strip().lower()
+        
+        cancel_match = CANCEL_REMINDER_PATTERN.match(text)
+        if cancel_match:
+            return self._cancel_reminder_command(cancel_match.group(2), user_id, team_id)
+        
+        if LIST_REMINDERS_PATTERN.match(text):
+            reminders = self.reminder_handler.list_user_reminders(user_id, team_id)
+            if not reminders:
+                return ":calendar: No tienes recordatorios pendientes."
+            lines = [":calendar: *Tus recordatorios pendientes:*"]
+            for position, reminder in enumerate(reminders, start=1):
+                lines.append(
+                    f"{position}. `{format_reminder_time(reminder)}` — {reminder.message} "
+                    f"(id `{reminder.reminder_id[:8]}`)"
+                )
+            lines.append("_Para cancelar uno escribe: cancela recordatorio <número>_")
+            return "\n".join(lines)
+        
+        return None
+
+    def _cancel_reminder_command(self, reference, user_id, team_id=None):
+        reminders = self.reminder_handler.list_user_reminders(user_id, team_id)
+        
+        # La referencia puede ser la posición en la lista o el inicio del id
+        target = None
+        if reference.isdigit() and 1 <= int(reference) <= len(reminders):
+            target = reminders[int(reference) - 1]
+        else:
+            matches = [r for r in reminders if r.reminder_id.startswith(reference)]
+            if len(matches) == 1:
+                target = matches[0]
+        
+        if target is None:
+            return f":warning: No encontré el recordatorio `{reference}`. Escribe *mis recordatorios* para ver la lista."
+        
+        # Si Slack lo entrega, primero hay que borrar el mensaje programado
+        was_scheduled = target.scheduled_message_id is not None
+        if not self.slack_offloader.cancel(target):
+            return f":warning: No pude cancelar en Slack el recordatorio `{reference}`; intenta de nuevo en unos minutos."
+        
+        try:
+            cancelled = self.reminder_handler.cancel_reminder(user_id, target.reminder_id, team_id)
+        except Exception as e:
+            self.logger.error(f"Error al registrar la cancelación de {target.reminder_id}: {str(e)}")
+            if was_scheduled:
+                # Slack ya borró el mensaje: se vuelve a programar para que el recordatorio siga como estaba
+                self.slack_offloader.offload([target])
+            return f":warning: No pude cancelar el recordatorio `{reference}`; sigue activo. Intenta de nuevo en unos minutos."
+        if cancelled is None:
+            return f":warning: No encontré el recordatorio `{reference}`. Escribe *mis recordatorios* para ver la lista."
+        return f":wastebasket: Cancelé el recordatorio de `{format_reminder_time(cancelled)}`: {cancelled.message}"
+
+    def _handle_admin_command(self, message, user_id, channel_id=None, team_id=None):
+        text = re.sub(r'<@[^>]+>', '', message).strip().lower()
+        match = ADMIN_COMMAND_PATTERN.match(text)
+        if not match or user_id not in self.admin_users:
+            return None
+        
+        command = match.group(1)
+        if command == 'uso':
+            summary = self.usage_tracker.summary()
+            if self.message_coalescer is not None:
+                summary += "\n" + self.message_coalescer.summary()
+            return summary
+        if command == 'cola':
+            return self.gemini_scheduler.summary()
+        if command == 'cache':
+            stats = self.semantic_cache.stats()
+            return (
+                f":card_file_box: Caché semántica: {stats['entries']}/{stats['capacity']} respuestas, "
+                f"{stats['hits']} aciertos, {stats['misses']} fallos ({stats['hit_rate']:.0%})\n"
+                f"{self.timezone_resolver.summary()}"
+            )
+        if command == 'fallidos':
+            return self._dead_letter_summary()
+        if command == 'perfil':
+            return self._profile_command(match.group(2), channel_id, team_id)
+        if command == 'hilos':
+            path = self.profiler.dump_stacks()
+            with open(path, encoding='utf-8') as f:
+                stacks = f.read()
+            return f":thread: Pilas de hilos guardadas en `{path}`\n```{stacks[-3500:]}```"
+        return f":warning: Comando de administración desconocido: `{command}`"
+
+    def log_ingress_stats(self):
+        # Se llama en cada ciclo del monitoreo para medir lo que ahorra la agrupación y lo que rechaza la admisión
+        if self.message_coalescer is not None:
+            self.logger.info(f"Agrupación de mensajes: {self.message_coalescer.stats()}")
+        if self.admission_controller is not None:
+            self.logger.info(f"Estadísticas de admisión: {self.admission_controller.stats()}")
+
+    def _dead_letter_summary(self):
+        dead = self.outbox.dead_letters()
+        if not dead:
+            return ":white_check_mark: No hay envíos de recordatorios fallidos."
+        lines = [f":rotating_light: Envíos fallidos: {self.outbox.stats()['dead_letter']} (los {len(dead)} más recientes)"]
+        for item in dead:
+            failed_at = datetime.fromtimestamp(item['failed_at'], pytz.utc).strftime('%Y-%m-%d %H:%M UTC')
+            lines.append(
+                f"• {failed_at} canal `{item['channel_id']}`, {len(item['reminder_ids'])} recordatorio(s), "
+                f"{item['attempts']} intentos: {item['last_error']}"
+            )
+        return "\n".join(lines)
+
+    def _profile_command(self, argument, channel_id, team_id=None):
+        argument = (argument or '').strip()
+        if argument in ('detener', 'stop'):
+            if self.profiler.stop():
+                return ":stopwatch: Deteniendo el perfil; el resumen llegará en unos segundos."
+            return ":warning: No hay un perfil en curso."
+        
+        seconds = int(argument) if argument.isdigit() else 30
+        
+        def post_summary(summary):
+            self.slack_handler.send_message(channel_id=channel_id, message=summary, team_id=team_id)
+        
+        if not self.profiler.start(seconds, on_done=post_summary if channel_id else None):
+            return ":warning: Ya hay un perfil en curso. Escribe `admin perfil detener` para terminarlo."
+        return f":stopwatch: Perfilando CPU y memoria durante {min(seconds, MAX_PROFILE_SECONDS)} s; publicaré el resumen aquí."
+
+    @traced("agent.process_message")
+    def process_message(self, message, channel_id, user_id, team_id=None, thread_ts=None):
         try:
             self.logger.info("Iniciando procesamiento del mensaje...")
             
-            # Analizar el intent del mensaje
-            intent = self._analyze_intent(message)
+            # Comandos de administración (solo usuarios en REBECA_ADMIN_USERS)
+            admin_response = self._handle_admin_command(message, user_id, channel_id, team_id)
+            if admin_response is not None:
+                return admin_response
+            
+            # Listar o cancelar recordatorios desde el índice en memoria
+            command_response = self._handle_reminder_command(message, user_id, team_id)
+            if command_response is not None:
+                return command_response
+            
+            # Analizar el intent del mensaje en la zona horaria del usuario
+            timezone = self.timezone_resolver.get_timezone(user_id, team_id)
+            intent = self._analyze_intent(message, timezone=timezone, user_id=user_id, channel_id=channel_id)
             
             if intent.get("is_reminder", False):
-                # Procesar recordatorio
-                reminder_time = self._parse_time(intent["datetime"])
-                if reminder_time:
-                    self.reminder_handler.create_reminder(
+                # Procesar los recordatorios del mensaje: una sola escritura y una sola confirmación
+                items = []
+                for item in intent.get("reminders", []):
+                    reminder_time = self._parse_time(item["datetime"])
+                    if reminder_time:
+                        items.append((item, reminder_time))
+                if items:
+                    self.reminder_handler.create_reminders(
                         user_id=user_id,
-                        message=intent["description"],
+                        items=[(item["description"], reminder_time) for item, reminder_time in items],
                         channel_id=channel_id,
-                        reminder_datetime=reminder_time
+                        timezone=timezone,
+                        team_id=team_id,
+                        offloader=self.slack_offloader
                     )
-                    # Generar confirmación personalizada del recordatorio
-                    confirm_prompt = f"Genera un mensaje amigable para confirmar que he programado un recordatorio. Detalles:\nFecha y hora: {intent['datetime']}\nDescripción: {intent['description']}\n\nReglas:\n- Usa emojis de Slack apropiados\n- Confirma claramente la fecha/hora y el mensaje\n- Añade una frase amigable\n- Usa formato compatible con Slack markdown\n- No uses más de 3 emojis\n- Mantén el mensaje conciso"
-
-                    try:
-                        response = self.model.generate_content(confirm_prompt, generation_config=self.generation_config)
-                        if response and response.parts:
-                            return response.parts[0].text.strip()
-                        else:
-                            return f":calendar: He programado un recordatorio para {intent['datetime']}: {intent['description']}"
-                    except Exception as e:
-                        self.logger.error(f"Error al generar confirmación personalizada: {str(e)}")
-                        return f":calendar: He programado un recordatorio para {intent['datetime']}: {intent['description']}"
+                    return self._confirm_reminders([item for item, _ in items], user_id, channel_id)
                 else:
                     return "Lo siento, no pude entender la fecha y hora del recordatorio."
             else:
                 # Procesar mensaje general con Gemini
-                return self.process_with_gemini(message)
+                # Un hilo tiene su propia conversación; fuera de hilos se usa la del usuario en el canal
+                conversation_key = (team_id, channel_id, thread_ts or user_id)
+                return self.process_with_gemini(
+                    message, user_id=user_id, channel_id=channel_id, conversation_key=conversation_key,
+                    team_id=team_id
+                )
                 
         except Exception as e:
             self.logger.error(f"Error al procesar el mensaje: {str(e)}")
             return "Lo siento, hubo un error al procesar tu mensaje."
 
-    def process_with_gemini(self, message):
+    def _confirm_reminders(self, reminders, user_id=None, channel_id=None):
+        # Una confirmación personalizada para todos los recordatorios del mensaje
+        if len(reminders) == 1:
+            details = f"Fecha y hora: {reminders[0]['datetime']}\nDescripción: {reminders[0]['description']}"
+            confirm_prompt = f"Genera un mensaje amigable para confirmar que he programado un recordatorio. Detalles:\n{details}\n\nReglas:\n- Usa emojis de Slack apropiados\n- Confirma claramente la fecha/hora y el mensaje\n- Añade una frase amigable\n- Usa formato compatible con Slack markdown\n- No uses más de 3 emojis\n- Mantén el mensaje conciso"
+            fallback = f":calendar: He programado un recordatorio para {reminders[0]['datetime']}: {reminders[0]['description']}"
+        else:
+            details = "\n".join(f"- {item['datetime']}: {item['description']}" for item in reminders)
+            confirm_prompt = f"Genera un mensaje amigable para confirmar que he programado {len(reminders)} recordatorios. Detalles:\n{details}\n\nReglas:\n- Usa emojis de Slack apropiados\n- Confirma claramente la fecha/hora y el mensaje de cada recordatorio en una lista\n- Añade una frase amigable\n- Usa formato compatible con Slack markdown\n- No uses más de 3 emojis\n- Mantén el mensaje conciso"
+            fallback = f":calendar: He programado {len(reminders)} recordatorios:\n" + "\n".join(
+                f"• {item['datetime']}: {item['description']}" for item in reminders
+            )
+
+        try:
+            response = self._generate('confirmation', confirm_prompt, user_id=user_id, channel_id=channel_id)
+            if response and response.parts:
+                return response.parts[0].text.strip()
+            return fallback
+        except Exception as e:
+            self.logger.error(f"Error al generar confirmación personalizada: {str(e)}")
+            return fallback
+
+    def process_with_gemini(self, message, user_id=None, channel_id=None, conversation_key=None, team_id=None):
         try:
             self.logger.info("Iniciando procesamiento con Gemini...")
             self.logger.info(f"Mensaje a procesar: {message}")
@@ -221,11 +525,29 @@ class RebecaAgent:
                 self.logger.error("GEMINI_API_KEY no está configurada")
                 return "Lo siento, hay un problema con la configuración de la API. Por favor, contacta al administrador."
 
+            history = self.conversation_memory.history(conversation_key) if conversation_key else []
+            
+            # Responder desde la caché semántica si ya se contestó una pregunta equivalente
+            # (solo al iniciar una conversación: con historial la respuesta depende del contexto).
+            # Las entradas son de cada workspace y no se cachean preguntas sobre la fecha o quien pregunta
+            cached_answer = None
+            if not history:
+                try:
+                    cached_answer = self.semantic_cache.lookup(message, scope=team_id)
+                except Exception as e:
+                    self.logger.error(f"Error al consultar la caché semántica: {str(e)}")
+            if cached_answer is not None:
+                if conversation_key:
+                    self.conversation_memory.append(conversation_key, message, cached_answer)
+                return cached_answer
+
             try:
                 # Modificar el prompt para generar respuestas compatibles con Slack
                 prompt = f"Actúa como un asistente amigable y profesional. Responde al siguiente mensaje: {message}\n\nReglas para la respuesta:\n- Usa formato compatible con Slack markdown cuando sea apropiado\n- Incluye emojis relevantes al contexto (máximo 3)\n- Mantén un tono amigable y profesional\n- Si la respuesta incluye código, usa bloques de código con ```\n- Si la respuesta incluye listas, usa formato de lista de Slack\n- Mantén las respuestas concisas y bien estructuradas"
 
-                response = self.model.generate_content(prompt, generation_config=self.generation_config)
+                # El historial va como turnos previos del chat; las reglas solo en el último mensaje
+                contents = history + [{'role': 'user', 'parts': [prompt]}] if history else prompt
+                response = self._generate('chat', contents, user_id=user_id, channel_id=channel_id)
                 self.logger.info("Respuesta recibida de Gemini")
             except Exception as e:
                 self.logger.error(f"Error al llamar a la API de Gemini: {str(e)}")
@@ -242,6 +564,13 @@ class RebecaAgent:
             self.logger.info("Procesando respuesta de Gemini...")
             result = response.parts[0].text
             self.logger.info(f"Respuesta procesada exitosamente: {result[:100]}...")
+            if conversation_key:
+                self.conversation_memory.append(conversation_key, message, result)
+            if not history:
+                try:
+                    self.semantic_cache.store(message, result, scope=team_id)
+                except Exception as e:
+                    self.logger.error(f"Error al guardar en la caché semántica: {str(e)}")
             return result
             
         except Exception as e:
@@ -249,37 +578,301 @@ class RebecaAgent:
             self.logger.error(f"Tipo de error: {type(e).__name__}")
             return "Lo siento, hubo un error al procesar tu mensaje. Por favor, intenta de nuevo más tarde."
 
+    @traced("reminder.check")
     def check_reminders(self):
         try:
+            # Primero los envíos pendientes de ciclos anteriores
+            self.retry_outbox()
             due_reminders = self.reminder_handler.get_pending_reminders()
-            for reminder in due_reminders:
-                try:
-                    # Si el canal comienza con 'D', es un DM y debemos usar el user_id
-                    channel_to_use = reminder.user_id if reminder.channel_id.startswith('D') else reminder.channel_id
-                    
-                    # Generar un mensaje personalizado para el recordatorio usando Gemini
-                    prompt = f"Genera un mensaje amigable y profesional para notificar un recordatorio en Slack. El mensaje es: {reminder.message}. \nReglas:\n- Usa emojis de Slack apropiados al contexto\n- Incluye el mensaje original entre comillas o en un blockquote\n- Añade una frase motivadora o amigable al final\n- El formato debe ser compatible con el markdown de Slack\n- Varía el estilo y no uses siempre la misma estructura\n- No uses más de 4 emojis en total\n- Mantén el mensaje conciso"
+            recorder = get_recorder()
+            if recorder.enabled:
+                recorder.record('check_reminders', reminders=[asdict(r) for r in due_reminders])
+            self._deliver_reminders(due_reminders)
+        except Exception as e:
+            self.logger.error(f"Error al verificar recordatorios: {str(e)}")
 
-                    try:
-                        response = self.model.generate_content(prompt, generation_config=self.generation_config)
-                        if response and response.parts:
-                            formatted_message = response.parts[0].text.strip()
-                        else:
-                            formatted_message = f":bell: Recordatorio: {reminder.message}"
-                    except Exception as e:
-                        self.logger.error(f"Error al generar mensaje personalizado: {str(e)}")
-                        formatted_message = f":bell: Recordatorio: {reminder.message}"
-                    
-                    self.slack_handler.send_message(
-                        channel_id=channel_to_use,
-                        message=formatted_message
-                    )
-                    self.reminder_handler.mark_reminder_as_executed(reminder.reminder_id)
+    def warm_start(self):
+        # El snapshot local deja listos "mis recordatorios" y las cancelaciones desde el arranque
+        try:
+            self.reminder_handler.load_snapshot()
+        except Exception as e:
+            self.logger.error(f"Error al cargar el snapshot de recordatorios: {str(e)}")
+        
+        # Los vencidos se disparan en segundo plano tras cargar BigQuery: el snapshot no sabe
+        # qué se canceló o ejecutó después de guardarse (en otra réplica o antes de apagarse)
+        reconcile_thread = Thread(target=self._reconcile_reminders, name="reconcile_reminders", daemon=True)
+        reconcile_thread.start()
+        return reconcile_thread
+
+    def fire_overdue_reminders(self):
+        overdue = self.reminder_handler.get_overdue_reminders()
+        if overdue:
+            self.logger.info(f"Enviando {len(overdue)} recordatorios vencidos durante el reinicio")
+            self._deliver_reminders(overdue)
+
+    def _reconcile_reminders(self):
+        try:
+            self.reminder_handler.load_pending_index()
+            self.fire_overdue_reminders()
+            self.reconcile_scheduled_reminders(force=True)
+        except Exception as e:
+            self.logger.error(f"Error al reconciliar recordatorios con BigQuery: {str(e)}")
+
+    def reconcile_scheduled_reminders(self, force=False):
+        # Los mensajes programados que Slack ya publicó se registran como ejecutados;
+        # los que descartó se registran en el historial y vuelven al sondeo en todas las réplicas
+        # El arranque y el ciclo de monitoreo pueden reconciliar a la vez: uno solo registra cada entrega
+        with self._reconcile_lock:
+            delivered, lost = self.slack_offloader.reconcile(self.reminder_handler.pending_index.all(), force=force)
+            delivered = [reminder_id for reminder_id in delivered if not self.reminder_handler.is_closed(reminder_id)]
+            if lost:
+                self.reminder_handler.unschedule_reminders(lost)
+            if delivered:
+                self.reminder_handler.mark_reminders_as_executed(delivered)
+            return delivered
+
+    def _render_scheduled_reminders(self, reminders):
+        # El usuario espera la confirmación mientras se formatean: ruta con prioridad de intent
+        if self.format_batch_size < 2 or len(reminders) < 2:
+            messages = [self._format_reminder(reminder, route='reminder_schedule') for reminder in reminders]
+        else:
+            messages = []
+            for start in range(0, len(reminders), self.format_batch_size):
+                chunk = reminders[start:start + self.format_batch_size]
+                messages.extend(self._format_reminder_chunk(chunk, route='reminder_schedule'))
+        return [
+            (self._destination(reminder), message, build_reminder_blocks(message, reminder.reminder_id))
+            for reminder, message in zip(reminders, messages)
+        ]
+
+    def _deliver_reminders(self, reminders):
+        # Un solo envío a la vez para no duplicar recordatorios entre el arranque y el monitoreo
+        with self._delivery_lock:
+            pending = [
+                r for r in reminders
+                if not self.reminder_handler.is_closed(r.reminder_id) and not self.outbox.contains(r.reminder_id)
+            ]
+            groups = self._group_for_delivery(pending)
+            formatted = self._format_reminders_batched([group[0] for group in groups if len(group) == 1])
+            for group in groups:
+                try:
+                    if len(group) == 1:
+                        with start_span("reminder.fire", reminder_id=group[0].reminder_id):
+                            self._deliver_reminder(group[0], formatted.get(group[0].reminder_id))
+                    else:
+                        with start_span("reminder.digest", reminders=len(group)):
+                            self._deliver_digest(group)
                 except Exception as e:
-                    self.logger.error(f"Error al enviar recordatorio {reminder.reminder_id}: {str(e)}")
+                    ids = ', '.join(r.reminder_id for r in group)
+                    self.logger.error(f"Error al enviar recordatorio {ids}: {str(e)}")
                     continue
+
+    def _destination(self, reminder):
+        # Si el canal comienza con 'D', es un DM y debemos usar el user_id
+        return reminder.user_id if reminder.channel_id.startswith('D') else reminder.channel_id
+
+    def _group_for_delivery(self, reminders):
+        # Un resumen por workspace, canal de destino y minuto de vencimiento
+        groups = {}
+        for reminder in reminders:
+            destination = self._destination(reminder)
+            if reminder.channel_id in self.digest_opt_out_channels or destination in self.digest_opt_out_channels:
+                key = reminder.reminder_id
+            else:
+                try:
+                    due_minute = reminder_due_at(reminder).replace(second=0, microsecond=0)
+                except (TypeError, ValueError):
+                    due_minute = reminder.reminder_id
+                key = (reminder.team_id, destination, due_minute)
+            groups.setdefault(key, []).append(reminder)
+        return list(groups.values())
+
+    def _deliver_digest(self, reminders):
+        # Sin llamadas al modelo; cada mensaje se marca ejecutado en una sola inserción
+        for start in range(0, len(reminders), MAX_DIGEST_ITEMS):
+            self._deliver_digest_message(reminders[start:start + MAX_DIGEST_ITEMS])
+
+    def _deliver_digest_message(self, reminders):
+        first = reminders[0]
+        header = f":bell: *Tienes {len(reminders)} recordatorios para `{format_reminder_time(first)}`:*"
+        items = []
+        for reminder in reminders:
+            # En canales compartidos se menciona a quien creó cada recordatorio
+            owner = f"<@{reminder.user_id}> " if self._destination(reminder) != reminder.user_id else ""
+            items.append((f"• {owner}{reminder.message}", reminder.reminder_id))
+        self._send_reminders(
+            [r.reminder_id for r in reminders],
+            channel_id=self._destination(first),
+            message="\n".join([header] + [text for text, _ in items]),
+            team_id=first.team_id,
+            blocks=build_digest_blocks(header, items)
+        )
+
+    def _format_reminders_batched(self, reminders):
+        # Con varios recordatorios sueltos, se formatean hasta format_batch_size por llamada
+        if self.format_batch_size < 2 or len(reminders) < 2:
+            return {}
+        formatted = {}
+        for start in range(0, len(reminders), self.format_batch_size):
+            chunk = reminders[start:start + self.format_batch_size]
+            messages = self._format_reminder_chunk(chunk)
+            for reminder, message in zip(chunk, messages):
+                formatted[reminder.reminder_id] = message
+        return formatted
+
+    def _format_reminder_chunk(self, reminders, route='reminder_format_batch'):
+        fallback = [f":bell: Recordatorio: {reminder.message}" for reminder in reminders]
+        items = json.dumps([reminder.message for reminder in reminders], ensure_ascii=False)
+        prompt = f"""Genera un mensaje amigable y profesional para notificar en Slack cada uno de estos {len(reminders)} recordatorios.
+        Recordatorios (arreglo JSON): {items}
+        
+        Reglas para cada mensaje:
+        - Usa emojis de Slack apropiados al contexto (no más de 4)
+        - Incluye el mensaje original entre comillas o en un blockquote
+        - Añade una frase motivadora o amigable al final
+        - El formato debe ser compatible con el markdown de Slack
+        - Varía el estilo entre mensajes y mantenlos concisos
+        
+        Responde únicamente con un arreglo JSON de {len(reminders)} cadenas, en el mismo orden que los recordatorios.
+        """
+        
+        try:
+            response = self._generate(
+                route, prompt, owners=[(reminder.user_id, reminder.channel_id) for reminder in reminders]
+            )
+            if not response or not response.parts:
+                return fallback
+            response_text = response.parts[0].text.strip()
+            start_idx = response_text.find('[')
+            end_idx = response_text.rfind(']')
+            if start_idx == -1 or end_idx == -1:
+                self.logger.error("No se encontró un arreglo JSON en el formato por lotes")
+                return fallback
+            messages = json.loads(response_text[start_idx:end_idx + 1])
         except Exception as e:
-            self.logger.error(f"Error al verificar recordatorios: {str(e)}")
+            self.logger.error(f"Error al formatear recordatorios por lotes: {str(e)}")
+            return fallback
+        
+        # Si la cantidad no coincide no se puede confiar en el orden; cada elemento inválido usa la plantilla
+        if not isinstance(messages, list) or len(messages) != len(reminders):
+            self.logger.error(f"El formato por lotes devolvió {len(messages) if isinstance(messages, list) else 0} "
+                              f"mensajes para {len(reminders)} recordatorios")
+            return fallback
+        return [
+            message.strip() if isinstance(message, str) and message.strip() else fallback[i]
+            for i, message in enumerate(messages)
+        ]
+
+    def _deliver_reminder(self, reminder, formatted_message=None):
+        channel_to_use = self._destination(reminder)
+        if formatted_message is None:
+            formatted_message = self._format_reminder(reminder)
+        
+        self._send_reminders(
+            [reminder.reminder_id],
+            channel_id=channel_to_use,
+            message=formatted_message,
+            team_id=reminder.team_id,
+            blocks=build_reminder_blocks(formatted_message, reminder.reminder_id)
+        )
+
+    def _send_reminders(self, reminder_ids, channel_id, message, team_id=None, blocks=None):
+        # Registrar el envío antes de intentarlo para que sobreviva a fallos y reinicios
+        entry = self.outbox.enqueue(reminder_ids, channel_id, message, team_id=team_id, blocks=blocks)
+        return self._attempt_delivery(entry)
+
+    def _attempt_delivery(self, entry):
+        if not entry.sent:
+            error = "chat_postMessage no confirmó el envío"
+            try:
+                sent = self.slack_handler.send_message(
+                    channel_id=entry.channel_id,
+                    message=entry.message,
+                    team_id=entry.team_id,
+                    blocks=entry.blocks
+                )
+            except Exception as e:
+                sent = False
+                error = str(e)
+            if not sent:
+                if self.outbox.fail(entry, error):
+                    self._dead_lettered(entry, error)
+                return False
+            self.outbox.mark_sent(entry)
+        
+        try:
+            if len(entry.reminder_ids) == 1:
+                self.reminder_handler.mark_reminder_as_executed(entry.reminder_ids[0])
+            else:
+                self.reminder_handler.mark_reminders_as_executed(entry.reminder_ids)
+        except Exception as e:
+            error = f"Error al marcar como ejecutado: {str(e)}"
+            if self.outbox.fail(entry, error):
+                self._dead_lettered(entry, error)
+            return False
+        self.outbox.complete(entry)
+        return True
+
+    def _dead_lettered(self, entry, error):
+        # Alerta en el log y, si el mensaje nunca salió, el recordatorio se cierra como fallido
+        self.logger.critical(
+            f"ALERTA: envío de recordatorios {entry.reminder_ids} al canal {entry.channel_id} "
+            f"descartado tras {entry.attempts + 1} intentos ({error}). Revisa `admin fallidos`"
+        )
+        if entry.sent:
+            # Slack lo entregó pero el historial no lo registró: no se marca como fallido
+            return
+        try:
+            self.reminder_handler.mark_reminders_as_failed(entry.reminder_ids)
+        except Exception as e:
+            self.logger.error(f"No se pudieron marcar como fallidos {entry.reminder_ids}: {str(e)}")
+
+    def retry_outbox(self):
+        # Reintentar en lote los envíos cuyo backoff ya venció
+        entries = self.outbox.due(self.outbox_batch_size)
+        if not entries:
+            return 0
+        delivered = 0
+        with self._delivery_lock:
+            for entry in entries:
+                with start_span("reminder.retry", reminders=len(entry.reminder_ids), attempt=entry.attempts + 1):
+                    delivered += self._attempt_delivery(entry)
+        self.logger.info(f"Reintentos de la bandeja de envíos: {delivered}/{len(entries)} entregados")
+        return delivered
+
+    def _format_reminder(self, reminder, route='reminder_format'):
+        # Generar un mensaje personalizado para el recordatorio usando Gemini
+        prompt = f"Genera un mensaje amigable y profesional para notificar un recordatorio en Slack. El mensaje es: {reminder.message}. \nReglas:\n- Usa emojis de Slack apropiados al contexto\n- Incluye el mensaje original entre comillas o en un blockquote\n- Añade una frase motivadora o amigable al final\n- El formato debe ser compatible con el markdown de Slack\n- Varía el estilo y no uses siempre la misma estructura\n- No uses más de 4 emojis en total\n- Mantén el mensaje conciso"
+
+        try:
+            response = self._generate(
+                route, prompt, user_id=reminder.user_id, channel_id=reminder.channel_id
+            )
+            if response and response.parts:
+                formatted_message = response.parts[0].text.strip()
+            else:
+                formatted_message = f":bell: Recordatorio: {reminder.message}"
+        except Exception as e:
+            self.logger.error(f"Error al generar mensaje personalizado: {str(e)}")
+            formatted_message = f":bell: Recordatorio: {reminder.message}"
+        return formatted_message
+
+    def snooze_reminder(self, reminder_id, minutes, user_id, team_id=None):
+        # Botón "posponer": sin llamadas al modelo, solo el índice y una inserción en BigQuery
+        reminder = self.reminder_handler.find_reminder(reminder_id)
+        if reminder is None:
+            return f":warning: No encontré el recordatorio `{reminder_id[:8]}`."
+        if reminder.user_id != user_id:
+            return None
+        snoozed = self.reminder_handler.snooze_reminder(reminder, minutes)
+        return f":zzz: Pospuesto hasta `{format_reminder_time(snoozed)}` por <@{user_id}>"
+
+    def complete_reminder(self, reminder_id, user_id, team_id=None):
+        # Botón "hecho": el recordatorio ya quedó ejecutado al enviarse, solo se quitan los botones
+        reminder = self.reminder_handler.find_reminder(reminder_id)
+        if reminder is not None and reminder.user_id != user_id:
+            return None
+        return f":white_check_mark: Marcado como hecho por <@{user_id}>"
 
 def create_agent():
     return RebecaAgent()
\ No newline at end of file
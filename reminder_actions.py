@@ -0,0 +1,118 @@
+import re
+import logging
+from workspace_store import workspace_team_id
+
+# Botones de las notificaciones de recordatorio y los minutos que pospone cada uno
+ACTION_SNOOZE_10M = 'reminder_snooze_10m'
+ACTION_SNOOZE_1H = 'reminder_snooze_1h'
+ACTION_DONE = 'reminder_done'
+SNOOZE_MINUTES = {ACTION_SNOOZE_10M: 10, ACTION_SNOOZE_1H: 60}
+REMINDER_ACTION_PATTERN = re.compile(r'^reminder_(snooze_\w+|done)$')
+
+
+REMINDER_ACTIONS_BLOCK = 'reminder_actions'
+# Slack admite hasta 50 bloques por mensaje: encabezado más texto y botones de cada recordatorio
+MAX_DIGEST_ITEMS = 24
+
+
+def build_reminder_blocks(text: str, reminder_id: str) -> list:
+    return [
+        {'type': 'section', 'text': {'type': 'mrkdwn', 'text': text}},
+        _actions_block(reminder_id, REMINDER_ACTIONS_BLOCK)
+    ]
+
+
+def build_digest_blocks(header: str, items: list) -> list:
+    # items: [(texto, reminder_id)]; cada recordatorio del resumen lleva sus propios botones
+    blocks = [{'type': 'section', 'text': {'type': 'mrkdwn', 'text': header}}]
+    for text, reminder_id in items:
+        blocks.append({'type': 'section', 'text': {'type': 'mrkdwn', 'text': text}})
+        blocks.append(_actions_block(reminder_id, f"{REMINDER_ACTIONS_BLOCK}_{reminder_id}"))
+    return blocks
+
+
+def _actions_block(reminder_id: str, block_id: str) -> dict:
+    return {
+        'type': 'actions',
+        'block_id': block_id,
+        'elements': [
+            {
+                'type': 'button',
+                'action_id': ACTION_SNOOZE_10M,
+                'text': {'type': 'plain_text', 'text': ':zzz: 10 min', 'emoji': True},
+                'value': reminder_id
+            },
+            {
+                'type': 'button',
+                'action_id': ACTION_SNOOZE_1H,
+                'text': {'type': 'plain_text', 'text': ':zzz: 1 h', 'emoji': True},
+                'value': reminder_id
+            },
+            {
+                'type': 'button',
+                'action_id': ACTION_DONE,
+                'style': 'primary',
+                'text': {'type': 'plain_text', 'text': ':white_check_mark: Hecho', 'emoji': True},
+                'value': reminder_id
+            }
+        ]
+    }
+
+
+def build_resolved_blocks(text: str, note: str) -> list:
+    # El mensaje original sin botones y con el resultado de la acción
+    return [
+        {'type': 'section', 'text': {'type': 'mrkdwn', 'text': text}},
+        {'type': 'context', 'elements': [{'type': 'mrkdwn', 'text': note}]}
+    ]
+
+
+def build_resolved_item_blocks(blocks: list, block_id: str, note: str) -> list:
+    # En un resumen solo se sustituyen los botones del recordatorio usado; los demás siguen activos
+    return [
+        {'type': 'context', 'elements': [{'type': 'mrkdwn', 'text': note}]} if block.get('block_id') == block_id else block
+        for block in blocks
+    ]
+
+
+def register_reminder_actions(app, agent) -> None:
+    logger = logging.getLogger(__name__)
+
+    @app.action(REMINDER_ACTION_PATTERN)
+    def handle_reminder_action(ack, body, action, respond):
+        # Confirmar de inmediato; la actualización no llama al modelo
+        ack()
+        action_id = action['action_id']
+        reminder_id = action['value']
+        user_id = body['user']['id']
+        team_id = workspace_team_id((body.get('team') or {}).get('id'))
+        message = body.get('message') or {}
+        blocks = message.get('blocks') or []
+        text = blocks[0]['text']['text'] if blocks and blocks[0].get('text') else message.get('text', '')
+
+        try:
+            if action_id == ACTION_DONE:
+                note = agent.complete_reminder(reminder_id, user_id, team_id)
+            elif action_id in SNOOZE_MINUTES:
+                note = agent.snooze_reminder(reminder_id, SNOOZE_MINUTES[action_id], user_id, team_id)
+            else:
+                logger.warning(f"Acción de recordatorio desconocida: {action_id}")
+                return
+        except Exception as e:
+            logger.error(f"Error al procesar la acción {action_id} del recordatorio {reminder_id}: {str(e)}")
+            respond(text=":warning: No pude actualizar el recordatorio.", response_type='ephemeral', replace_original=False)
+            return
+
+        if note is None:
+            respond(
+                text=":warning: Solo quien creó el recordatorio puede usar estos botones.",
+                response_type='ephemeral',
+                replace_original=False
+            )
+            return
+        block_id = action.get('block_id', REMINDER_ACTIONS_BLOCK)
+        if block_id != REMINDER_ACTIONS_BLOCK:
+            respond(text=message.get('text', text), blocks=build_resolved_item_blocks(blocks, block_id, note),
+                    replace_original=True)
+            return
+        respond(text=text, blocks=build_resolved_blocks(text, note), replace_original=True)
@@ -1,14 +1,26 @@
+from collections import OrderedDict
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
+from itertools import chain
+import sys
+import threading
 import uuid
 from google.cloud import bigquery
-from typing import Optional, Dict
+from typing import Iterator, Optional
 import json
+import logging
 import os
 from google.oauth2 import service_account
 import pytz
+from reminder_index import PendingReminderIndex, ExecutedIdSet, reminder_due_at
+from scheduler_snapshot import SchedulerSnapshot
+from tracing import traced
+from traffic_recorder import recorded_latency
+from timezone_resolver import DEFAULT_TIMEZONE
+from bigquery_writer import create_row_writer
+from table_partitioning import is_partitioned
 
-@dataclass
+@dataclass(slots=True)
 class Reminder:
     user_id: str
     message: str
@@ -19,17 +31,62 @@ class Reminder:
     status: str = 'pending'
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
+    timezone: str = DEFAULT_TIMEZONE
+    team_id: Optional[str] = None
+    # Mensaje programado en Slack (chat.scheduleMessage); si existe, Slack lo entrega y el sondeo lo omite
+    scheduled_message_id: Optional[str] = None
+    scheduled_channel: Optional[str] = None
+
+    def __post_init__(self):
+        # Usuarios, canales, zonas y workspaces se repiten entre miles de recordatorios: una sola copia de cada uno
+        if type(self.user_id) is str:
+            self.user_id = sys.intern(self.user_id)
+        if type(self.channel_id) is str:
+            self.channel_id = sys.intern(self.channel_id)
+        if type(self.timezone) is str:
+            self.timezone = sys.intern(self.timezone)
+        if type(self.team_id) is str:
+            self.team_id = sys.intern(self.team_id)
+        if type(self.reminder_type) is str:
+            self.reminder_type = sys.intern(self.reminder_type)
+        if type(self.status) is str:
+            self.status = sys.intern(self.status)
+        if type(self.scheduled_channel) is str:
+            self.scheduled_channel = sys.intern(self.scheduled_channel)
 
 class ReminderHandler:
-    def __init__(self, project_id: str, dataset_id: str):
+    def __init__(self, project_id: str, dataset_id: str, client=None, writer=None):
         self.project_id = project_id
         self.dataset_id = dataset_id
         self.table_id = 'user_reminders'
         self.history_table_id = 'user_reminders_history'
+        self.logger = logging.getLogger(__name__)
+        
+        # Índice en memoria de recordatorios pendientes por usuario
+        self.pending_index = PendingReminderIndex()
+        self._closed_ids = ExecutedIdSet()
+        # Recordatorios cuyo mensaje programado descartó Slack: vuelven al sondeo aunque su fila tenga el id
+        self._unscheduled_ids = ExecutedIdSet()
+        self.snapshot = SchedulerSnapshot()
+        self.catchup_max_age = int(os.getenv('REMINDER_CATCHUP_MAX_AGE', '21600'))
+        
+        # Recordatorios enviados recientemente, para posponerlos desde los botones sin consultar BigQuery
+        self._fired = OrderedDict()
+        self._fired_lock = threading.Lock()
+        self.fired_cache_size = int(os.getenv('REMINDER_FIRED_CACHE_SIZE', '1000'))
+        
+        # Marca de agua de la última sincronización incremental con BigQuery
+        self._watermark = None
+        self._sync_lock = threading.RLock()
+        self.watermark_overlap = int(os.getenv('REMINDER_WATERMARK_OVERLAP', '300'))
+        self.lookahead = int(os.getenv('REMINDER_LOOKAHEAD_SECONDS', '40'))
+        self.page_size = int(os.getenv('REMINDER_QUERY_PAGE_SIZE', '10000'))
         
         # Configurar cliente con credenciales desde variable de entorno
         credentials_json = os.getenv('GOOGLE_APPLICATION_CREDENTIALS_JSON')
-        if credentials_json:
+        if client is not None:
+            self.client = client
+        elif credentials_json:
             credentials_info = json.loads(credentials_json)
             credentials = service_account.Credentials.from_service_account_info(credentials_info)
             self.client = bigquery.Client(
@@ -41,133 +98,477 @@ class ReminderHandler:
         
         # Crear tablas si no existen
         self._ensure_tables_exist()
+        
+        # Escrituras de recordatorios e historial agrupadas (Storage Write API o insert_rows_json)
+        self.writer = writer or create_row_writer(self.client)
 
-    def create_reminder(self, user_id: str, message: str, channel_id: str, reminder_datetime: datetime) -> Reminder:
-        reminder_id = str(uuid.uuid4())
-        reminder = Reminder(
-            user_id=user_id,
-            message=message,
-            reminder_type='once',
-            reminder_id=reminder_id,
-            channel_id=channel_id,
-            datetime=reminder_datetime.isoformat(),
-            created_at=datetime.now(pytz.timezone('America/Mexico_City')),
-            updated_at=datetime.now(pytz.timezone('America/Mexico_City'))
-        )
+    def create_reminder(self, user_id: str, message: str, channel_id: str, reminder_datetime: datetime,
+                        timezone: str = DEFAULT_TIMEZONE, team_id: Optional[str] = None) -> Reminder:
+        return self.create_reminders(user_id, [(message, reminder_datetime)], channel_id, timezone, team_id)[0]
+
+    def create_reminders(self, user_id: str, items: list, channel_id: str,
+                         timezone: str = DEFAULT_TIMEZONE, team_id: Optional[str] = None,
+                         offloader=None) -> list[Reminder]:
+        # Varios recordatorios del mismo mensaje (descripción, fecha) se guardan en una sola escritura
+        reminders = []
+        for message, reminder_datetime in items:
+            # La fecha se guarda como hora local (sin offset) junto con la zona horaria del usuario
+            if reminder_datetime.tzinfo is not None:
+                reminder_datetime = reminder_datetime.astimezone(pytz.timezone(timezone)).replace(tzinfo=None)
+            reminders.append(Reminder(
+                user_id=user_id,
+                message=message,
+                reminder_type='once',
+                reminder_id=str(uuid.uuid4()),
+                channel_id=channel_id,
+                datetime=reminder_datetime.isoformat(),
+                created_at=datetime.now(pytz.timezone(timezone)),
+                updated_at=datetime.now(pytz.timezone(timezone)),
+                timezone=timezone,
+                team_id=team_id
+            ))
+        if not reminders:
+            return []
         
-        self._save_to_bigquery(reminder)
-        return reminder
+        # Se programan en Slack antes de guardarlos para que la fila ya lleve el scheduled_message_id
+        if offloader is not None:
+            offloader.offload(reminders)
+        try:
+            self._save_many_to_bigquery(reminders)
+        except Exception:
+            if offloader is not None:
+                offloader.cancel_all(reminders)
+            raise
+        for reminder in reminders:
+            self.pending_index.add(reminder)
+        return reminders
 
     def _save_to_bigquery(self, reminder: Reminder) -> None:
+        self._save_many_to_bigquery([reminder])
+
+    @traced("bigquery.insert_reminder")
+    @recorded_latency("bigquery", "insert_reminder")
+    def _save_many_to_bigquery(self, reminders: list[Reminder]) -> None:
         table_ref = f"{self.project_id}.{self.dataset_id}.{self.table_id}"
 
-        row = {
-            'reminder_id': reminder.reminder_id,
-            'slack_user_id': reminder.user_id,
-            'title': reminder.message,
-            'trigger_type': reminder.reminder_type,
-            'trigger_params': json.dumps({'channel_id': reminder.channel_id, 'datetime': reminder.datetime}),
-            'status': reminder.status,
-            'created_at': datetime.now(pytz.timezone('America/Mexico_City')).isoformat()
-        }
+        rows = [
+            {
+                'reminder_id': reminder.reminder_id,
+                'slack_user_id': reminder.user_id,
+                'title': reminder.message,
+                'trigger_type': reminder.reminder_type,
+                'trigger_params': self._trigger_params(reminder),
+                'status': reminder.status,
+                'created_at': datetime.now(pytz.timezone(reminder.timezone)).isoformat()
+            }
+            for reminder in reminders
+        ]
 
-        errors = self.client.insert_rows_json(table_ref, [row])
-        if errors:
-            raise Exception(f'Error inserting reminder: {errors}')
+        try:
+            self.writer.write(table_ref, rows)
+        except Exception as e:
+            raise Exception(f'Error inserting reminder: {e}')
 
+    @traced("bigquery.pending_reminders")
+    @recorded_latency("bigquery", "pending_reminders")
     def get_pending_reminders(self) -> list[Reminder]:
+        # Sincronizar solo lo nuevo desde la marca de agua y resolver los vencidos desde el índice
+        self.sync_pending_index()
+        
+        now = datetime.now(pytz.utc)
+        oldest = now - timedelta(seconds=self.catchup_max_age)
+        horizon = now + timedelta(seconds=self.lookahead)
+        due = []
+        for reminder in self.pending_index.all():
+            try:
+                due_at = reminder_due_at(reminder)
+            except (TypeError, ValueError):
+                continue
+            if reminder.scheduled_message_id:
+                continue
+            if oldest <= due_at <= horizon and reminder.reminder_id not in self._closed_ids:
+                due.append(reminder)
+        return sorted(due, key=reminder_due_at)
+
+    def sync_pending_index(self) -> None:
+        # Carga completa la primera vez; después solo lo creado o cerrado desde la marca de agua
+        with self._sync_lock:
+            if self._watermark is None:
+                self.load_pending_index()
+            else:
+                self._fetch_incremental()
+
+    def _fetch_incremental(self) -> None:
+        table_ref = f"{self.project_id}.{self.dataset_id}.{self.table_id}"
+        history_table_ref = f"{self.project_id}.{self.dataset_id}.{self.history_table_id}"
+        
+        # Recordatorios creados y cerrados desde la última marca de agua (con traslape por desfase de relojes)
+        query = f"""
+        SELECT 'reminder' AS kind, {self._pending_columns('r')}
+        FROM `{table_ref}` r
+        WHERE r.created_at > TIMESTAMP_SUB(@watermark, INTERVAL @overlap SECOND)
+        AND r.status = 'pending'
+        UNION ALL
+        SELECT IF(h.status = 'unscheduled', 'unscheduled', 'closed') AS kind, h.reminder_id, NULL, NULL, NULL,
+               h.status, h.created_at, NULL, NULL, NULL, NULL, NULL, NULL
+        FROM `{history_table_ref}` h
+        WHERE h.created_at > TIMESTAMP_SUB(@watermark, INTERVAL @overlap SECOND)
+        AND h.status IN ('executed', 'cancelled', 'failed', 'unscheduled')
+        """
+        
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("watermark", "TIMESTAMP", self._watermark),
+                bigquery.ScalarQueryParameter("overlap", "INT64", self.watermark_overlap)
+            ]
+        )
+        
+        started_at = datetime.now(pytz.utc)
+        query_job = self.client.query(query, job_config=job_config)
+        
+        # Un cierre quita el recordatorio aunque llegue después en la misma página y evita reinsertarlo si llega antes
+        count = 0
+        for row in query_job.result(page_size=self.page_size):
+            count += 1
+            if row.kind == 'closed':
+                self._closed_ids.add(row.reminder_id)
+                self.pending_index.remove(row.reminder_id)
+            elif row.kind == 'unscheduled':
+                self._unscheduled_ids.add(row.reminder_id)
+                reminder = self.pending_index.get(row.reminder_id)
+                if reminder is not None:
+                    reminder.scheduled_message_id = None
+                    reminder.scheduled_channel = None
+            elif row.reminder_id not in self._closed_ids:
+                self.pending_index.add(self._pending_row_to_reminder(row))
+        
+        self._watermark = started_at
+        self.logger.debug(f"Sincronización incremental de recordatorios: {count} filas")
+
+    @traced("bigquery.load_pending_index")
+    def load_pending_index(self) -> None:
+        # Cargar los recordatorios pendientes (sin ejecutar ni cancelar) al índice
         table_ref = f"{self.project_id}.{self.dataset_id}.{self.table_id}"
         history_table_ref = f"{self.project_id}.{self.dataset_id}.{self.history_table_id}"
         
         query = f"""
-        WITH executed_reminders AS (
+        SELECT {self._pending_columns('r')}, u.reminder_id IS NOT NULL AS unscheduled
+        FROM `{table_ref}` r
+        LEFT JOIN (
             SELECT DISTINCT reminder_id
             FROM `{history_table_ref}`
-            WHERE status = 'executed'
-        ),
-        current_time AS (
-            SELECT DATETIME(CURRENT_TIMESTAMP(), 'America/Mexico_City') as cdmx_time
-        ),
-        reminder_times AS (
-            SELECT r.*,
-                   PARSE_DATETIME('%Y-%m-%dT%H:%M:%S', JSON_EXTRACT_SCALAR(r.trigger_params, '$.datetime')) as reminder_time
-            FROM `{table_ref}` r
-        )
-        SELECT r.*
-        FROM reminder_times r
-        LEFT JOIN executed_reminders e ON r.reminder_id = e.reminder_id
-        CROSS JOIN current_time ct
+            WHERE status IN ('executed', 'cancelled', 'failed')
+        ) e ON r.reminder_id = e.reminder_id
+        LEFT JOIN (
+            SELECT DISTINCT reminder_id
+            FROM `{history_table_ref}`
+            WHERE status = 'unscheduled'
+        ) u ON r.reminder_id = u.reminder_id
         WHERE e.reminder_id IS NULL
         AND r.status = 'pending'
-        AND ABS(TIMESTAMP_DIFF(
-            TIMESTAMP(r.reminder_time),
-            TIMESTAMP(ct.cdmx_time),
-            SECOND
-        )) <= 40
+        AND TIMESTAMP(
+            PARSE_DATETIME('%Y-%m-%dT%H:%M:%S', JSON_EXTRACT_SCALAR(r.trigger_params, '$.datetime')),
+            COALESCE(JSON_EXTRACT_SCALAR(r.trigger_params, '$.timezone'), '{DEFAULT_TIMEZONE}')
+        ) >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @max_age SECOND)
         """
         
-        query_job = self.client.query(query)
-        results = query_job.result()
-
-        reminders = []
-        for row in results:
-            trigger_params = json.loads(row.trigger_params)
-            reminder = Reminder(
-                user_id=row.slack_user_id,
-                message=row.title,
-                reminder_type=row.trigger_type,
-                reminder_id=row.reminder_id,
-                channel_id=trigger_params['channel_id'],
-                datetime=trigger_params['datetime'],
-                status=row.status,
-                created_at=row.created_at,
-                updated_at=None
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("max_age", "INT64", self.catchup_max_age)
+            ]
+        )
+        
+        with self._sync_lock:
+            started_at = datetime.now(pytz.utc)
+            query_job = self.client.query(query, job_config=job_config)
+            loaded = (
+                reminder for reminder in self._iter_pending_reminders(query_job)
+                if reminder.reminder_id not in self._closed_ids
             )
-            reminders.append(reminder)
+            
+            def created_during_load():
+                # Se evalúa al terminar de leer la consulta: conserva los recordatorios creados mientras corría
+                yield from [
+                    reminder for reminder in self.pending_index.all()
+                    if reminder.created_at is not None and reminder.created_at >= started_at
+                ]
+            
+            self.pending_index.replace_all(chain(loaded, created_during_load()))
+            self._watermark = started_at
+            self.logger.info(f"Índice de recordatorios cargado: {len(self.pending_index)} pendientes")
 
-        return reminders
+    def _pending_columns(self, alias: str) -> str:
+        # Los campos de trigger_params se extraen en BigQuery para no decodificar el JSON de cada fila
+        return f"""{alias}.reminder_id, {alias}.slack_user_id, {alias}.title, {alias}.trigger_type,
+               {alias}.status, {alias}.created_at,
+               JSON_EXTRACT_SCALAR({alias}.trigger_params, '$.channel_id') AS channel_id,
+               JSON_EXTRACT_SCALAR({alias}.trigger_params, '$.datetime') AS reminder_datetime,
+               JSON_EXTRACT_SCALAR({alias}.trigger_params, '$.timezone') AS timezone,
+               JSON_EXTRACT_SCALAR({alias}.trigger_params, '$.team_id') AS team_id,
+               JSON_EXTRACT_SCALAR({alias}.trigger_params, '$.scheduled_message_id') AS scheduled_message_id,
+               JSON_EXTRACT_SCALAR({alias}.trigger_params, '$.scheduled_channel') AS scheduled_channel"""
 
-    def mark_reminder_as_executed(self, reminder_id: str) -> None:
-        table_ref = f"{self.project_id}.{self.dataset_id}.{self.table_id}"
-        history_table_ref = f"{self.project_id}.{self.dataset_id}.{self.history_table_id}"
+    def _iter_pending_reminders(self, query_job) -> Iterator[Reminder]:
+        # RowIterator pide las páginas a medida que se consumen; nunca hay más de una página de filas en memoria
+        for row in query_job.result(page_size=self.page_size):
+            yield self._pending_row_to_reminder(row)
+
+    def _pending_row_to_reminder(self, row) -> Reminder:
+        # Una fila 'unscheduled' del historial anula el mensaje programado guardado al crearlo
+        unscheduled = getattr(row, 'unscheduled', False) is True or row.reminder_id in self._unscheduled_ids
+        return Reminder(
+            user_id=row.slack_user_id,
+            message=row.title,
+            reminder_type=row.trigger_type,
+            reminder_id=row.reminder_id,
+            channel_id=row.channel_id,
+            datetime=row.reminder_datetime,
+            status=row.status,
+            created_at=row.created_at,
+            updated_at=None,
+            timezone=row.timezone or DEFAULT_TIMEZONE,
+            team_id=row.team_id,
+            scheduled_message_id=None if unscheduled else row.scheduled_message_id,
+            scheduled_channel=None if unscheduled else row.scheduled_channel
+        )
+
+    def get_overdue_reminders(self, now: datetime = None) -> list[Reminder]:
+        # Recordatorios del índice cuya hora ya pasó, dentro de la antigüedad máxima de recuperación
+        now = now or datetime.now(pytz.utc)
+        oldest = now - timedelta(seconds=self.catchup_max_age)
+        overdue = []
+        for reminder in self.pending_index.all():
+            if reminder.scheduled_message_id:
+                continue
+            try:
+                due_at = reminder_due_at(reminder)
+            except (TypeError, ValueError):
+                continue
+            if oldest <= due_at <= now:
+                overdue.append(reminder)
+        return sorted(overdue, key=reminder_due_at)
+
+    def find_reminder(self, reminder_id: str) -> Optional[Reminder]:
+        # Índice de pendientes, luego enviados recientes y, como último recurso, BigQuery
+        reminder = self.pending_index.get(reminder_id)
+        if reminder is not None:
+            return reminder
+        with self._fired_lock:
+            reminder = self._fired.get(reminder_id)
+        if reminder is not None:
+            return reminder
         
-        # Obtener el recordatorio pendiente
+        table_ref = f"{self.project_id}.{self.dataset_id}.{self.table_id}"
         query = f"""
         SELECT *
         FROM `{table_ref}`
         WHERE reminder_id = @reminder_id
-        AND status = 'pending'
+        LIMIT 1
         """
-        
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
                 bigquery.ScalarQueryParameter("reminder_id", "STRING", reminder_id)
             ]
         )
+        rows = list(self.client.query(query, job_config=job_config).result())
+        return self._row_to_reminder(rows[0]) if rows else None
+
+    def snooze_reminder(self, reminder: Reminder, minutes: int) -> Reminder:
+        # Un recordatorio nuevo con el mismo contenido, minutos después de ahora en la zona del usuario
+        snooze_until = datetime.now(pytz.timezone(reminder.timezone)) + timedelta(minutes=minutes)
+        return self.create_reminder(
+            user_id=reminder.user_id,
+            message=reminder.message,
+            channel_id=reminder.channel_id,
+            reminder_datetime=snooze_until.replace(microsecond=0),
+            timezone=reminder.timezone,
+            team_id=reminder.team_id
+        )
+
+    def _remember_fired(self, reminder: Reminder) -> None:
+        with self._fired_lock:
+            self._fired[reminder.reminder_id] = reminder
+            while len(self._fired) > self.fired_cache_size:
+                self._fired.popitem(last=False)
+
+    def is_closed(self, reminder_id: str) -> bool:
+        return reminder_id in self._closed_ids
+
+    def save_snapshot(self) -> int:
+        return self.snapshot.save(self.pending_index.all())
+
+    def load_snapshot(self) -> int:
+        reminders = [
+            Reminder(status='pending', **fields)
+            for fields in self.snapshot.load()
+            if fields['reminder_id'] not in self._closed_ids
+        ]
+        for reminder in reminders:
+            self.pending_index.add(reminder)
+        self.logger.info(f"Snapshot de recordatorios cargado: {len(reminders)} pendientes")
+        return len(reminders)
+
+    def list_user_reminders(self, user_id: str, team_id: Optional[str] = None) -> list[Reminder]:
+        return self.pending_index.list_for_user(user_id, team_id)
+
+    @traced("bigquery.cancel_reminder")
+    @recorded_latency("bigquery", "cancel_reminder")
+    def cancel_reminder(self, user_id: str, reminder_id: str, team_id: Optional[str] = None) -> Optional[Reminder]:
+        reminder = self.pending_index.get(reminder_id)
+        if reminder is None or reminder.user_id != user_id or reminder.team_id != team_id:
+            return None
         
-        query_job = self.client.query(query, job_config=job_config)
-        results = list(query_job.result())
+        # Registrar la cancelación en la tabla de historial
+        history_table_ref = f"{self.project_id}.{self.dataset_id}.{self.history_table_id}"
+        now = datetime.now(pytz.timezone(reminder.timezone)).isoformat()
+        row = self._history_row(reminder, 'cancelled', now)
         
-        if not results:
-            raise Exception(f'Pending reminder {reminder_id} not found')
-            
-        current_reminder = results[0]
-        
-        # Insertar el estado ejecutado en la tabla de historial
-        row = {
-            'reminder_id': current_reminder.reminder_id,
-            'slack_user_id': current_reminder.slack_user_id,
-            'title': current_reminder.title,
-            'trigger_type': current_reminder.trigger_type,
-            'trigger_params': current_reminder.trigger_params,
-            'status': 'executed',
-            'created_at': datetime.now(pytz.timezone('America/Mexico_City')).isoformat(),
-            'executed_at': datetime.now(pytz.timezone('America/Mexico_City')).isoformat()
+        try:
+            self.writer.write(history_table_ref, [row])
+        except Exception as e:
+            raise Exception(f'Error cancelling reminder: {e}')
+        
+        self.pending_index.remove(reminder_id)
+        self._closed_ids.add(reminder_id)
+        reminder.status = 'cancelled'
+        return reminder
+
+    @traced("bigquery.unschedule_reminders")
+    @recorded_latency("bigquery", "unschedule_reminders")
+    def unschedule_reminders(self, reminders: list) -> None:
+        # Slack descartó sus mensajes programados: el historial lo registra para que todas las réplicas los sondeen
+        if not reminders:
+            return
+        history_table_ref = f"{self.project_id}.{self.dataset_id}.{self.history_table_id}"
+        now = datetime.now(pytz.timezone(DEFAULT_TIMEZONE)).isoformat()
+        rows = [self._history_row(reminder, 'unscheduled', now) for reminder in reminders]
+        
+        try:
+            self.writer.write(history_table_ref, rows)
+        except Exception as e:
+            raise Exception(f'Error unscheduling reminders: {e}')
+        
+        for reminder in reminders:
+            self._unscheduled_ids.add(reminder.reminder_id)
+            reminder.scheduled_message_id = None
+            reminder.scheduled_channel = None
+
+    def _row_to_reminder(self, row) -> Reminder:
+        trigger_params = json.loads(row.trigger_params)
+        return Reminder(
+            user_id=row.slack_user_id,
+            message=row.title,
+            reminder_type=row.trigger_type,
+            reminder_id=row.reminder_id,
+            channel_id=trigger_params['channel_id'],
+            datetime=trigger_params['datetime'],
+            status=row.status,
+            created_at=row.created_at,
+            updated_at=None,
+            timezone=trigger_params.get('timezone', DEFAULT_TIMEZONE),
+            team_id=trigger_params.get('team_id'),
+            scheduled_message_id=trigger_params.get('scheduled_message_id'),
+            scheduled_channel=trigger_params.get('scheduled_channel')
+        )
+
+    def _trigger_params(self, reminder: Reminder) -> str:
+        params = {
+            'channel_id': reminder.channel_id,
+            'datetime': reminder.datetime,
+            'timezone': reminder.timezone
         }
+        # Los recordatorios de un solo workspace no guardan team_id
+        if reminder.team_id:
+            params['team_id'] = reminder.team_id
+        if reminder.scheduled_message_id:
+            params['scheduled_message_id'] = reminder.scheduled_message_id
+            params['scheduled_channel'] = reminder.scheduled_channel
+        return json.dumps(params)
+
+    @traced("bigquery.mark_executed")
+    @recorded_latency("bigquery", "mark_executed")
+    def mark_reminder_as_executed(self, reminder_id: str) -> None:
+        self._mark_executed([reminder_id])
+            
+    @traced("bigquery.mark_executed_batch")
+    @recorded_latency("bigquery", "mark_executed_batch")
+    def mark_reminders_as_executed(self, reminder_ids: list) -> None:
+        # Varios recordatorios entregados juntos: una sola inserción en el historial
+        if not reminder_ids:
+            return
+        self._mark_executed(list(reminder_ids))
+
+    def _mark_executed(self, reminder_ids: list) -> None:
+        for reminder in self._close(reminder_ids, 'executed'):
+            self._remember_fired(reminder)
 
-        errors = self.client.insert_rows_json(history_table_ref, [row])
-        if errors:
-            raise Exception(f'Error updating reminder status: {errors}')
+    @traced("bigquery.mark_failed")
+    @recorded_latency("bigquery", "mark_failed")
+    def mark_reminders_as_failed(self, reminder_ids: list) -> None:
+        # El envío agotó sus reintentos: deja de estar pendiente en todas las réplicas y en "mis recordatorios"
+        if not reminder_ids:
+            return
+        self._close(list(reminder_ids), 'failed')
+
+    def _close(self, reminder_ids: list, status: str) -> list[Reminder]:
+        history_table_ref = f"{self.project_id}.{self.dataset_id}.{self.history_table_id}"
+        
+        # El recordatorio ya está en el índice de pendientes; BigQuery solo se consulta si no está en memoria
+        reminders = []
+        missing = []
+        for reminder_id in reminder_ids:
+            reminder = self.pending_index.get(reminder_id)
+            if reminder is None:
+                missing.append(reminder_id)
+            else:
+                reminders.append(reminder)
+        if missing:
+            reminders.extend(self._fetch_pending_by_ids(missing))
+        if not reminders:
+            raise Exception(f'Pending reminders {reminder_ids} not found')
+        
+        now = datetime.now(pytz.timezone(DEFAULT_TIMEZONE)).isoformat()
+        rows = [self._history_row(reminder, status, now) for reminder in reminders]
+        
+        try:
+            self.writer.write(history_table_ref, rows)
+        except Exception as e:
+            raise Exception(f'Error updating reminder status: {e}')
+        
+        closed = []
+        for reminder_id in reminder_ids:
+            reminder = self.pending_index.remove(reminder_id)
+            if reminder is not None:
+                closed.append(reminder)
+            self._closed_ids.add(reminder_id)
+        return closed
+
+    def _fetch_pending_by_ids(self, reminder_ids: list) -> list[Reminder]:
+        table_ref = f"{self.project_id}.{self.dataset_id}.{self.table_id}"
+        query = f"""
+        SELECT *
+        FROM `{table_ref}`
+        WHERE reminder_id IN UNNEST(@reminder_ids)
+        AND status = 'pending'
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ArrayQueryParameter("reminder_ids", "STRING", reminder_ids)
+            ]
+        )
+        return [self._row_to_reminder(row) for row in self.client.query(query, job_config=job_config).result()]
+
+    def _history_row(self, reminder: Reminder, status: str, now: str) -> dict:
+        return {
+            'reminder_id': reminder.reminder_id,
+            'slack_user_id': reminder.user_id,
+            'title': reminder.message,
+            'trigger_type': reminder.reminder_type,
+            'trigger_params': self._trigger_params(reminder),
+            'status': status,
+            'created_at': now,
+            'executed_at': now
+        }
             
     def _ensure_tables_exist(self) -> None:
         dataset_ref = f"{self.project_id}.{self.dataset_id}"
@@ -207,14 +608,25 @@ class ReminderHandler:
         
         # Crear tabla principal si no existe
         try:
-            self.client.get_table(table_ref)
+            self._warn_if_unpartitioned(self.client.get_table(table_ref))
         except Exception:
             table = bigquery.Table(table_ref, schema=main_schema)
+            # Particionar por created_at para que las lecturas incrementales solo toquen particiones recientes
+            table.time_partitioning = bigquery.TimePartitioning(field="created_at")
             self.client.create_table(table, exists_ok=True)
         
         # Crear tabla de historial si no existe
         try:
-            self.client.get_table(history_table_ref)
+            self._warn_if_unpartitioned(self.client.get_table(history_table_ref))
         except Exception:
             history_table = bigquery.Table(history_table_ref, schema=history_schema)
-            self.client.create_table(history_table, exists_ok=True)
\ No newline at end of file
+            history_table.time_partitioning = bigquery.TimePartitioning(field="created_at")
+            self.client.create_table(history_table, exists_ok=True)
+
+    def _warn_if_unpartitioned(self, table) -> None:
+        # Las tablas creadas antes del particionado se leen completas en cada consulta incremental
+        if not is_partitioned(table):
+            self.logger.warning(
+                f"La tabla {table.table_id} no está particionada por created_at; "
+                f"ejecuta `python table_partitioning.py` para migrarla"
+            )
@@ -0,0 +1,153 @@
+import heapq
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+import pytz
+
+
+class PendingReminderIndex:
+    """Índice en memoria de recordatorios pendientes agrupados por workspace y slack_user_id."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._by_user: Dict[tuple, Dict[str, object]] = {}
+        self._user_by_id: Dict[str, tuple] = {}
+
+    def add(self, reminder) -> None:
+        with self._lock:
+            self._discard(reminder.reminder_id)
+            key = (getattr(reminder, 'team_id', None), reminder.user_id)
+            self._by_user.setdefault(key, {})[reminder.reminder_id] = reminder
+            self._user_by_id[reminder.reminder_id] = key
+
+    def remove(self, reminder_id: str):
+        with self._lock:
+            return self._discard(reminder_id)
+
+    def get(self, reminder_id: str):
+        with self._lock:
+            user_id = self._user_by_id.get(reminder_id)
+            if user_id is None:
+                return None
+            return self._by_user[user_id].get(reminder_id)
+
+    def list_for_user(self, user_id: str, team_id: Optional[str] = None) -> List:
+        with self._lock:
+            reminders = list(self._by_user.get((team_id, user_id), {}).values())
+        return sorted(reminders, key=lambda r: r.datetime)
+
+    def all(self) -> List:
+        with self._lock:
+            return [r for user_reminders in self._by_user.values() for r in user_reminders.values()]
+
+    def replace_all(self, reminders) -> None:
+        # El índice nuevo se arma fuera del lock (puede venir de una consulta paginada) y se reemplaza de una vez
+        by_user, user_by_id = {}, {}
+        for reminder in reminders:
+            previous = user_by_id.pop(reminder.reminder_id, None)
+            if previous is not None:
+                by_user[previous].pop(reminder.reminder_id, None)
+            key = (getattr(reminder, 'team_id', None), reminder.user_id)
+            by_user.setdefault(key, {})[reminder.reminder_id] = reminder
+            user_by_id[reminder.reminder_id] = key
+        with self._lock:
+            self._by_user = {key: reminders for key, reminders in by_user.items() if reminders}
+            self._user_by_id = user_by_id
+
+    def __contains__(self, reminder_id: str) -> bool:
+        with self._lock:
+            return reminder_id in self._user_by_id
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._user_by_id)
+
+    def _discard(self, reminder_id: str):
+        user_id = self._user_by_id.pop(reminder_id, None)
+        if user_id is None:
+            return None
+        user_reminders = self._by_user.get(user_id, {})
+        reminder = user_reminders.pop(reminder_id, None)
+        if not user_reminders:
+            self._by_user.pop(user_id, None)
+        return reminder
+
+
+class ExecutedIdSet:
+    """Conjunto compacto de ids ejecutados o cancelados: 16 bytes ordenados por UUID."""
+
+    KEY_SIZE = 16
+
+    def __init__(self, merge_threshold: int = 1024):
+        self.merge_threshold = merge_threshold
+        self._lock = threading.Lock()
+        self._sorted = b''
+        self._recent = set()
+        self._other = set()
+
+    def add(self, reminder_id: str) -> None:
+        key = self._key(reminder_id)
+        with self._lock:
+            if key is None:
+                self._other.add(reminder_id)
+                return
+            if self._search(key):
+                return
+            self._recent.add(key)
+            # Las altas recientes se fusionan por lotes con el bloque ordenado
+            if len(self._recent) >= self.merge_threshold:
+                self._merge()
+
+    def __contains__(self, reminder_id: str) -> bool:
+        key = self._key(reminder_id)
+        with self._lock:
+            if key is None:
+                return reminder_id in self._other
+            return key in self._recent or self._search(key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sorted) // self.KEY_SIZE + len(self._recent) + len(self._other)
+
+    def _key(self, reminder_id: str):
+        try:
+            return uuid.UUID(reminder_id).bytes
+        except (TypeError, ValueError, AttributeError):
+            return None
+
+    def _search(self, key: bytes) -> bool:
+        size = self.KEY_SIZE
+        low, high = 0, len(self._sorted) // size
+        while low < high:
+            middle = (low + high) // 2
+            current = self._sorted[middle * size:(middle + 1) * size]
+            if current == key:
+                return True
+            if current < key:
+                low = middle + 1
+            else:
+                high = middle
+        return False
+
+    def _merge(self) -> None:
+        size = self.KEY_SIZE
+        existing = (self._sorted[i:i + size] for i in range(0, len(self._sorted), size))
+        self._sorted = b''.join(heapq.merge(existing, sorted(self._recent)))
+        self._recent = set()
+
+
+def format_reminder_time(reminder) -> str:
+    # Mostrar la fecha del recordatorio como 'YYYY-MM-DD HH:MM'
+    try:
+        return datetime.fromisoformat(reminder.datetime).strftime('%Y-%m-%d %H:%M')
+    except (TypeError, ValueError):
+        return str(reminder.datetime)
+
+
+def reminder_due_at(reminder) -> datetime:
+    # Convertir la hora local del recordatorio a UTC según su zona horaria
+    local_time = datetime.fromisoformat(reminder.datetime)
+    if local_time.tzinfo is not None:
+        return local_time.astimezone(pytz.utc)
+    return pytz.timezone(reminder.timezone).localize(local_time).astimezone(pytz.utc)
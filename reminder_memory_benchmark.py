@@ -0,0 +1,78 @@
+import gc
+import sys
+import uuid
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+import pytz
+from reminder_handler import Reminder
+from reminder_index import PendingReminderIndex
+
+USERS = 5000
+CHANNELS = 800
+TIMEZONES = ('America/Mexico_City', 'America/Bogota', 'Europe/Madrid')
+
+
+@dataclass
+class DictReminder:
+    # Representación anterior: dataclass con __dict__ y cadenas sin internar
+    user_id: str
+    message: str
+    reminder_type: str
+    reminder_id: str
+    channel_id: str
+    datetime: str
+    status: str = 'pending'
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    timezone: str = 'America/Mexico_City'
+    team_id: Optional[str] = None
+
+
+def fake_rows(count: int):
+    # Cada fila trae cadenas nuevas, como las que decodifica el cliente de BigQuery
+    start = datetime(2030, 1, 1, 9, 0)
+    created_at = datetime(2029, 12, 31, 12, 0, tzinfo=pytz.utc)
+    for i in range(count):
+        yield (
+            f"U{i % USERS:08d}",
+            f"Recordatorio número {i}",
+            ''.join('once'),
+            str(uuid.uuid4()),
+            f"C{i % CHANNELS:08d}",
+            (start + timedelta(minutes=i % 100000)).isoformat(),
+            ''.join('pending'),
+            created_at,
+            ''.join(TIMEZONES[i % len(TIMEZONES)])
+        )
+
+
+def measure(reminder_class, count: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    index = PendingReminderIndex()
+    index.replace_all(
+        reminder_class(
+            user_id=user_id, message=message, reminder_type=reminder_type, reminder_id=reminder_id,
+            channel_id=channel_id, datetime=when, status=status, created_at=created_at, timezone=timezone
+        )
+        for user_id, message, reminder_type, reminder_id, channel_id, when, status, created_at, timezone
+        in fake_rows(count)
+    )
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del index
+    return current
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"Recordatorios pendientes: {count:,} ({USERS} usuarios, {CHANNELS} canales)")
+    results = {}
+    for name, reminder_class in (('dataclass con __dict__', DictReminder), ('Reminder (slots + intern)', Reminder)):
+        results[name] = measure(reminder_class, count)
+        print(f"{name:28} {results[name] / 2**20:8.1f} MiB  {results[name] / count:6.0f} bytes/recordatorio")
+    before, after = results.values()
+    print(f"Ahorro: {(before - after) / before:.0%}")
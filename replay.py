@@ -0,0 +1,304 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from timezone_resolver import DEFAULT_TIMEZONE
+
+# Traza grabada que se está reproduciendo en el hilo actual
+_replay_trace = contextvars.ContextVar('replay_trace', default=None)
+
+REPLAYED_KINDS = ('slack_event', 'check_reminders')
+
+
+class Cassette:
+    """Eventos grabados y las respuestas de Gemini/BigQuery agrupadas por traza."""
+
+    def __init__(self, entries):
+        self.events = [entry for entry in entries if entry['kind'] in REPLAYED_KINDS]
+        self._responses = {}
+        self._lock = threading.Lock()
+        for entry in entries:
+            if entry['kind'] in ('gemini', 'bigquery'):
+                queues = self._responses.setdefault(entry.get('trace_id'), {'gemini': deque(), 'bigquery': deque()})
+                queues[entry['kind']].append(entry)
+
+    @classmethod
+    def load(cls, path: str) -> 'Cassette':
+        with open(path, encoding='utf-8') as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def next_response(self, kind: str):
+        with self._lock:
+            queues = self._responses.get(_replay_trace.get())
+            if not queues or not queues[kind]:
+                return None
+            return queues[kind].popleft()
+
+
+class StubModel:
+    def __init__(self, cassette: Cassette, speed: float):
+        self.cassette = cassette
+        self.speed = speed
+
+    def generate_content(self, prompt, **kwargs):
+        entry = self.cassette.next_response('gemini') or {'text': 'ok', 'latency_ms': 0}
+        time.sleep((entry.get('latency_ms') or 0) / 1000 / self.speed)
+        return SimpleNamespace(
+            parts=[SimpleNamespace(text=entry.get('text') or '')],
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=entry.get('prompt_tokens'),
+                candidates_token_count=entry.get('response_tokens')
+            )
+        )
+
+
+class StubSlackClient:
+    def users_info(self, user):
+        return {'user': {'id': user, 'tz': DEFAULT_TIMEZONE}}
+
+    def users_list(self, **kwargs):
+        return {'members': [], 'response_metadata': {'next_cursor': ''}}
+
+
+class StubSlackHandler:
+    def __init__(self):
+        self.client = StubSlackClient()
+        self.sent = 0
+
+    def send_message(self, channel_id: str, message: str, **kwargs):
+        self.sent += 1
+        return True
+
+
+class StubQueryJob:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def result(self, page_size=None):
+        return self._rows
+
+
+class StubBigQueryClient:
+    """Cliente de BigQuery que responde con los recordatorios y latencias grabados."""
+
+    def __init__(self, cassette: Cassette, speed: float):
+        self.cassette = cassette
+        self.speed = speed
+        self.rows_by_id = {}
+        self._pending_rows = {}
+        self._lock = threading.Lock()
+
+    def load_pending(self, trace_id, reminders) -> None:
+        rows = [
+            SimpleNamespace(
+                kind='reminder',
+                reminder_id=r['reminder_id'],
+                slack_user_id=r['user_id'],
+                title=r['message'],
+                trigger_type=r['reminder_type'],
+                trigger_params=json.dumps({
+                    'channel_id': r['channel_id'],
+                    'datetime': r['datetime'],
+                    'timezone': r.get('timezone', DEFAULT_TIMEZONE)
+                }),
+                channel_id=r['channel_id'],
+                reminder_datetime=r['datetime'],
+                timezone=r.get('timezone', DEFAULT_TIMEZONE),
+                team_id=r.get('team_id'),
+                scheduled_message_id=None,
+                scheduled_channel=None,
+                status='pending',
+                created_at=None
+            )
+            for r in reminders
+        ]
+        with self._lock:
+            self._pending_rows[trace_id] = rows
+            self.rows_by_id.update((row.reminder_id, row) for row in rows)
+
+    def insert_rows_json(self, table, rows, row_ids=None):
+        self._sleep()
+        with self._lock:
+            for row in rows:
+                if 'reminder_id' in row and 'executed_at' not in row:
+                    self.rows_by_id[row['reminder_id']] = SimpleNamespace(**row)
+        return []
+
+    def query(self, query, job_config=None):
+        self._sleep()
+        parameters = {p.name: p.value for p in getattr(job_config, 'query_parameters', None) or []}
+        with self._lock:
+            if 'reminder_id' in parameters:
+                row = self.rows_by_id.get(parameters['reminder_id'])
+                return StubQueryJob([row] if row else [])
+            return StubQueryJob(self._pending_rows.pop(_replay_trace.get(), []))
+
+    def get_dataset(self, *args, **kwargs):
+        return None
+
+    def get_table(self, table_ref, *args, **kwargs):
+        # Las tablas de producción ya están particionadas por created_at
+        return SimpleNamespace(table_id=table_ref.rsplit('.', 1)[-1], time_partitioning=SimpleNamespace(field='created_at'))
+
+    def _sleep(self) -> None:
+        entry = self.cassette.next_response('bigquery')
+        if entry:
+            time.sleep((entry.get('latency_ms') or 0) / 1000 / self.speed)
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def build_agent(cassette: Cassette, speed: float):
+    # Importar aquí para que la grabación no quede activa durante la reproducción
+    os.environ.pop('REBECA_RECORD_PATH', None)
+    os.environ.setdefault('GEMINI_API_KEY', 'replay')
+    # El reporte no debe depender del entorno: sin caché semántica ni límites de cuota de Gemini
+    os.environ['SEMANTIC_CACHE_SIZE'] = '0'
+    os.environ['GEMINI_RPM_LIMIT'] = '0'
+    os.environ['GEMINI_TPM_LIMIT'] = '0'
+    from rebeca_agent import RebecaAgent
+    from gemini_scheduler import GeminiScheduler
+    from reminder_handler import ReminderHandler
+    from delivery_outbox import DeliveryOutbox
+    from bigquery_writer import create_row_writer
+    
+    bigquery_client = StubBigQueryClient(cassette, speed)
+    reminder_handler = ReminderHandler(
+        'replay', 'replay', client=bigquery_client, writer=create_row_writer(bigquery_client, 'legacy')
+    )
+    # Los recordatorios grabados ya vencieron; se disparan sin importar su antigüedad
+    reminder_handler.catchup_max_age = 10 ** 9
+    agent = RebecaAgent(
+        slack_handler=StubSlackHandler(),
+        reminder_handler=reminder_handler,
+        model=StubModel(cassette, speed),
+        outbox=DeliveryOutbox(':memory:')
+    )
+    # El planificador es compartido por el proceso y pudo crearse antes con otros límites
+    agent.gemini_scheduler = GeminiScheduler(rpm=0, tpm=0)
+    return agent, bigquery_client
+
+
+def replay(path: str, speed: float = 1.0, workers: int = 4) -> dict:
+    cassette = Cassette.load(path)
+    agent, bigquery_client = build_agent(cassette, speed)
+    latencies = {kind: [] for kind in REPLAYED_KINDS}
+    errors = []
+    lock = threading.Lock()
+    
+    def run(entry, scheduled_at):
+        _replay_trace.set(entry.get('trace_id'))
+        try:
+            if entry['kind'] == 'slack_event':
+                agent.process_message(entry['text'], entry['channel'], entry['user'])
+            else:
+                bigquery_client.load_pending(entry.get('trace_id'), entry.get('reminders', []))
+                agent.check_reminders()
+        except Exception as e:
+            with lock:
+                errors.append(f"{entry['kind']}: {e}")
+        # La latencia incluye la espera en cola desde el momento programado
+        with lock:
+            latencies[entry['kind']].append((time.perf_counter() - scheduled_at) * 1000)
+    
+    events = sorted(cassette.events, key=lambda entry: entry['offset'])
+    first_offset = events[0]['offset'] if events else 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for entry in events:
+            scheduled_at = started + (entry['offset'] - first_offset) / speed
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(contextvars.copy_context().run, run, entry, scheduled_at)
+    wall_seconds = time.perf_counter() - started
+    
+    return {
+        'cassette': path,
+        'speed': speed,
+        'workers': workers,
+        'events': len(events),
+        'errors': len(errors),
+        'slack_messages_sent': agent.slack_handler.sent,
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_per_sec': round(len(events) / wall_seconds, 2) if wall_seconds else 0.0,
+        'latency_ms': {
+            kind: {
+                'count': len(values),
+                'mean': round(sum(values) / len(values), 2) if values else 0.0,
+                'p50': round(percentile(values, 0.50), 2),
+                'p95': round(percentile(values, 0.95), 2),
+                'p99': round(percentile(values, 0.99), 2),
+                'max': round(max(values), 2) if values else 0.0
+            }
+            for kind, values in latencies.items()
+        }
+    }
+
+
+def compare(base: dict, new: dict) -> list[str]:
+    def delta(old, current):
+        if not old:
+            return "  n/a"
+        return f"{(current - old) / old * 100:+.1f}%"
+    
+    lines = [f"throughput: {base['throughput_per_sec']} -> {new['throughput_per_sec']} eventos/s "
+             f"({delta(base['throughput_per_sec'], new['throughput_per_sec'])})"]
+    for kind in REPLAYED_KINDS:
+        old_stats = base['latency_ms'].get(kind, {})
+        new_stats = new['latency_ms'].get(kind, {})
+        if not old_stats.get('count') and not new_stats.get('count'):
+            continue
+        for metric in ('p50', 'p95', 'p99'):
+            old_value = old_stats.get(metric, 0.0)
+            new_value = new_stats.get(metric, 0.0)
+            lines.append(f"{kind} {metric}: {old_value} ms -> {new_value} ms ({delta(old_value, new_value)})")
+    lines.append(f"errores: {base['errors']} -> {new['errors']}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce un cassette de tráfico grabado contra stubs")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    run_parser = subparsers.add_parser('run', help="Reproducir un cassette y generar un reporte")
+    run_parser.add_argument('cassette')
+    run_parser.add_argument('--speed', type=float, default=1.0, help="Factor de velocidad (1 a 100)")
+    run_parser.add_argument('--workers', type=int, default=4)
+    run_parser.add_argument('--output', help="Archivo JSON donde guardar el reporte")
+    
+    compare_parser = subparsers.add_parser('compare', help="Comparar los reportes de dos builds")
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    
+    args = parser.parse_args()
+    if args.command == 'run':
+        if not 1 <= args.speed <= 100:
+            parser.error("--speed debe estar entre 1 y 100")
+        report = replay(args.cassette, speed=args.speed, workers=args.workers)
+        output = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(output)
+        print(output)
+    else:
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+        with open(args.new, encoding='utf-8') as f:
+            new = json.load(f)
+        print("\n".join(compare(base, new)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
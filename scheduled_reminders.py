@@ -0,0 +1,121 @@
+import os
+import time
+import logging
+from datetime import datetime
+import pytz
+from reminder_index import reminder_due_at
+
+# Slack no acepta mensajes programados a más de 120 días
+MAX_SCHEDULE_SECONDS = 120 * 24 * 3600
+
+
+class SlackReminderOffloader:
+    """Delega en Slack (chat.scheduleMessage) la entrega de los recordatorios de hora fija."""
+
+    def __init__(self, slack_handler, render, enabled: bool = None, min_lead_seconds: int = None,
+                 reconcile_interval: int = None):
+        self.logger = logging.getLogger(__name__)
+        self.slack_handler = slack_handler
+        # render(recordatorios) -> [(canal, mensaje, blocks)] en el mismo orden
+        self.render = render
+        self.enabled = enabled if enabled is not None else os.getenv('REMINDER_SLACK_SCHEDULE', '0') == '1'
+        # Los recordatorios muy próximos se quedan en el sondeo: Slack no deja borrar un mensaje a punto de salir
+        self.min_lead = min_lead_seconds if min_lead_seconds is not None else int(
+            os.getenv('REMINDER_SLACK_SCHEDULE_MIN_LEAD', '300')
+        )
+        self.reconcile_interval = reconcile_interval if reconcile_interval is not None else int(
+            os.getenv('REMINDER_SLACK_RECONCILE_INTERVAL', '300')
+        )
+        self._last_reconcile = None
+
+    def offload(self, reminders, now: datetime = None) -> int:
+        # Los que Slack no acepta quedan sin scheduled_message_id y los entrega el sondeo normal
+        if not self.enabled:
+            return 0
+        now = now or datetime.now(pytz.utc)
+        eligible = [reminder for reminder in reminders if self._eligible(reminder, now)]
+        if not eligible:
+            return 0
+
+        scheduled = 0
+        for reminder, (channel_id, message, blocks) in zip(eligible, self.render(eligible)):
+            result = self.slack_handler.schedule_message(
+                channel_id=channel_id,
+                message=message,
+                post_at=int(reminder_due_at(reminder).timestamp()),
+                team_id=reminder.team_id,
+                blocks=blocks
+            )
+            if result is None:
+                continue
+            reminder.scheduled_channel, reminder.scheduled_message_id = result
+            scheduled += 1
+        self.logger.info(f"Recordatorios programados en Slack: {scheduled}/{len(eligible)}")
+        return scheduled
+
+    def cancel(self, reminder) -> bool:
+        # False si Slack no borró el mensaje: el recordatorio no debe darse por cancelado
+        if not reminder.scheduled_message_id:
+            return True
+        if not self.slack_handler.delete_scheduled_message(
+            reminder.scheduled_channel, reminder.scheduled_message_id, team_id=reminder.team_id
+        ):
+            return False
+        reminder.scheduled_message_id = None
+        reminder.scheduled_channel = None
+        return True
+
+    def cancel_all(self, reminders) -> None:
+        for reminder in reminders:
+            if not self.cancel(reminder):
+                self.logger.error(f"No se pudo borrar el mensaje programado de {reminder.reminder_id}")
+
+    def reconcile(self, reminders, now: datetime = None, force: bool = False):
+        # Compara los recordatorios delegados con chat.scheduledMessages.list.
+        # Devuelve (ids entregados, recordatorios que Slack descartó y deben volver al sondeo)
+        if not self.enabled:
+            return [], []
+        if not force and self._last_reconcile is not None \
+                and time.monotonic() - self._last_reconcile < self.reconcile_interval:
+            return [], []
+        self._last_reconcile = time.monotonic()
+        now = now or datetime.now(pytz.utc)
+
+        by_team = {}
+        for reminder in reminders:
+            if reminder.scheduled_message_id:
+                by_team.setdefault(reminder.team_id, []).append(reminder)
+
+        delivered, lost = [], []
+        for team_id, team_reminders in by_team.items():
+            scheduled = self.slack_handler.list_scheduled_messages(team_id)
+            if scheduled is None:
+                continue
+            for reminder in team_reminders:
+                if reminder.scheduled_message_id in scheduled:
+                    continue
+                due_at = reminder_due_at(reminder)
+                if due_at > now:
+                    # Slack lo descartó antes de tiempo (canal archivado, app removida)
+                    lost.append(reminder)
+                    continue
+                # Ya no está programado: solo se da por entregado si la notificación aparece en el canal
+                posted = self.slack_handler.scheduled_message_posted(
+                    reminder.scheduled_channel, reminder.reminder_id, int(due_at.timestamp()), team_id=team_id
+                )
+                if posted is True:
+                    delivered.append(reminder.reminder_id)
+                elif posted is False:
+                    lost.append(reminder)
+        if delivered or lost:
+            self.logger.info(
+                f"Reconciliación con Slack: {len(delivered)} entregados, {len(lost)} devueltos al sondeo"
+            )
+        return delivered, lost
+
+    def _eligible(self, reminder, now: datetime) -> bool:
+        try:
+            lead = (reminder_due_at(reminder) - now).total_seconds()
+        except (TypeError, ValueError):
+            return False
+        return self.min_lead <= lead <= MAX_SCHEDULE_SECONDS
@@ -0,0 +1,56 @@
+import os
+import gzip
+import json
+import time
+import logging
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FIELDS = ('reminder_id', 'user_id', 'channel_id', 'message', 'datetime', 'timezone', 'reminder_type', 'team_id',
+                   'scheduled_message_id', 'scheduled_channel')
+
+
+class SchedulerSnapshot:
+    """Guarda y recupera el estado del programador de recordatorios en un archivo local compacto."""
+
+    def __init__(self, path: str = None):
+        self.logger = logging.getLogger(__name__)
+        self.path = path or os.getenv('REMINDER_SNAPSHOT_PATH', 'data/reminders_snapshot.json.gz')
+
+    def save(self, reminders) -> int:
+        # Filas posicionales para no repetir los nombres de campo en cada recordatorio
+        rows = [[getattr(reminder, field) for field in SNAPSHOT_FIELDS] for reminder in reminders]
+        payload = {
+            'version': SNAPSHOT_VERSION,
+            'saved_at': time.time(),
+            'fields': SNAPSHOT_FIELDS,
+            'rows': rows
+        }
+        
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        # Escribir en un archivo temporal y reemplazar para no dejar snapshots a medias
+        tmp_path = f"{self.path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(payload, f, separators=(',', ':'), ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        return len(rows)
+
+    def load(self) -> list[dict]:
+        if not os.path.exists(self.path):
+            return []
+        
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                payload = json.load(f)
+        except Exception as e:
+            self.logger.error(f"Error al leer el snapshot de recordatorios: {str(e)}")
+            return []
+        
+        if payload.get('version') != SNAPSHOT_VERSION:
+            self.logger.warning(f"Versión de snapshot no soportada: {payload.get('version')}")
+            return []
+        
+        fields = payload['fields']
+        return [dict(zip(fields, row)) for row in payload['rows']]
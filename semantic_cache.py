@@ -0,0 +1,266 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él la caché semántica queda desactivada
+    np = None
+
+from tracing import start_span
+from gemini_scheduler import get_gemini_scheduler
+from gemini_usage import estimate_tokens
+
+
+def normalize_question(text: str) -> str:
+    # Minúsculas, sin acentos, menciones ni signos de puntuación
+    text = re.sub(r'<@[^>]+>', ' ', text or '').lower()
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'\w+', text))
+
+
+# Palabras que hacen que la respuesta dependa del momento o de quién pregunta: no se cachean
+TIME_OR_IDENTITY_WORDS = {
+    'hora', 'horas', 'hoy', 'manana', 'ayer', 'ahora', 'fecha', 'dia', 'semana', 'mes', 'ano',
+    'actual', 'actualmente', 'ultimo', 'ultima', 'ultimos', 'ultimas', 'reciente', 'recientes',
+    'tengo', 'mi', 'mis', 'me', 'yo', 'soy', 'conmigo', 'mio', 'mia', 'recordatorio', 'recordatorios'
+}
+
+
+def is_cacheable(question: str) -> bool:
+    words = normalize_question(question).split()
+    return bool(words) and not TIME_OR_IDENTITY_WORDS.intersection(words)
+
+
+class HashingEmbedder:
+    """Embedder local y determinista: palabras y trigramas de caracteres proyectados con hashing."""
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def embed(self, text: str):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        normalized = normalize_question(text)
+        features = normalized.split()
+        padded = f" {normalized} "
+        features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], 'little') % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vector
+
+
+class GeminiEmbedder:
+    """Embeddings de Gemini (`embed_content`) para comparar preguntas parafraseadas."""
+
+    def __init__(self, model: str = None):
+        self.model = model or os.getenv('SEMANTIC_CACHE_EMBEDDING_MODEL', 'models/text-embedding-004')
+
+    def embed(self, text: str):
+        import google.generativeai as genai
+        # Pasa por la misma cola que generate_content para respetar GEMINI_RPM_LIMIT / GEMINI_TPM_LIMIT
+        with start_span("gemini.embed_content", model=self.model) as span:
+            result, waited = get_gemini_scheduler().run(
+                'embedding',
+                lambda: genai.embed_content(model=self.model, content=text, task_type='semantic_similarity'),
+                estimated_tokens=estimate_tokens(text),
+                response_tokens=0
+            )
+            span.set_attribute("gemini.queue_wait_ms", round(waited * 1000, 2))
+        return np.asarray(result['embedding'], dtype=np.float32)
+
+
+def create_embedder(name: str = None):
+    name = name or os.getenv('SEMANTIC_CACHE_EMBEDDER', 'gemini')
+    if name == 'hashing':
+        return HashingEmbedder()
+    if name == 'gemini':
+        return GeminiEmbedder()
+    raise ValueError(f"¡Error! Embedder de caché semántica desconocido: {name}")
+
+
+class SemanticCache:
+    """Respuestas recientes indexadas por el embedding de la pregunta; busca el vecino más cercano.
+
+    Cada entrada pertenece a un ámbito (el workspace): una búsqueda solo considera las de su ámbito.
+    """
+
+    def __init__(self, embedder=None, capacity: int = None, threshold: float = None,
+                 ttl_seconds: int = None, path: str = None):
+        self.logger = logging.getLogger(__name__)
+        if capacity is None:
+            capacity = int(os.getenv('SEMANTIC_CACHE_SIZE', '0'))
+        if np is None and capacity > 0:
+            self.logger.warning("numpy no está instalado; la caché semántica queda desactivada")
+            capacity = 0
+        self.capacity = capacity
+        self.threshold = threshold if threshold is not None else float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+        self.ttl_seconds = ttl_seconds or int(os.getenv('SEMANTIC_CACHE_TTL', '86400'))
+        self.path = path or os.getenv('SEMANTIC_CACHE_PATH', 'data/semantic_cache.npz')
+        self.embedder = embedder if embedder is not None or not self.enabled else create_embedder()
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._questions = []
+        self._answers = []
+        self._scopes = []
+        self._stored_at = []
+        self._last_used = []
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def lookup(self, question: str, scope: str = None) -> Optional[str]:
+        if not self.enabled or not is_cacheable(question):
+            return None
+
+        vector = self._embed(question)
+        now = time.time()
+        with self._lock:
+            index, similarity = self._nearest(vector, now, self._scope_key(scope))
+            if index is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._last_used[index] = now
+            self.logger.info(f"Respuesta desde caché semántica (similitud {similarity:.3f})")
+            return self._answers[index]
+
+    def store(self, question: str, answer: str, scope: str = None) -> None:
+        if not self.enabled or not is_cacheable(question) or not answer:
+            return
+
+        vector = self._embed(question)
+        now = time.time()
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                # Primera respuesta o cambio de modelo de embeddings: empezar un índice nuevo
+                self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+                self._questions, self._answers, self._scopes, self._stored_at, self._last_used = [], [], [], [], []
+            index = self._free_slot(now)
+            self._vectors[index] = vector
+            self._questions[index] = question
+            self._answers[index] = answer
+            self._scopes[index] = self._scope_key(scope)
+            self._stored_at[index] = now
+            self._last_used[index] = now
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._questions),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+    def save(self) -> int:
+        if not self.enabled:
+            return 0
+        with self._lock:
+            if self._vectors is None:
+                return 0
+            count = len(self._questions)
+            vectors = self._vectors[:count].copy()
+            questions = list(self._questions)
+            answers = list(self._answers)
+            scopes = list(self._scopes)
+            stored_at = list(self._stored_at)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Escribir en un archivo temporal y reemplazar para no dejar la caché a medias
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            vectors=vectors,
+            questions=np.asarray(questions, dtype=str),
+            answers=np.asarray(answers, dtype=str),
+            scopes=np.asarray(scopes, dtype=str),
+            stored_at=np.asarray(stored_at, dtype=np.float64)
+        )
+        os.replace(tmp_path, self.path)
+        return count
+
+    def load(self) -> int:
+        if not self.enabled or not os.path.exists(self.path):
+            return 0
+
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                vectors = data['vectors']
+                questions = [str(q) for q in data['questions']]
+                answers = [str(a) for a in data['answers']]
+                if 'scopes' not in data.files:
+                    # Archivo anterior a los ámbitos por workspace: sus respuestas podrían cruzar workspaces
+                    self.logger.warning("Caché semántica sin ámbitos por workspace; se descarta")
+                    return 0
+                scopes = [str(s) for s in data['scopes']]
+                stored_at = [float(t) for t in data['stored_at']]
+        except Exception as e:
+            self.logger.error(f"Error al leer la caché semántica: {str(e)}")
+            return 0
+
+        # Conservar las entradas más recientes que aún no expiran
+        now = time.time()
+        keep = [i for i in sorted(range(len(questions)), key=lambda i: stored_at[i], reverse=True)
+                if now - stored_at[i] < self.ttl_seconds][:self.capacity]
+        with self._lock:
+            self._vectors = np.zeros((self.capacity, vectors.shape[1]), dtype=np.float32) if keep else None
+            self._questions, self._answers, self._scopes, self._stored_at, self._last_used = [], [], [], [], []
+            for slot, i in enumerate(keep):
+                self._vectors[slot] = vectors[i]
+                self._questions.append(questions[i])
+                self._answers.append(answers[i])
+                self._scopes.append(scopes[i])
+                self._stored_at.append(stored_at[i])
+                self._last_used.append(stored_at[i])
+        self.logger.info(f"Caché semántica cargada: {len(keep)} respuestas")
+        return len(keep)
+
+    def _embed(self, question: str):
+        vector = np.asarray(self.embedder.embed(normalize_question(question)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    @staticmethod
+    def _scope_key(scope: Optional[str]) -> str:
+        # Sin workspace (un solo token) el ámbito es la cadena vacía; numpy guarda cadenas, no None
+        return scope or ''
+
+    def _nearest(self, vector, now: float, scope: str):
+        count = len(self._questions)
+        if count == 0 or self._vectors.shape[1] != vector.shape[0]:
+            return None, 0.0
+        # Los vectores están normalizados: el producto punto es la similitud coseno
+        similarities = self._vectors[:count] @ vector
+        expired = now - np.asarray(self._stored_at) >= self.ttl_seconds
+        similarities[expired] = -1.0
+        similarities[np.asarray(self._scopes) != scope] = -1.0
+        index = int(np.argmax(similarities))
+        return index, float(similarities[index])
+
+    def _free_slot(self, now: float) -> int:
+        count = len(self._questions)
+        if count < self.capacity:
+            for values in (self._questions, self._answers, self._scopes, self._stored_at, self._last_used):
+                values.append(None)
+            return count
+        # Reemplazar una entrada expirada o, si no hay, la usada hace más tiempo
+        for index, stored_at in enumerate(self._stored_at):
+            if now - stored_at >= self.ttl_seconds:
+                return index
+        return min(range(count), key=self._last_used.__getitem__)
@@ -0,0 +1,132 @@
+import os
+import logging
+import threading
+from typing import Optional
+import urllib3
+from io import BytesIO
+from http.client import HTTPMessage
+from urllib.error import HTTPError
+from urllib.request import Request
+from slack_sdk import WebClient
+from workspace_store import get_installation_store
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+_team_clients = {}
+_shared_pools = {}
+_shared_pools_lock = threading.Lock()
+
+
+def _shared_pool(pool_size: int, ssl_context) -> urllib3.PoolManager:
+    # Los clientes de todos los workspaces comparten las conexiones a slack.com
+    key = (pool_size, id(ssl_context) if ssl_context is not None else None)
+    with _shared_pools_lock:
+        pool = _shared_pools.get(key)
+        if pool is None:
+            pool_kwargs = {'ssl_context': ssl_context} if ssl_context is not None else {}
+            pool = urllib3.PoolManager(num_pools=2, maxsize=pool_size, block=False, **pool_kwargs)
+            _shared_pools[key] = pool
+        return pool
+
+
+class PooledWebClient(WebClient):
+    """WebClient de Slack que reutiliza conexiones HTTP keep-alive de un pool compartido."""
+
+    def __init__(self, *args, pool_size: int = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool_size = pool_size or int(os.getenv('SLACK_HTTP_POOL_SIZE', '4'))
+        self._pool = _shared_pool(self.pool_size, self.ssl)
+
+    def connection_stats(self) -> dict:
+        # Cada solicitud que no abrió una conexión nueva reutilizó una existente
+        requests = 0
+        connections = 0
+        for key in list(self._pool.pools.keys()):
+            pool = self._pool.pools.get(key)
+            if pool is None:
+                continue
+            requests += pool.num_requests
+            connections += pool.num_connections
+        return {
+            'pool_size': self.pool_size,
+            'requests': requests,
+            'connections_opened': connections,
+            'connections_reused': max(requests - connections, 0)
+        }
+
+    # slack_sdk no expone cómo se abre la conexión HTTP: se sustituye este método interno.
+    # La versión de slack_sdk está acotada en requirements.txt y tests/test_slack_client.py falla si cambia
+    def _perform_urllib_http_request_internal(self, url: str, req: Request) -> dict:
+        # Con proxy se conserva el comportamiento original de urllib
+        if self.proxy is not None or not url.lower().startswith("http"):
+            return super()._perform_urllib_http_request_internal(url, req)
+        
+        headers = {name: str(value) for name, value in req.header_items()}
+        resp = self._pool.request(
+            "POST",
+            url,
+            body=req.data,
+            headers=headers,
+            timeout=self.timeout,
+            retries=False
+        )
+        if not 200 <= resp.status < 300:
+            # Igual que urlopen: el SDK espera HTTPError para aplicar sus retry_handlers (429 con Retry-After, 5xx)
+            error_headers = HTTPMessage()
+            for name, value in resp.headers.items():
+                error_headers[name] = value
+            raise HTTPError(url, resp.status, resp.reason, error_headers, BytesIO(resp.data))
+        response_headers = dict(resp.headers)
+        if resp.headers.get('Content-Type', '').startswith('application/gzip'):
+            return {"status": resp.status, "headers": response_headers, "body": resp.data}
+        return {"status": resp.status, "headers": response_headers, "body": resp.data.decode('utf-8')}
+
+
+def pooled_request_client(client: WebClient) -> PooledWebClient:
+    # Bolt crea un WebClient nuevo en cada solicitud; este conserva su token y configuración pero usa el pool
+    if isinstance(client, PooledWebClient):
+        return client
+    pooled = PooledWebClient(
+        token=client.token,
+        base_url=client.base_url,
+        timeout=client.timeout,
+        ssl=client.ssl,
+        proxy=client.proxy,
+        headers=client.headers,
+        logger=client.logger,
+        retry_handlers=client.retry_handlers
+    )
+    pooled.default_params = dict(client.default_params)
+    return pooled
+
+
+def get_slack_client(token: Optional[str] = None, team_id: Optional[str] = None) -> PooledWebClient:
+    # Con team_id se usa el token instalado para ese workspace; sin él, el cliente único del proceso
+    if team_id is not None:
+        team_token = get_installation_store().bot_token(team_id)
+        if team_token is not None:
+            return _get_team_client(team_id, team_token)
+    
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            token = token or os.getenv("SLACK_BOT_TOKEN")
+            if not token:
+                raise ValueError("¡Error! SLACK_BOT_TOKEN no encontrado en variables de entorno")
+            _shared_client = PooledWebClient(token=token)
+            logging.getLogger(__name__).info(
+                f"Cliente de Slack compartido creado con pool de {_shared_client.pool_size} conexiones"
+            )
+        return _shared_client
+
+
+def _get_team_client(team_id: str, token: str) -> PooledWebClient:
+    with _shared_client_lock:
+        client = _team_clients.get(team_id)
+        if client is not None and client.token == token:
+            return client
+    
+    client = PooledWebClient(token=token, team_id=team_id)
+    with _shared_client_lock:
+        _team_clients[team_id] = client
+    return client
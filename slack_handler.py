@@ -4,6 +4,17 @@ from slack_bolt.adapter.socket_mode import SocketModeHandler
 from dotenv import load_dotenv
 import logging
 from dataclasses import dataclass
+from message_coalescer import MessageCoalescer
+from slack_client import PooledWebClient, get_slack_client, pooled_request_client
+from workspace_store import get_installation_store, workspace_team_id
+from reminder_actions import register_reminder_actions
+from http_ingress import SlackIngressServer, EVENTS_PATH
+from admission_control import AdmissionController, BUSY_MESSAGE, message_priority
+from tracing import start_span, traced
+from traffic_recorder import get_recorder
+
+# Segundos después de post_at en los que se busca un mensaje programado ya publicado
+SCHEDULED_POST_WINDOW = 600
 
 @dataclass
 class Message:
@@ -21,57 +32,197 @@ class SlackHandler:
         # Cargar variables de entorno
         load_dotenv()
         
-        # Verificar tokens de Slack
+        # Verificar tokens de Slack (un token por workspace si SLACK_WORKSPACES está configurado)
         self.slack_bot_token = os.getenv("SLACK_BOT_TOKEN")
-        if not self.slack_bot_token:
+        self.installation_store = get_installation_store()
+        if not self.slack_bot_token and not len(self.installation_store):
             raise ValueError("¡Error! SLACK_BOT_TOKEN no encontrado en variables de entorno")
             
-        # Inicializar la aplicación de Slack
-        self.app = App(token=self.slack_bot_token)
+        # Usar el cliente de Slack compartido del proceso
+        self.client = get_slack_client(self.slack_bot_token) if self.slack_bot_token else None
     
-    def send_message(self, channel_id: str, message: str):
+    def client_for_team(self, team_id=None):
+        # Cliente del workspace indicado; todos comparten el mismo pool de conexiones
+        if team_id is None:
+            return self.client
         try:
-            # Verificar token antes de enviar
-            if not self.slack_bot_token:
-                self.logger.error("Token de Slack no encontrado")
-                return
+            return get_slack_client(self.slack_bot_token, team_id=team_id)
+        except ValueError:
+            return None
+    
+    def _checked_client(self, team_id: str = None):
+        client = self.client_for_team(team_id)
+        
+        # Verificar token antes de enviar
+        if client is None or not client.token:
+            self.logger.error("Token de Slack no encontrado")
+            return None
 
-            # Verificar que el token comience con xoxb-
-            if not self.slack_bot_token.startswith('xoxb-'):
-                self.logger.error("Formato de token inválido")
-                return
+        # Verificar que el token comience con xoxb-
+        if not client.token.startswith('xoxb-'):
+            self.logger.error("Formato de token inválido")
+            return None
+        return client
 
-            # Verificar que el canal existe
+    def _resolve_channel(self, client, channel_id: str):
+        # Verificar que el canal existe
+        try:
+            channel_info = client.conversations_info(channel=channel_id)
+            if not channel_info['ok']:
+                self.logger.error(f"Error al verificar canal: {channel_info.get('error', 'Desconocido')}")
+                return None
+            return channel_id
+        except Exception as e:
+            # Si es un DM, intentar abrir una conversación
             try:
-                channel_info = self.app.client.conversations_info(channel=channel_id)
-                if not channel_info['ok']:
-                    self.logger.error(f"Error al verificar canal: {channel_info.get('error', 'Desconocido')}")
-                    return
+                conversation = client.conversations_open(users=channel_id)
+                if conversation['ok']:
+                    return conversation['channel']['id']
+                self.logger.error(f"Error al abrir conversación: {conversation.get('error', 'Desconocido')}")
+                return None
             except Exception as e:
-                # Si es un DM, intentar abrir una conversación
-                try:
-                    conversation = self.app.client.conversations_open(users=channel_id)
-                    if conversation['ok']:
-                        channel_id = conversation['channel']['id']
-                    else:
-                        self.logger.error(f"Error al abrir conversación: {conversation.get('error', 'Desconocido')}")
-                        return
-                except Exception as e:
-                    self.logger.error(f"Error al abrir conversación: {str(e)}")
-                    return
+                self.logger.error(f"Error al abrir conversación: {str(e)}")
+                return None
 
-            response = self.app.client.chat_postMessage(
-                channel=channel_id,
-                text=message
-            )
+    @traced("slack.send_message")
+    def send_message(self, channel_id: str, message: str, team_id: str = None, blocks: list = None) -> bool:
+        # Devuelve True solo si chat_postMessage confirmó el envío
+        try:
+            client = self._checked_client(team_id)
+            if client is None:
+                return False
+
+            channel_id = self._resolve_channel(client, channel_id)
+            if channel_id is None:
+                return False
+
+            with start_span("slack.chat_postMessage", channel=channel_id):
+                response = client.chat_postMessage(
+                    channel=channel_id,
+                    text=message,
+                    blocks=blocks
+                )
             
             if not response['ok']:
                 self.logger.error(f"Error al enviar mensaje: {response.get('error', 'Desconocido')}")
-                return
+                return False
+            
+            self.logger.debug(f"Conexiones de Slack: {client.connection_stats()}")
+            return True
                 
         except Exception as e:
             self.logger.error(f"Error al enviar mensaje: {str(e)}")
             self.logger.error(f"Tipo de error: {type(e).__name__}")
+            return False
+
+    @traced("slack.schedule_message")
+    def schedule_message(self, channel_id: str, message: str, post_at: int, team_id: str = None,
+                         blocks: list = None):
+        # Devuelve (canal, scheduled_message_id) si chat.scheduleMessage aceptó el mensaje, o None
+        try:
+            client = self._checked_client(team_id)
+            if client is None:
+                return None
+
+            channel_id = self._resolve_channel(client, channel_id)
+            if channel_id is None:
+                return None
+
+            response = client.chat_scheduleMessage(
+                channel=channel_id,
+                post_at=post_at,
+                text=message,
+                blocks=blocks
+            )
+            if not response['ok']:
+                self.logger.error(f"Error al programar mensaje: {response.get('error', 'Desconocido')}")
+                return None
+            return response['channel'], response['scheduled_message_id']
+        except Exception as e:
+            self.logger.error(f"Error al programar mensaje: {str(e)}")
+            return None
+
+    @traced("slack.delete_scheduled_message")
+    def delete_scheduled_message(self, channel_id: str, scheduled_message_id: str, team_id: str = None) -> bool:
+        try:
+            client = self._checked_client(team_id)
+            if client is None:
+                return False
+            response = client.chat_deleteScheduledMessage(
+                channel=channel_id,
+                scheduled_message_id=scheduled_message_id
+            )
+            if not response['ok']:
+                self.logger.error(f"Error al borrar mensaje programado: {response.get('error', 'Desconocido')}")
+                return False
+            return True
+        except Exception as e:
+            self.logger.error(f"Error al borrar mensaje programado: {str(e)}")
+            return False
+
+    @traced("slack.find_scheduled_post")
+    def scheduled_message_posted(self, channel_id: str, reminder_id: str, post_at: int, team_id: str = None):
+        # True si el canal tiene la notificación publicada a su hora, False si no está, None si Slack no respondió
+        try:
+            client = self._checked_client(team_id)
+            if client is None:
+                return None
+            cursor = None
+            while True:
+                response = client.conversations_history(
+                    channel=channel_id,
+                    oldest=str(post_at - 60),
+                    latest=str(post_at + SCHEDULED_POST_WINDOW),
+                    inclusive=True,
+                    cursor=cursor,
+                    limit=200
+                )
+                if not response['ok']:
+                    self.logger.error(f"Error al leer el historial del canal: {response.get('error', 'Desconocido')}")
+                    return None
+                if any(_has_action_value(message, reminder_id) for message in response['messages']):
+                    return True
+                cursor = (response.get('response_metadata') or {}).get('next_cursor')
+                if not cursor:
+                    return False
+        except Exception as e:
+            self.logger.error(f"Error al leer el historial del canal: {str(e)}")
+            return None
+
+    @traced("slack.list_scheduled_messages")
+    def list_scheduled_messages(self, team_id: str = None):
+        # {scheduled_message_id: post_at} de todo el workspace, o None si Slack no respondió
+        try:
+            client = self._checked_client(team_id)
+            if client is None:
+                return None
+            scheduled = {}
+            cursor = None
+            while True:
+                response = client.chat_scheduledMessages_list(cursor=cursor, limit=100)
+                if not response['ok']:
+                    self.logger.error(f"Error al listar mensajes programados: {response.get('error', 'Desconocido')}")
+                    return None
+                for item in response['scheduled_messages']:
+                    scheduled[item['id']] = item['post_at']
+                cursor = (response.get('response_metadata') or {}).get('next_cursor')
+                if not cursor:
+                    return scheduled
+        except Exception as e:
+            self.logger.error(f"Error al listar mensajes programados: {str(e)}")
+            return None
+
+def _has_action_value(message: dict, value: str) -> bool:
+    # Los botones de la notificación llevan el reminder_id como valor
+    return any(
+        element.get('value') == value
+        for block in message.get('blocks') or []
+        for element in block.get('elements') or []
+    )
+
+def event_team_id(event: dict, context) -> str:
+    # Bolt llena context['team_id'] aun con un solo workspace; solo se usa si hay varios configurados
+    return workspace_team_id(context.get('team_id') or event.get('team'))
 
 def start_slack_handler(agent):
     try:
@@ -85,17 +236,34 @@ def start_slack_handler(agent):
         # Verificar tokens de Slack
         slack_bot_token = os.getenv("SLACK_BOT_TOKEN")
         slack_app_token = os.getenv("SLACK_APP_TOKEN")
+        installation_store = get_installation_store()
         
-        if not slack_bot_token or not slack_app_token:
+        # socket: una conexión websocket por app; http: Events API detrás del balanceador (varias réplicas)
+        slack_mode = os.getenv("SLACK_MODE", "socket").lower()
+        if slack_mode not in ("socket", "http"):
+            raise ValueError(f"¡Error! SLACK_MODE inválido: {slack_mode}")
+        
+        if not (slack_bot_token or len(installation_store)) or (slack_mode == "socket" and not slack_app_token):
             raise ValueError("¡Error! Tokens de Slack no encontrados en variables de entorno")
         
         logger.info("Tokens de Slack verificados correctamente")
         
-        # Inicializar la aplicación de Slack
-        app = App(token=slack_bot_token)
+        if len(installation_store):
+            # Varios workspaces: el token de cada evento se resuelve desde el almacén de instalaciones
+            app = App(client=PooledWebClient(), authorize=installation_store.authorize)
+            logger.info(f"Atendiendo {len(installation_store)} workspaces desde un solo proceso")
+        else:
+            # Inicializar la aplicación de Slack con el cliente compartido
+            app = App(client=get_slack_client(slack_bot_token))
+        
+        @app.middleware
+        def use_pooled_client(context, next):
+            # Se ejecuta después de la autorización; say se construye después a partir de este client
+            context['client'] = pooled_request_client(context.client)
+            next()
         
         @app.event("message")
-        def handle_message_events(event, say):
+        def handle_message_events(event, say, context):
             # Verificar que tenemos todos los campos necesarios
             required_fields = ['type', 'channel', 'user', 'text']
             for field in required_fields:
@@ -126,37 +294,72 @@ def start_slack_handler(agent):
                 return
             
             logger.info("Procesando mensaje de usuario...")
+            team_id = event_team_id(event, context)
             
-            try:
-                # Agregar reacción de ojos al mensaje
-                app.client.reactions_add(
+            # Agrupar mensajes seguidos del mismo usuario en el mismo workspace y canal/hilo
+            with start_span("slack.receive_event", channel=event['channel'], user=event['user']):
+                get_recorder().record(
+                    'slack_event',
+                    text=event['text'],
                     channel=event['channel'],
-                    timestamp=event['ts'],
-                    name='eyes'
+                    user=event['user'],
+                    channel_type=event.get('channel_type')
                 )
+                coalescer.submit(
+                    (team_id, event['channel'], event['user'], event.get('thread_ts')),
+                    dict(event, team=team_id),
+                    say
+                )
+        
+        def admit_events(events, say):
+            # Pasar por el control de admisión antes de iniciar el trabajo con Gemini
+            first_event = events[0]
+            text = "\n".join(event['text'] for event in events)
+            priority = message_priority(text, first_event.get('channel_type') == 'im')
+            if not admission.submit(first_event['user'], priority, lambda: process_events(events, say)):
+                say(text=BUSY_MESSAGE)
+                logger.info(f"Estadísticas de admisión: {admission.stats()}")
+        
+        @traced("slack.process_events")
+        def process_events(events, say):
+            # El primer mensaje recibe las reacciones; el texto se une en una sola solicitud
+            first_event = events[0]
+            client = get_slack_client(slack_bot_token, team_id=first_event.get('team'))
+            try:
+                # Agregar reacción de ojos al mensaje
+                with start_span("slack.reactions_add"):
+                    client.reactions_add(
+                        channel=first_event['channel'],
+                        timestamp=first_event['ts'],
+                        name='eyes'
+                    )
                 
                 # Procesar el mensaje con el agente
                 response = agent.process_message(
-                    message=event['text'],
-                    channel_id=event['channel'],
-                    user_id=event['user']
+                    message="\n".join(event['text'] for event in events),
+                    channel_id=first_event['channel'],
+                    user_id=first_event['user'],
+                    team_id=first_event.get('team'),
+                    thread_ts=first_event.get('thread_ts')
                 )
                 
                 # Enviar respuesta a Slack
                 logger.info(f"Enviando respuesta a Slack: {response[:100]}...")
-                say(text=response)
+                with start_span("slack.say"):
+                    say(text=response)
                 
                 # Quitar reacción de ojos y agregar flecha verde
-                app.client.reactions_remove(
-                    channel=event['channel'],
-                    timestamp=event['ts'],
-                    name='eyes'
-                )
-                app.client.reactions_add(
-                    channel=event['channel'],
-                    timestamp=event['ts'],
-                    name='white_check_mark'
-                )
+                with start_span("slack.reactions_update"):
+                    client.reactions_remove(
+                        channel=first_event['channel'],
+                        timestamp=first_event['ts'],
+                        name='eyes'
+                    )
+                    client.reactions_add(
+                        channel=first_event['channel'],
+                        timestamp=first_event['ts'],
+                        name='white_check_mark'
+                    )
                 
                 logger.info("Mensaje procesado y respondido exitosamente")
                 
@@ -170,23 +373,51 @@ def start_slack_handler(agent):
             finally:
                 logger.info("="*50)
         
-        logger.info("Iniciando SocketModeHandler...")
-        handler = SocketModeHandler(
-            app=app,
-            app_token=slack_app_token
-        )
+        admission = AdmissionController()
+        agent.admission_controller = admission
+        coalescer = MessageCoalescer(dispatch=admit_events)
+        agent.message_coalescer = coalescer
+        if coalescer.enabled:
+            logger.info(f"Agrupación de mensajes activa: ventana de {coalescer.window * 1000:.0f} ms")
+        
+        # Botones de las notificaciones de recordatorio (posponer / hecho)
+        register_reminder_actions(app, agent)
         
         # Configurar manejadores de eventos adicionales
         @app.event("app_mention")
-        def handle_app_mentions(event, say):
+        def handle_app_mentions(event, say, context):
             logger.info(f"Mención de app recibida: {event}")
-            handle_message_events(event, say)
+            handle_message_events(event, say, context)
         
         @app.error
         def custom_error_handler(error, body, logger):
             logger.error(f"Error en la aplicación Slack: {error}")
             logger.debug(f"Contexto del error: {body}")
         
+        if slack_mode == "http":
+            # Bolt confirma cada evento de inmediato y procesa en segundo plano
+            server = SlackIngressServer(app=app)
+            logger.info(f"Escuchando el Events API de Slack en el puerto {server.port} ({EVENTS_PATH})")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                logger.info("Deteniendo el servidor de Slack por interrupción del usuario...")
+            finally:
+                server.server_close()
+            return agent
+        
+        # En modo socket el puerto solo atiende el healthcheck
+        try:
+            SlackIngressServer().serve_in_background()
+        except OSError as e:
+            logger.warning(f"No se pudo iniciar el healthcheck HTTP: {str(e)}")
+        
+        logger.info("Iniciando SocketModeHandler...")
+        handler = SocketModeHandler(
+            app=app,
+            app_token=slack_app_token
+        )
+        
         # Iniciar el handler
         logger.info("Iniciando el servidor de Slack...")
         try:
@@ -205,7 +436,7 @@ def start_slack_handler(agent):
             raise
         
     except Exception as e:
-        logger.error(f"Error al iniciar SocketModeHandler: {e}")
+        logger.error(f"Error al iniciar el manejador de Slack: {e}")
         raise
 
 if __name__ == "__main__":
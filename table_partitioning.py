@@ -0,0 +1,69 @@
+import os
+import sys
+import logging
+
+PARTITION_FIELD = 'created_at'
+BACKUP_SUFFIX = '_sin_particion'
+PARTITIONED_SUFFIX = '_particionada'
+
+
+def is_partitioned(table) -> bool:
+    partitioning = getattr(table, 'time_partitioning', None)
+    return partitioning is not None and partitioning.field == PARTITION_FIELD
+
+
+def partition_migration_sql(table) -> list[str]:
+    # Copia particionada con el mismo esquema (incluido REQUIRED) y luego se intercambian los nombres
+    table_ref = f"{table.project}.{table.dataset_id}.{table.table_id}"
+    partitioned_ref = f"{table_ref}{PARTITIONED_SUFFIX}"
+    columns = ",\n  ".join(
+        f"{field.name} {field.field_type}{' NOT NULL' if field.mode == 'REQUIRED' else ''}"
+        for field in table.schema
+    )
+    return [
+        f"CREATE TABLE `{partitioned_ref}` (\n  {columns}\n)\n"
+        f"PARTITION BY DATE({PARTITION_FIELD})\n"
+        f"AS SELECT * FROM `{table_ref}`",
+        f"ALTER TABLE `{table_ref}` RENAME TO `{table.table_id}{BACKUP_SUFFIX}`",
+        f"ALTER TABLE `{partitioned_ref}` RENAME TO `{table.table_id}`",
+    ]
+
+
+def migrate_table(client, table_ref: str, apply: bool = False) -> list[str]:
+    # Devuelve las sentencias necesarias (vacío si ya está particionada); con apply=True las ejecuta en orden
+    table = client.get_table(table_ref)
+    if is_partitioned(table):
+        return []
+    statements = partition_migration_sql(table)
+    if apply:
+        for statement in statements:
+            client.query(statement).result()
+    return statements
+
+
+def main(argv=None) -> int:
+    # python table_partitioning.py [--apply]: sin --apply solo muestra el SQL
+    from reminder_handler import ReminderHandler
+    argv = sys.argv[1:] if argv is None else argv
+    apply = '--apply' in argv
+    handler = ReminderHandler(
+        project_id=os.getenv('BIGQUERY_PROJECT_ID'),
+        dataset_id=os.getenv('BIGQUERY_DATASET')
+    )
+    for table_id in (handler.table_id, handler.history_table_id):
+        table_ref = f"{handler.project_id}.{handler.dataset_id}.{table_id}"
+        statements = migrate_table(handler.client, table_ref, apply=apply)
+        if not statements:
+            print(f"{table_ref}: ya está particionada por {PARTITION_FIELD}")
+            continue
+        print(f"{table_ref}: {'migrada' if apply else 'migración pendiente'}")
+        for statement in statements:
+            print(f"{statement};\n")
+    if not apply:
+        print("Detén Rebeca (sin escrituras en curso) y ejecuta con --apply para aplicar la migración")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
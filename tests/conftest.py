@@ -0,0 +1,63 @@
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+from reminder_handler import Reminder, ReminderHandler
+from rebeca_agent import RebecaAgent
+
+@pytest.fixture(autouse=True)
+def isolated_outbox(tmp_path, monkeypatch):
+    # Cada prueba usa su propia bandeja de envíos en lugar de data/
+    monkeypatch.setenv('REMINDER_OUTBOX_PATH', str(tmp_path / 'outbox.sqlite3'))
+
+
+@pytest.fixture(autouse=True)
+def legacy_bigquery_writes(monkeypatch):
+    # Los clientes de BigQuery de las pruebas son mocks: escrituras por insert_rows_json y sin esperar al flush
+    monkeypatch.setenv('BIGQUERY_WRITE_MODE', 'legacy')
+    monkeypatch.setenv('BIGQUERY_WRITE_FLUSH_MS', '0')
+
+
+@pytest.fixture
+def make_reminder():
+    # Recordatorio único pendiente; cada prueba indica solo los campos que le importan
+    def make(reminder_id="r1", when="2024-01-01T10:00:00", **fields):
+        if isinstance(when, datetime):
+            when = when.strftime('%Y-%m-%dT%H:%M:%S')
+        values = {
+            'user_id': "U1",
+            'message': f"tarea {reminder_id}",
+            'reminder_type': "once",
+            'channel_id': "D1",
+            'timezone': "America/Mexico_City"
+        }
+        values.update(fields)
+        return Reminder(reminder_id=reminder_id, datetime=when, **values)
+    return make
+
+
+@pytest.fixture
+def reminder_handler():
+    # ReminderHandler real con el cliente de BigQuery simulado: sin filas y sin errores de escritura
+    with patch('reminder_handler.bigquery.Client') as mock:
+        client = mock.return_value
+        client.insert_rows_json.return_value = []
+        client.query.return_value.result.return_value = []
+        yield ReminderHandler('test-project', 'test-dataset')
+
+
+@pytest.fixture
+def make_agent(monkeypatch):
+    # RebecaAgent sin Slack, BigQuery ni Gemini; los módulos que necesitan otra configuración
+    # sobrescriben `agent` y fijan sus variables de entorno antes de llamar a la fábrica
+    monkeypatch.setenv('GEMINI_API_KEY', 'test-key')
+    def make(**kwargs):
+        with patch('rebeca_agent.SlackHandler'), \
+             patch('rebeca_agent.ReminderHandler'), \
+             patch('rebeca_agent.genai'):
+            return RebecaAgent(**kwargs)
+    return make
+
+
+@pytest.fixture
+def agent(make_agent):
+    return make_agent()
@@ -0,0 +1,73 @@
+import threading
+import time
+from admission_control import (
+    AdmissionController, PRIORITY_HIGH, PRIORITY_NORMAL, message_priority
+)
+
+def test_message_priority():
+    assert message_priority("hola", is_dm=True) == PRIORITY_HIGH
+    assert message_priority("recuérdame la junta a las 3", is_dm=False) == PRIORITY_HIGH
+    assert message_priority("¿cuál es el horario?", is_dm=False) == PRIORITY_NORMAL
+
+def test_token_bucket_rejects_chatty_user():
+    controller = AdmissionController(workers=1, max_queue=50, user_rate_per_minute=1, user_burst=2)
+    
+    results = [controller.submit("U1", PRIORITY_NORMAL, lambda: None) for _ in range(3)]
+    
+    assert results == [True, True, False]
+    assert controller.submit("U2", PRIORITY_NORMAL, lambda: None)
+    assert controller.stats()['rejected_rate'] == 1
+
+def test_idle_user_buckets_are_evicted():
+    controller = AdmissionController(workers=1, max_queue=50, user_rate_per_minute=600, user_burst=1)
+    for number in range(5):
+        controller.submit(f"U{number}", PRIORITY_NORMAL, lambda: None)
+    assert controller.stats()['tracked_users'] == 5
+    
+    # Pasado un periodo de recarga completo los cubos están llenos y se descartan
+    time.sleep(0.15)
+    controller.submit("U9", PRIORITY_NORMAL, lambda: None)
+    
+    assert controller.stats()['tracked_users'] == 1
+
+def test_saturated_queue_rejects_fast():
+    release = threading.Event()
+    controller = AdmissionController(workers=1, max_queue=1, user_burst=10)
+    
+    assert controller.submit("U1", PRIORITY_NORMAL, release.wait)
+    time.sleep(0.05)
+    assert controller.submit("U2", PRIORITY_NORMAL, lambda: None)
+    assert not controller.submit("U3", PRIORITY_NORMAL, lambda: None)
+    assert controller.stats()['rejected_busy'] == 1
+    release.set()
+
+def test_high_priority_runs_first():
+    release = threading.Event()
+    order = []
+    controller = AdmissionController(workers=1, max_queue=10, user_burst=10)
+    
+    controller.submit("U0", PRIORITY_NORMAL, release.wait)
+    time.sleep(0.05)
+    controller.submit("U1", PRIORITY_NORMAL, lambda: order.append("normal"))
+    controller.submit("U2", PRIORITY_HIGH, lambda: order.append("high"))
+    release.set()
+    time.sleep(0.2)
+    
+    assert order == ["high", "normal"]
+
+def test_user_concurrency_limit():
+    release = threading.Event()
+    order = []
+    controller = AdmissionController(workers=2, max_queue=10, user_concurrency=1, user_burst=10)
+    
+    # U1 ocupa un trabajador; su segundo mensaje espera aunque haya otro trabajador libre
+    controller.submit("U1", PRIORITY_NORMAL, release.wait)
+    time.sleep(0.05)
+    controller.submit("U1", PRIORITY_HIGH, lambda: order.append("U1"))
+    controller.submit("U2", PRIORITY_NORMAL, lambda: order.append("U2"))
+    time.sleep(0.2)
+    assert order == ["U2"]
+    
+    release.set()
+    time.sleep(0.2)
+    assert order == ["U2", "U1"]
@@ -0,0 +1,146 @@
+import threading
+from unittest.mock import MagicMock
+import pytest
+from bigquery_writer import (
+    BigQueryRowWriter, InMemoryWriteBackend, LegacyInsertBackend, OffsetAlreadyWritten, create_row_writer
+)
+
+TABLE = 'proyecto.dataset.user_reminders'
+
+
+def make_writer(backend=None, **kwargs):
+    kwargs.setdefault('flush_ms', 0)
+    return BigQueryRowWriter(backend or InMemoryWriteBackend(), **kwargs)
+
+
+def test_write_is_committed_at_increasing_offsets():
+    backend = InMemoryWriteBackend()
+    writer = make_writer(backend)
+
+    writer.write(TABLE, [{'reminder_id': 'r1'}])
+    writer.write(TABLE, [{'reminder_id': 'r2'}, {'reminder_id': 'r3'}])
+
+    assert [row['reminder_id'] for row in backend.rows(TABLE)] == ['r1', 'r2', 'r3']
+    assert writer.stats()['rows'] == 3
+
+
+def test_concurrent_writes_are_grouped_into_one_append():
+    backend = InMemoryWriteBackend()
+    writer = make_writer(backend, flush_ms=200, batch_rows=1000)
+
+    futures = [writer.append(TABLE, [{'reminder_id': f"r{i}"}]) for i in range(20)]
+    for future in futures:
+        future.result(timeout=5)
+
+    assert backend.append_calls == 1
+    assert len(backend.rows(TABLE)) == 20
+
+
+def test_batch_is_flushed_when_full():
+    backend = InMemoryWriteBackend()
+    writer = make_writer(backend, flush_ms=60000, batch_rows=3)
+
+    writer.append(TABLE, [{'reminder_id': 'r1'}, {'reminder_id': 'r2'}])
+    writer.append(TABLE, [{'reminder_id': 'r3'}]).result(timeout=5)
+
+    assert len(backend.rows(TABLE)) == 3
+
+
+def test_flush_forces_pending_rows():
+    backend = InMemoryWriteBackend()
+    writer = make_writer(backend, flush_ms=60000)
+
+    writer.append(TABLE, [{'reminder_id': 'r1'}])
+    writer.flush(timeout=5)
+
+    assert len(backend.rows(TABLE)) == 1
+    assert writer.stats()['buffered'] == 0
+
+
+def test_retry_after_transient_failure():
+    backend = InMemoryWriteBackend()
+    backend.fail_next = 1
+    writer = make_writer(backend)
+
+    writer.write(TABLE, [{'reminder_id': 'r1'}], timeout=5)
+
+    assert len(backend.rows(TABLE)) == 1
+    assert writer.stats()['retries'] == 1
+
+
+def test_lost_ack_is_not_duplicated():
+    # El append se escribió pero la confirmación no llegó: el reintento en el mismo offset no duplica
+    backend = InMemoryWriteBackend()
+    backend.lose_ack_next = 1
+    writer = make_writer(backend)
+
+    writer.write(TABLE, [{'reminder_id': 'r1'}], timeout=5)
+    writer.write(TABLE, [{'reminder_id': 'r2'}], timeout=5)
+
+    assert [row['reminder_id'] for row in backend.rows(TABLE)] == ['r1', 'r2']
+
+
+def test_exhausted_retries_fail_and_next_batch_uses_new_stream():
+    backend = InMemoryWriteBackend()
+    backend.fail_next = 3
+    writer = make_writer(backend, max_retries=2)
+
+    with pytest.raises(Exception):
+        writer.write(TABLE, [{'reminder_id': 'r1'}], timeout=5)
+    writer.write(TABLE, [{'reminder_id': 'r2'}], timeout=5)
+
+    assert [row['reminder_id'] for row in backend.rows(TABLE)] == ['r2']
+    assert writer.stats()['failed'] == 1
+
+
+def test_writes_from_many_threads_keep_every_row():
+    backend = InMemoryWriteBackend()
+    writer = make_writer(backend, flush_ms=20)
+
+    def worker(n):
+        for i in range(10):
+            writer.write(TABLE, [{'reminder_id': f"{n}-{i}"}], timeout=5)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ids = [row['reminder_id'] for row in backend.rows(TABLE)]
+    assert len(ids) == 80
+    assert len(set(ids)) == 80
+    assert backend.append_calls < 80
+
+
+def test_in_memory_backend_rejects_written_offset():
+    backend = InMemoryWriteBackend()
+    stream = backend.open_stream(TABLE)
+    backend.append(stream, [{'reminder_id': 'r1'}], 0)
+
+    with pytest.raises(OffsetAlreadyWritten):
+        backend.append(stream, [{'reminder_id': 'r1'}], 0)
+
+
+def test_legacy_backend_sends_insert_ids_per_offset():
+    client = MagicMock()
+    client.insert_rows_json.return_value = []
+    writer = make_writer(LegacyInsertBackend(client))
+
+    writer.write(TABLE, [{'reminder_id': 'r1'}, {'reminder_id': 'r2'}])
+    writer.write(TABLE, [{'reminder_id': 'r3'}])
+
+    first, second = client.insert_rows_json.call_args_list
+    assert first[0] == (TABLE, [{'reminder_id': 'r1'}, {'reminder_id': 'r2'}])
+    prefix = first[1]['row_ids'][0].rsplit('-', 1)[0]
+    assert first[1]['row_ids'] == [f"{prefix}-0", f"{prefix}-1"]
+    assert second[1]['row_ids'] == [f"{prefix}-2"]
+
+
+def test_storage_mode_falls_back_without_library(monkeypatch):
+    import bigquery_writer
+    monkeypatch.setattr(bigquery_writer, 'bigquery_storage_v1', None)
+
+    writer = create_row_writer(MagicMock(), 'storage')
+
+    assert isinstance(writer.backend, LegacyInsertBackend)
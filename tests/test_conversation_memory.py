@@ -0,0 +1,73 @@
+import pytest
+from unittest.mock import MagicMock
+from conversation_memory import ConversationMemory
+
+KEY = ('T1', 'C1', '1700000000.000100')
+
+def test_history_uses_gemini_content_format():
+    memory = ConversationMemory(token_budget=1000)
+    memory.append(KEY, "¿Quién atiende soporte?", "El equipo de TI")
+    
+    assert memory.history(KEY) == [
+        {'role': 'user', 'parts': ["¿Quién atiende soporte?"]},
+        {'role': 'model', 'parts': ["El equipo de TI"]}
+    ]
+    assert memory.history(('T1', 'C1', 'otro')) == []
+
+def test_old_turns_roll_into_summary_within_budget():
+    memory = ConversationMemory(token_budget=100)
+    for i in range(10):
+        memory.append(KEY, f"pregunta {i} " + "x" * 80, f"respuesta {i} " + "y" * 80)
+    
+    history = memory.history(KEY)
+    
+    assert history[0]['parts'][0].startswith("Resumen de la conversación anterior:")
+    assert "pregunta 9" in history[-2]['parts'][0]
+    assert "respuesta 9" in history[-1]['parts'][0]
+    assert memory.stats()['tokens'] <= 100
+
+def test_least_recently_used_conversations_are_evicted():
+    memory = ConversationMemory(token_budget=100, max_conversations=2)
+    memory.append('a', "hola", "hola")
+    memory.append('b', "hola", "hola")
+    memory.history('a')
+    memory.append('c', "hola", "hola")
+    
+    assert memory.history('b') == []
+    assert memory.history('a') != []
+    assert memory.stats() == {'conversations': 2, 'tokens': 4, 'evicted': 1}
+
+def test_idle_conversations_expire():
+    memory = ConversationMemory(token_budget=100, idle_ttl=60)
+    memory.append('a', "hola", "hola")
+    memory._conversations['a'].last_used -= 120
+    
+    assert memory.history('a') == []
+
+def test_disabled_memory_keeps_nothing():
+    memory = ConversationMemory(token_budget=0)
+    memory.append('a', "hola", "hola")
+    
+    assert memory.history('a') == []
+    assert memory.stats()['conversations'] == 0
+
+@pytest.fixture
+def agent(make_agent):
+    agent = make_agent()
+    agent.conversation_memory = ConversationMemory(token_budget=1000)
+    agent.model.generate_content.return_value = MagicMock(parts=[MagicMock(text="respuesta")])
+    return agent
+
+def test_agent_sends_thread_history_to_gemini(agent):
+    agent.process_with_gemini("primera", user_id="U1", channel_id="C1", conversation_key=KEY)
+    agent.process_with_gemini("segunda", user_id="U1", channel_id="C1", conversation_key=KEY)
+    
+    first_prompt = agent.model.generate_content.call_args_list[0][0][0]
+    contents = agent.model.generate_content.call_args_list[1][0][0]
+    assert isinstance(first_prompt, str)
+    assert contents[:2] == [
+        {'role': 'user', 'parts': ["primera"]},
+        {'role': 'model', 'parts': ["respuesta"]}
+    ]
+    assert contents[-1]['role'] == 'user'
+    assert "segunda" in contents[-1]['parts'][0]
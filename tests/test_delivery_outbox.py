@@ -0,0 +1,114 @@
+import time
+import pytest
+from unittest.mock import MagicMock
+from delivery_outbox import DeliveryOutbox
+
+def make_due(outbox):
+    outbox._conn.execute("UPDATE outbox SET next_attempt_at = 0")
+
+def test_entries_survive_restart(tmp_path):
+    path = str(tmp_path / 'outbox.sqlite3')
+    outbox = DeliveryOutbox(path)
+    outbox.enqueue(["a"], "D1", "hola", team_id="T1", blocks=[{'type': 'section'}])
+    
+    reopened = DeliveryOutbox(path)
+    entries = reopened.due()
+    
+    assert reopened.contains("a")
+    assert [(e.reminder_ids, e.team_id, e.blocks) for e in entries] == [(["a"], "T1", [{'type': 'section'}])]
+    reopened.complete(entries[0])
+    assert not reopened.contains("a")
+    assert reopened.stats() == {'pending': 0, 'dead_letter': 0}
+
+def test_backoff_grows_with_jitter(tmp_path):
+    outbox = DeliveryOutbox(str(tmp_path / 'outbox.sqlite3'), base_delay=10, max_delay=100)
+    entry = outbox.enqueue(["a"], "D1", "hola")
+    
+    delays = []
+    for _ in range(4):
+        before = time.time()
+        outbox.fail(entry, "timeout")
+        next_attempt = outbox._conn.execute("SELECT next_attempt_at FROM outbox").fetchone()[0]
+        delays.append(next_attempt - before)
+    
+    for delay, base in zip(delays, (10, 20, 40, 80)):
+        assert base * 0.5 <= delay <= base * 1.5 + 1
+    assert outbox.due() == []
+
+def test_moves_to_dead_letter_after_max_attempts(tmp_path):
+    outbox = DeliveryOutbox(str(tmp_path / 'outbox.sqlite3'), max_attempts=2)
+    entry = outbox.enqueue(["a", "b"], "C1", "resumen")
+    
+    assert outbox.fail(entry, "channel_not_found") is False
+    assert outbox.fail(entry, "channel_not_found") is True
+    
+    assert outbox.stats() == {'pending': 0, 'dead_letter': 1}
+    assert outbox.contains("a")
+    assert outbox._conn.execute("SELECT last_error, attempts FROM dead_letter").fetchone() == ("channel_not_found", 2)
+
+@pytest.fixture
+def agent(tmp_path, make_agent):
+    agent = make_agent(outbox=DeliveryOutbox(str(tmp_path / 'agent_outbox.sqlite3')))
+    agent.reminder_handler.is_closed.return_value = False
+    agent.model.generate_content.return_value = MagicMock(parts=[MagicMock(text="formateado")])
+    return agent
+
+def test_failed_send_is_not_marked_executed_and_is_retried(agent, make_reminder):
+    agent.slack_handler.send_message.return_value = False
+    agent._deliver_reminders([make_reminder("a")])
+    
+    agent.reminder_handler.mark_reminder_as_executed.assert_not_called()
+    
+    # El siguiente ciclo no vuelve a formatear ni encolar el mismo recordatorio
+    agent._deliver_reminders([make_reminder("a")])
+    assert agent.model.generate_content.call_count == 1
+    assert agent.outbox.stats()['pending'] == 1
+    
+    agent.slack_handler.send_message.return_value = True
+    make_due(agent.outbox)
+    assert agent.retry_outbox() == 1
+    
+    agent.reminder_handler.mark_reminder_as_executed.assert_called_once_with("a")
+    assert agent.outbox.stats()['pending'] == 0
+    assert not agent.outbox.contains("a")
+
+def test_send_exceptions_are_retried(agent, make_reminder):
+    agent.slack_handler.send_message.side_effect = Exception("ratelimited")
+    agent._deliver_reminders([make_reminder("a")])
+    
+    assert agent.outbox._conn.execute("SELECT attempts, last_error FROM outbox").fetchone() == (1, "ratelimited")
+
+def test_confirmed_send_is_not_repeated_when_bigquery_fails(agent, make_reminder):
+    agent.slack_handler.send_message.return_value = True
+    agent.reminder_handler.mark_reminder_as_executed.side_effect = [Exception("bigquery"), None]
+    agent._deliver_reminders([make_reminder("a")])
+    
+    make_due(agent.outbox)
+    agent.retry_outbox()
+    
+    assert agent.slack_handler.send_message.call_count == 1
+    assert agent.reminder_handler.mark_reminder_as_executed.call_count == 2
+    assert agent.outbox.stats()['pending'] == 0
+
+def test_dead_letter_marks_reminder_failed_and_alerts(agent, caplog, make_reminder):
+    agent.outbox.max_attempts = 1
+    agent.admin_users = {"UADMIN"}
+    agent.slack_handler.send_message.return_value = False
+    
+    agent._deliver_reminders([make_reminder("a")])
+    
+    agent.reminder_handler.mark_reminders_as_failed.assert_called_once_with(["a"])
+    assert any(record.levelname == "CRITICAL" and "admin fallidos" in record.message for record in caplog.records)
+    summary = agent._handle_admin_command("admin fallidos", "UADMIN")
+    assert "Envíos fallidos: 1" in summary
+    assert "canal `U1`" in summary
+
+def test_sent_dead_letter_is_not_marked_failed(agent, make_reminder):
+    agent.outbox.max_attempts = 1
+    agent.slack_handler.send_message.return_value = True
+    agent.reminder_handler.mark_reminder_as_executed.side_effect = Exception("bigquery")
+    
+    agent._deliver_reminders([make_reminder("a")])
+    
+    assert agent.outbox.stats() == {'pending': 0, 'dead_letter': 1}
+    agent.reminder_handler.mark_reminders_as_failed.assert_not_called()
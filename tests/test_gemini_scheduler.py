@@ -0,0 +1,119 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from google.api_core import exceptions as api_exceptions
+from gemini_scheduler import GeminiScheduler, GeminiQuotaExceeded, retry_after_seconds
+
+def test_calls_run_immediately_without_limits():
+    scheduler = GeminiScheduler(rpm=0, tpm=0)
+
+    response, waited = scheduler.run('chat', lambda: "hola")
+
+    assert response == "hola"
+    assert waited < 0.05
+    assert scheduler.stats()['classes']['interactive']['calls'] == 1
+
+def test_rpm_budget_delays_until_window_frees():
+    scheduler = GeminiScheduler(rpm=2, tpm=0, window_seconds=0.2)
+    scheduler.run('chat', lambda: 1)
+    scheduler.run('chat', lambda: 2)
+
+    _, waited = scheduler.run('chat', lambda: 3)
+
+    assert 0.1 < waited < 0.5
+
+def test_tpm_budget_uses_reported_tokens():
+    scheduler = GeminiScheduler(rpm=0, tpm=1000, window_seconds=0.2)
+    response = SimpleNamespace(usage_metadata=SimpleNamespace(total_token_count=900))
+    scheduler.run('chat', lambda: response, estimated_tokens=10, count_tokens=lambda r: r.usage_metadata.total_token_count)
+
+    assert scheduler.stats()['tokens_in_window'] == 900
+    _, waited = scheduler.run('chat', lambda: None, estimated_tokens=100)
+    assert waited > 0.1
+
+def test_interactive_requests_jump_ahead_of_background():
+    scheduler = GeminiScheduler(rpm=1, tpm=0, window_seconds=0.3)
+    scheduler.run('chat', lambda: None)
+    order = []
+
+    def call(route):
+        scheduler.run(route, lambda: order.append(route))
+
+    threads = [threading.Thread(target=call, args=('reminder_format',))]
+    threads[0].start()
+    time.sleep(0.05)
+    for route in ('intent', 'chat'):
+        threads.append(threading.Thread(target=call, args=(route,)))
+        threads[-1].start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert order == ['chat', 'intent', 'reminder_format']
+    assert scheduler.stats()['classes']['background']['max_wait_ms'] > scheduler.stats()['classes']['interactive']['max_wait_ms']
+
+def test_rate_limit_honors_retry_hint():
+    scheduler = GeminiScheduler(rpm=0, tpm=0)
+    calls = []
+
+    def call():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise api_exceptions.ResourceExhausted("Quota exceeded. Please retry in 0.2s.")
+        return "ok"
+
+    response, waited = scheduler.run('intent', call)
+
+    assert response == "ok"
+    assert calls[1] - calls[0] >= 0.19
+    assert scheduler.stats()['classes']['intent']['rate_limited'] == 1
+
+def test_rate_limit_pauses_other_classes():
+    scheduler = GeminiScheduler(rpm=0, tpm=0)
+    scheduler._rate_limited(0, 0.2)
+
+    _, waited = scheduler.run('reminder_format', lambda: None)
+
+    assert waited >= 0.15
+
+def test_gives_up_after_max_wait():
+    scheduler = GeminiScheduler(rpm=1, tpm=0, window_seconds=10, max_wait={0: 0.1, 1: 0.1, 2: 0.1})
+    scheduler.run('chat', lambda: None)
+
+    with pytest.raises(GeminiQuotaExceeded):
+        scheduler.run('chat', lambda: None)
+    assert scheduler.stats()['classes']['interactive']['rejected'] == 1
+
+def test_rate_limit_error_is_raised_after_retries():
+    scheduler = GeminiScheduler(rpm=0, tpm=0, max_retries=1)
+
+    def call():
+        raise api_exceptions.ResourceExhausted("retry in 0.01s")
+
+    with pytest.raises(api_exceptions.ResourceExhausted):
+        scheduler.run('chat', call)
+
+def test_retry_after_from_retry_info_details():
+    error = SimpleNamespace(details=[SimpleNamespace(retry_delay=SimpleNamespace(seconds=17, nanos=500000000))])
+
+    assert retry_after_seconds(error) == 17.5
+    assert retry_after_seconds(Exception("retry_delay { seconds: 42 }")) == 42
+    assert retry_after_seconds(Exception("otro error")) is None
+
+def test_summary_lists_each_class():
+    scheduler = GeminiScheduler(rpm=60, tpm=0)
+    scheduler.run('chat', lambda: None)
+
+    summary = scheduler.summary()
+
+    assert "60 RPM" in summary
+    assert "`interactive`: 1 llamadas" in summary
+    assert "`background`: 0 llamadas" in summary
+
+def test_each_class_reads_its_own_max_wait(monkeypatch):
+    monkeypatch.setenv('GEMINI_INTERACTIVE_MAX_WAIT', '5')
+    monkeypatch.setenv('GEMINI_INTENT_MAX_WAIT', '12')
+    monkeypatch.setenv('GEMINI_BACKGROUND_MAX_WAIT', '90')
+
+    assert GeminiScheduler(rpm=0, tpm=0).max_wait == {0: 5.0, 1: 12.0, 2: 90.0}
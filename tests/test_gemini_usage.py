@@ -0,0 +1,122 @@
+import pytest
+from unittest.mock import MagicMock
+from gemini_usage import GeminiUsageTracker
+from message_coalescer import MessageCoalescer
+
+def fake_response(text="respuesta", prompt_tokens=12, response_tokens=3):
+    return MagicMock(
+        parts=[MagicMock(text=text)],
+        usage_metadata=MagicMock(prompt_token_count=prompt_tokens, candidates_token_count=response_tokens)
+    )
+
+def test_aggregates_by_user_channel_and_route():
+    tracker = GeminiUsageTracker(capacity=3)
+    tracker.record('intent', 10, 5, 100.0, user_id='U1', channel_id='C1')
+    tracker.record('chat', 20, 40, 300.0, user_id='U1', channel_id='C2')
+    tracker.record('reminder_format', 8, 8, 50.0, user_id='U2', channel_id='C1')
+    tracker.record('chat', 1, 1, 10.0, user_id='U2', channel_id='C1')
+    
+    assert len(tracker.recent()) == 3
+    assert tracker.aggregates('user')['U1'] == {
+        'calls': 2, 'prompt_tokens': 30, 'response_tokens': 45, 'avg_latency_ms': 200.0
+    }
+    assert tracker.aggregates('channel')['C1']['calls'] == 3
+    assert tracker.aggregates('route')['chat']['prompt_tokens'] == 21
+
+def test_batch_call_is_split_across_owners():
+    tracker = GeminiUsageTracker()
+    tracker.record_split('reminder_format_batch', 100, 31, 200.0, [('U1', 'D1'), ('U2', 'C1'), ('U1', 'D1')])
+    
+    assert tracker.aggregates('user')['U1'] == {'calls': 1, 'prompt_tokens': 66, 'response_tokens': 20, 'avg_latency_ms': 200.0}
+    assert tracker.aggregates('user')['U2']['prompt_tokens'] == 34
+    assert tracker.aggregates('route')['reminder_format_batch'] == {
+        'calls': 1, 'prompt_tokens': 100, 'response_tokens': 31, 'avg_latency_ms': 200.0
+    }
+    assert sum(record[5] for record in tracker.recent()) == 31
+
+def test_flush_inserts_one_batch():
+    client = MagicMock()
+    client.insert_rows_json.return_value = []
+    tracker = GeminiUsageTracker(client=client, table_ref='p.d.gemini_usage')
+    tracker.record('intent', 10, 5, 100.0, user_id='U1', channel_id='C1')
+    tracker.record('chat', 20, 40, 300.0, user_id='U1', channel_id='C1')
+    
+    assert tracker.flush() == 2
+    assert tracker.flush() == 0
+    
+    client.insert_rows_json.assert_called_once()
+    table, rows = client.insert_rows_json.call_args[0]
+    assert table == 'p.d.gemini_usage'
+    assert [row['route'] for row in rows] == ['intent', 'chat']
+
+def test_failed_flush_is_retried():
+    client = MagicMock()
+    client.insert_rows_json.side_effect = [Exception("timeout"), []]
+    tracker = GeminiUsageTracker(client=client, table_ref='p.d.gemini_usage')
+    tracker.record('intent', 10, 5, 100.0)
+    
+    assert tracker.flush() == 0
+    assert tracker.flush() == 1
+
+def test_requeue_on_full_buffer_drops_oldest_and_logs(caplog):
+    client = MagicMock()
+    tracker = GeminiUsageTracker(client=client, table_ref='p.d.gemini_usage', capacity=3)
+    for route in ('a', 'b', 'c'):
+        tracker.record(route, 1, 1, 1.0)
+    
+    def failing_insert(table, rows):
+        # Llegan dos registros nuevos mientras el envío falla
+        tracker.record('d', 1, 1, 1.0)
+        tracker.record('e', 1, 1, 1.0)
+        raise Exception("timeout")
+    client.insert_rows_json.side_effect = failing_insert
+    
+    assert tracker.flush() == 0
+    assert "se descartaron 2 registros" in caplog.text
+    
+    client.insert_rows_json.side_effect = None
+    client.insert_rows_json.return_value = []
+    assert tracker.flush() == 3
+    assert [row['route'] for row in client.insert_rows_json.call_args[0][1]] == ['c', 'd', 'e']
+
+@pytest.fixture
+def agent(monkeypatch, make_agent):
+    monkeypatch.setenv('REBECA_ADMIN_USERS', 'UADMIN')
+    agent = make_agent()
+    agent.usage_tracker = GeminiUsageTracker()
+    agent.model.generate_content.return_value = fake_response()
+    return agent
+
+def test_model_calls_are_recorded_per_route(agent):
+    agent.process_with_gemini("hola", user_id="U1", channel_id="C1")
+    
+    assert agent.usage_tracker.aggregates('route')['chat']['prompt_tokens'] == 12
+    assert agent.usage_tracker.aggregates('user')['U1']['response_tokens'] == 3
+
+def test_admin_usage_command(agent):
+    agent.process_with_gemini("hola", user_id="U1", channel_id="C1")
+    
+    response = agent.process_message("admin uso", "D1", "UADMIN")
+    
+    assert "Uso de Gemini" in response
+    assert "`chat`" in response
+    assert agent.model.generate_content.call_count == 1
+
+def test_admin_usage_includes_coalescing_savings(agent):
+    agent.message_coalescer = MessageCoalescer(lambda events, say: None, window_ms=0)
+    agent.message_coalescer.submit(('D1', 'U1', None), {'text': 'hola'}, None)
+    
+    response = agent.process_message("admin uso", "D1", "UADMIN")
+    
+    assert "Agrupación de mensajes: 1 recibidos en 1 solicitudes" in response
+
+def test_admin_cache_includes_timezone_hit_rate(agent):
+    response = agent.process_message("admin cache", "D1", "UADMIN")
+    
+    assert "Caché semántica" in response
+    assert "Zonas horarias:" in response
+
+def test_admin_command_ignored_for_regular_users(agent):
+    agent.process_message("admin uso", "D1", "U1")
+    
+    assert agent.usage_tracker.aggregates('route').keys() == {'intent', 'chat'}
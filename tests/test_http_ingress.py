@@ -0,0 +1,109 @@
+import json
+import urllib.error
+import urllib.request
+import pytest
+from slack_bolt.response import BoltResponse
+from http_ingress import SlackIngressServer, sign_request, EVENTS_PATH, HEALTH_PATH
+
+SECRET = 'test-signing-secret'
+
+
+class FakeApp:
+    def __init__(self):
+        self.requests = []
+
+    def dispatch(self, request):
+        self.requests.append(request)
+        if request.body.get('type') == 'url_verification':
+            return BoltResponse(status=200, body=request.body['challenge'])
+        return BoltResponse(status=200, body='')
+
+
+@pytest.fixture
+def server():
+    app = FakeApp()
+    server = SlackIngressServer(app=app, port=0, signing_secret=SECRET, host='127.0.0.1')
+    server.serve_in_background()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, payload, headers=None, secret=SECRET):
+    body = json.dumps(payload)
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{server.port}{EVENTS_PATH}",
+        data=body.encode('utf-8'),
+        headers={'Content-Type': 'application/json', **sign_request(body, secret), **(headers or {})},
+        method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, response.read().decode('utf-8'), response.headers
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode('utf-8'), e.headers
+
+
+def test_signed_event_is_dispatched(server):
+    status, _, _ = post(server, {'type': 'event_callback', 'team_id': 'T1', 'event': {'type': 'message'}})
+
+    assert status == 200
+    assert len(server.app.requests) == 1
+    assert server.app.requests[0].body['team_id'] == 'T1'
+    assert server.health()['dispatched'] == 1
+
+
+def test_url_verification_returns_challenge(server):
+    status, body, _ = post(server, {'type': 'url_verification', 'challenge': 'abc123'})
+
+    assert status == 200
+    assert body == 'abc123'
+
+
+def test_invalid_signature_is_rejected(server):
+    status, body, _ = post(server, {'type': 'event_callback'}, secret='otro-secreto')
+
+    assert status == 401
+    assert json.loads(body)['error'] == 'invalid_signature'
+    assert server.app.requests == []
+    assert server.health()['rejected'] == 1
+
+
+def test_timeout_retry_is_acknowledged_without_dispatch(server):
+    status, _, headers = post(
+        server,
+        {'type': 'event_callback', 'event': {'type': 'message'}},
+        headers={'X-Slack-Retry-Num': '1', 'X-Slack-Retry-Reason': 'http_timeout'}
+    )
+
+    assert status == 200
+    assert headers['X-Slack-No-Retry'] == '1'
+    assert server.app.requests == []
+    assert server.health()['retries_skipped'] == 1
+
+
+def test_health_endpoint(server):
+    with urllib.request.urlopen(f"http://127.0.0.1:{server.port}{HEALTH_PATH}", timeout=5) as response:
+        payload = json.loads(response.read())
+
+    assert response.status == 200
+    assert payload['ok'] is True
+    assert payload['mode'] == 'http'
+
+
+def test_health_only_server_does_not_accept_events():
+    server = SlackIngressServer(port=0, host='127.0.0.1')
+    server.serve_in_background()
+    try:
+        status, _, _ = post(server, {'type': 'event_callback'})
+        assert status == 404
+        assert server.health()['mode'] == 'socket'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_app_requires_signing_secret(monkeypatch):
+    monkeypatch.delenv('SLACK_SIGNING_SECRET', raising=False)
+    with pytest.raises(ValueError):
+        SlackIngressServer(app=FakeApp(), port=0, host='127.0.0.1')
@@ -0,0 +1,137 @@
+import uuid
+import pytest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+import pytz
+from reminder_handler import ReminderHandler
+from reminder_index import ExecutedIdSet
+
+def reminder_row(reminder_id, when, kind='reminder'):
+    # Columnas de trigger_params ya extraídas por la consulta
+    return SimpleNamespace(
+        kind=kind,
+        reminder_id=reminder_id,
+        slack_user_id="U1",
+        title=f"recordatorio {reminder_id}",
+        trigger_type="once",
+        channel_id="C1",
+        reminder_datetime=when.strftime("%Y-%m-%dT%H:%M:%S"),
+        timezone="America/Mexico_City",
+        team_id=None,
+        scheduled_message_id=None,
+        scheduled_channel=None,
+        status="pending",
+        created_at=datetime.now(pytz.utc)
+    )
+
+def closed_row(reminder_id):
+    return SimpleNamespace(kind='closed', reminder_id=reminder_id, status='executed')
+
+def local_now():
+    return datetime.now(pytz.timezone('America/Mexico_City')).replace(tzinfo=None)
+
+@pytest.fixture
+def reminder_handler():
+    with patch('reminder_handler.bigquery.Client') as mock:
+        client = mock.return_value
+        client.insert_rows_json.return_value = []
+        client.query.return_value.result.return_value = []
+        yield ReminderHandler('test-project', 'test-dataset')
+
+def set_rows(handler, rows):
+    handler.client.query.return_value.result.return_value = rows
+
+def test_executed_id_set_merges_compactly():
+    executed = ExecutedIdSet(merge_threshold=4)
+    ids = [str(uuid.uuid4()) for _ in range(10)]
+    for reminder_id in ids:
+        executed.add(reminder_id)
+    executed.add(ids[0])
+    executed.add("no-es-uuid")
+    
+    assert len(executed) == 11
+    assert all(reminder_id in executed for reminder_id in ids)
+    assert "no-es-uuid" in executed
+    assert str(uuid.uuid4()) not in executed
+    assert "otro" not in executed
+
+def test_first_poll_loads_index_then_polls_incrementally(reminder_handler):
+    now = local_now()
+    set_rows(reminder_handler, [reminder_row("due", now), reminder_row("later", now + timedelta(hours=2))])
+    
+    due = reminder_handler.get_pending_reminders()
+    
+    assert [r.reminder_id for r in due] == ["due"]
+    assert len(reminder_handler.pending_index) == 2
+    
+    # Segunda consulta: solo filas nuevas desde la marca de agua
+    set_rows(reminder_handler, [reminder_row("nuevo", now), closed_row("due")])
+    due = reminder_handler.get_pending_reminders()
+    
+    assert [r.reminder_id for r in due] == ["nuevo"]
+    assert "due" not in reminder_handler.pending_index
+    assert reminder_handler.is_closed("due")
+    
+    sql = reminder_handler.client.query.call_args[0][0]
+    assert "@watermark" in sql
+    assert "SELECT DISTINCT" not in sql
+    parameters = {p.name: p.value for p in reminder_handler.client.query.call_args[1]['job_config'].query_parameters}
+    assert parameters['watermark'] is not None
+
+def test_closed_rows_win_over_reminder_rows_in_same_batch(reminder_handler):
+    set_rows(reminder_handler, [])
+    reminder_handler.get_pending_reminders()
+    
+    set_rows(reminder_handler, [reminder_row("x", local_now()), closed_row("x")])
+    
+    assert reminder_handler.get_pending_reminders() == []
+    assert "x" not in reminder_handler.pending_index
+
+def test_lookahead_window(reminder_handler):
+    now = local_now()
+    set_rows(reminder_handler, [
+        reminder_row("pronto", now + timedelta(seconds=20)),
+        reminder_row("despues", now + timedelta(minutes=5)),
+        reminder_row("vencido", now - timedelta(minutes=10))
+    ])
+    
+    due = reminder_handler.get_pending_reminders()
+    
+    assert [r.reminder_id for r in due] == ["vencido", "pronto"]
+
+def test_pending_rows_are_read_page_by_page(reminder_handler):
+    reminder_handler.page_size = 500
+    set_rows(reminder_handler, [reminder_row("a", local_now() + timedelta(hours=1))])
+    
+    reminder_handler.get_pending_reminders()
+    
+    reminder_handler.client.query.return_value.result.assert_called_with(page_size=500)
+    query = reminder_handler.client.query.call_args[0][0]
+    assert "JSON_EXTRACT_SCALAR(r.trigger_params, '$.channel_id') AS channel_id" in query
+    assert reminder_handler.pending_index.get("a").channel_id == "C1"
+
+def test_unscheduled_row_returns_reminder_to_polling(reminder_handler):
+    now = local_now()
+    offloaded = reminder_row("slack", now)
+    offloaded.scheduled_message_id, offloaded.scheduled_channel = "Q1", "C1"
+    set_rows(reminder_handler, [offloaded])
+    
+    assert reminder_handler.get_pending_reminders() == []
+    
+    # Otra réplica registró que Slack descartó el mensaje programado; la fila original puede llegar después
+    set_rows(reminder_handler, [SimpleNamespace(kind='unscheduled', reminder_id="slack", status='unscheduled'), offloaded])
+    due = reminder_handler.get_pending_reminders()
+    
+    assert [r.reminder_id for r in due] == ["slack"]
+    assert due[0].scheduled_message_id is None
+
+def test_failed_reminders_leave_user_list(reminder_handler):
+    reminder = reminder_handler.create_reminder("U1", "pagar", "C1", local_now() + timedelta(hours=1))
+    
+    reminder_handler.mark_reminders_as_failed([reminder.reminder_id])
+    
+    history = reminder_handler.client.insert_rows_json.call_args[0][1]
+    assert [row['status'] for row in history] == ['failed']
+    assert reminder_handler.list_user_reminders("U1") == []
+    assert reminder_handler.is_closed(reminder.reminder_id)
@@ -0,0 +1,33 @@
+from unittest.mock import MagicMock
+from main import run_reminder_cycle
+
+def test_delivering_replica_checks_and_saves_snapshot():
+    agent = MagicMock()
+    
+    run_reminder_cycle(agent, deliver=True)
+    
+    agent.check_reminders.assert_called_once()
+    agent.reconcile_scheduled_reminders.assert_called_once()
+    agent.reminder_handler.save_snapshot.assert_called_once()
+    agent.semantic_cache.save.assert_called_once()
+    agent.usage_tracker.maybe_flush.assert_called_once()
+    agent.log_ingress_stats.assert_called_once()
+
+def test_other_replicas_sync_index_without_delivering():
+    agent = MagicMock()
+    
+    run_reminder_cycle(agent, deliver=False)
+    
+    agent.reminder_handler.sync_pending_index.assert_called_once()
+    agent.check_reminders.assert_not_called()
+    agent.reconcile_scheduled_reminders.assert_not_called()
+    agent.semantic_cache.save.assert_called_once()
+    agent.usage_tracker.maybe_flush.assert_called_once()
+
+def test_housekeeping_runs_when_sync_fails():
+    agent = MagicMock()
+    agent.reminder_handler.sync_pending_index.side_effect = Exception("BigQuery caído")
+    
+    run_reminder_cycle(agent, deliver=False)
+    
+    agent.usage_tracker.maybe_flush.assert_called_once()
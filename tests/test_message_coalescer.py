@@ -0,0 +1,62 @@
+import time
+import threading
+from message_coalescer import MessageCoalescer
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+        self.done = threading.Event()
+    
+    def __call__(self, events, say):
+        self.calls.append(([e['text'] for e in events], say))
+        self.done.set()
+
+def event(text):
+    return {'channel': 'D1', 'user': 'U1', 'text': text, 'ts': '1.0'}
+
+def test_disabled_dispatches_each_message():
+    recorder = Recorder()
+    coalescer = MessageCoalescer(recorder, window_ms=0)
+    
+    coalescer.submit(('D1', 'U1', None), event("hola"), "say")
+    coalescer.submit(('D1', 'U1', None), event("otra"), "say")
+    
+    assert [texts for texts, _ in recorder.calls] == [["hola"], ["otra"]]
+    assert coalescer.stats()['calls_saved'] == 0
+
+def test_messages_within_window_are_grouped():
+    recorder = Recorder()
+    coalescer = MessageCoalescer(recorder, window_ms=100, max_wait_ms=1000)
+    
+    for text in ["necesito", "el reporte", "de ventas"]:
+        coalescer.submit(('D1', 'U1', None), event(text), "say")
+    
+    assert recorder.done.wait(2)
+    assert recorder.calls == [(["necesito", "el reporte", "de ventas"], "say")]
+    stats = coalescer.stats()
+    assert stats['batches_dispatched'] == 1
+    assert stats['calls_saved'] == 2
+    assert "2 llamadas al modelo ahorradas" in coalescer.summary()
+
+def test_max_wait_caps_the_window():
+    recorder = Recorder()
+    coalescer = MessageCoalescer(recorder, window_ms=200, max_wait_ms=250)
+    
+    start = time.monotonic()
+    for _ in range(6):
+        coalescer.submit(('D1', 'U1', None), event("x"), "say")
+        time.sleep(0.08)
+    
+    assert recorder.done.wait(2)
+    assert time.monotonic() - start < 0.6
+    assert len(recorder.calls[0][0]) >= 3
+
+def test_different_users_are_not_grouped():
+    recorder = Recorder()
+    coalescer = MessageCoalescer(recorder, window_ms=50)
+    
+    coalescer.submit(('D1', 'U1', None), event("a"), "say")
+    coalescer.submit(('D2', 'U2', None), event("b"), "say")
+    time.sleep(0.3)
+    
+    assert sorted(texts for texts, _ in recorder.calls) == [["a"], ["b"]]
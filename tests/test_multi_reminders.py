@@ -0,0 +1,78 @@
+import json
+import pytest
+from unittest.mock import MagicMock
+
+def model_text(text):
+    return MagicMock(parts=[MagicMock(text=text)])
+
+def intent(*reminders):
+    return model_text(json.dumps({
+        'is_reminder': True,
+        'reminders': [{'datetime': when, 'description': what} for when, what in reminders]
+    }))
+
+@pytest.fixture
+def agent(make_agent, reminder_handler):
+    agent = make_agent(reminder_handler=reminder_handler)
+    agent.timezone_resolver.get_timezone = MagicMock(return_value='America/Mexico_City')
+    return agent
+
+def test_several_reminders_are_created_in_one_insert(agent):
+    agent.model.generate_content.side_effect = [
+        intent(("2030-01-01 10:00", "el pago"), ("2030-01-01 12:00", "la junta"), ("2030-01-01 17:00", "llamar a Juan")),
+        model_text("Listo, 3 recordatorios")
+    ]
+
+    response = agent.process_message(
+        "Recuérdame el pago a las 10, la junta a las 12 y llamar a Juan a las 5", "D1", "U1"
+    )
+
+    assert response == "Listo, 3 recordatorios"
+    client = agent.reminder_handler.client
+    client.insert_rows_json.assert_called_once()
+    rows = client.insert_rows_json.call_args[0][1]
+    assert [row['title'] for row in rows] == ["el pago", "la junta", "llamar a Juan"]
+    assert [r.message for r in agent.reminder_handler.list_user_reminders("U1")] == [
+        "el pago", "la junta", "llamar a Juan"
+    ]
+    # Una llamada para el intent y otra para la confirmación
+    assert agent.model.generate_content.call_count == 2
+
+def test_confirmation_falls_back_to_list(agent):
+    agent.model.generate_content.side_effect = [
+        intent(("2030-01-01 10:00", "el pago"), ("2030-01-01 12:00", "la junta")),
+        Exception("cuota agotada")
+    ]
+
+    response = agent.process_message("el pago a las 10 y la junta a las 12", "D1", "U1")
+
+    assert response == (
+        ":calendar: He programado 2 recordatorios:\n"
+        "• 2030-01-01 10:00: el pago\n"
+        "• 2030-01-01 12:00: la junta"
+    )
+
+def test_invalid_items_are_skipped(agent):
+    agent.model.generate_content.side_effect = [
+        intent(("2030-01-01 10:00", "el pago"), ("2000-01-01 12:00", "en el pasado"), ("mañana", "sin fecha")),
+        model_text("ok")
+    ]
+
+    agent.process_message("varios", "D1", "U1")
+
+    rows = agent.reminder_handler.client.insert_rows_json.call_args[0][1]
+    assert [row['title'] for row in rows] == ["el pago"]
+
+def test_single_reminder_response_is_still_accepted(agent):
+    agent.model.generate_content.side_effect = [
+        model_text('{"is_reminder": true, "datetime": "2030-01-01 10:00", "description": "pagar"}'),
+        model_text("ok")
+    ]
+
+    agent.process_message("recuérdame pagar", "D1", "U1")
+
+    rows = agent.reminder_handler.client.insert_rows_json.call_args[0][1]
+    assert [row['title'] for row in rows] == ["pagar"]
+
+def test_all_items_invalid_is_not_a_reminder(agent):
+    assert agent._valid_reminders({'is_reminder': True, 'reminders': [{'datetime': 'x'}]}, 'America/Mexico_City') == []
@@ -0,0 +1,72 @@
+import os
+import threading
+import pytest
+from profiling import Profiler, dump_thread_stacks
+
+def busy_worker(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+def test_dump_thread_stacks_includes_named_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=stop.wait, name="check_reminders_loop", daemon=True)
+    worker.start()
+    try:
+        stacks = dump_thread_stacks()
+    finally:
+        stop.set()
+    
+    assert "check_reminders_loop" in stacks
+    assert "MainThread" in stacks
+
+def test_profile_samples_other_threads_and_writes_dumps(tmp_path):
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_worker, args=(stop,), name="worker", daemon=True)
+    worker.start()
+    summaries = []
+    profiler = Profiler(output_dir=str(tmp_path), interval_ms=1)
+    
+    try:
+        assert profiler.start(1, on_done=summaries.append)
+        assert not profiler.start(1)
+        profiler.wait(5)
+    finally:
+        stop.set()
+    
+    assert "busy_worker" in summaries[0] or "<genexpr>" in summaries[0]
+    assert "memoria asignada" in summaries[0]
+    extensions = sorted(name.rsplit('.', 1)[1] for name in os.listdir(tmp_path))
+    assert extensions == ['collapsed', 'tracemalloc', 'txt']
+    with open(next(tmp_path.glob('cpu-*.collapsed')), encoding='utf-8') as f:
+        assert any(line.startswith("worker;") for line in f)
+
+def test_profile_can_be_stopped_early(tmp_path):
+    profiler = Profiler(output_dir=str(tmp_path), interval_ms=5)
+    
+    assert profiler.start(60)
+    assert profiler.stop()
+    profiler.wait(5)
+    
+    assert not profiler.running
+    assert not profiler.stop()
+
+@pytest.fixture
+def agent(monkeypatch, tmp_path, make_agent):
+    monkeypatch.setenv('REBECA_ADMIN_USERS', 'UADMIN')
+    monkeypatch.setenv('PROFILE_OUTPUT_DIR', str(tmp_path))
+    return make_agent()
+
+def test_admin_profile_command_posts_summary(agent):
+    response = agent.process_message("admin perfil 1", "D1", "UADMIN")
+    agent.profiler.wait(5)
+    
+    assert "1 s" in response
+    kwargs = agent.slack_handler.send_message.call_args[1]
+    assert kwargs['channel_id'] == "D1"
+    assert "Perfil de" in kwargs['message']
+    agent.model.generate_content.assert_not_called()
+
+def test_admin_threads_command(agent):
+    assert "MainThread" in agent.process_message("admin hilos", "D1", "UADMIN")
+    agent.process_message("admin hilos", "D1", "U1")
+    agent.model.generate_content.assert_called()
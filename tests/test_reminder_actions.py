@@ -0,0 +1,120 @@
+import pytest
+from functools import partial
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+import pytz
+from reminder_actions import (
+    ACTION_DONE, ACTION_SNOOZE_10M, ACTION_SNOOZE_1H, REMINDER_ACTION_PATTERN,
+    build_reminder_blocks, build_digest_blocks, register_reminder_actions
+)
+
+@pytest.fixture
+def make_reminder(make_reminder):
+    return partial(make_reminder, message="Revisar inventario", channel_id="C1")
+
+class FakeApp:
+    def __init__(self):
+        self.listeners = {}
+    
+    def action(self, constraint):
+        def decorator(fn):
+            self.listeners[constraint] = fn
+            return fn
+        return decorator
+
+def click(listener, action_id, user_id="U1", calls=None):
+    calls = calls if calls is not None else []
+    ack = MagicMock(side_effect=lambda: calls.append('ack'))
+    respond = MagicMock()
+    body = {
+        'user': {'id': user_id},
+        'team': {'id': 'T1'},
+        'message': {'blocks': build_reminder_blocks(":bell: Revisar inventario", "r1")}
+    }
+    listener(ack=ack, body=body, action={'action_id': action_id, 'value': 'r1'}, respond=respond)
+    return ack, respond
+
+@pytest.fixture
+def agent(make_agent, reminder_handler, make_reminder):
+    agent = make_agent(reminder_handler=reminder_handler)
+    reminder_handler._remember_fired(make_reminder())
+    return agent
+
+@pytest.fixture
+def listener(agent):
+    app = FakeApp()
+    register_reminder_actions(app, agent)
+    return app.listeners[REMINDER_ACTION_PATTERN]
+
+def test_reminder_blocks_have_snooze_and_done_buttons():
+    blocks = build_reminder_blocks("texto", "r1")
+    
+    assert blocks[0]['text']['text'] == "texto"
+    assert [e['action_id'] for e in blocks[1]['elements']] == [ACTION_SNOOZE_10M, ACTION_SNOOZE_1H, ACTION_DONE]
+    assert all(e['value'] == "r1" for e in blocks[1]['elements'])
+
+def test_snooze_acks_first_and_schedules_without_model(agent, listener, make_reminder):
+    calls = []
+    agent.reminder_handler.create_reminder = MagicMock(
+        side_effect=lambda **kwargs: calls.append('create') or make_reminder("r2")
+    )
+    
+    ack, respond = click(listener, ACTION_SNOOZE_1H, calls=calls)
+    
+    assert calls == ['ack', 'create']
+    kwargs = agent.reminder_handler.create_reminder.call_args[1]
+    expected = datetime.now(pytz.timezone("America/Mexico_City")) + timedelta(hours=1)
+    assert abs((kwargs['reminder_datetime'] - expected).total_seconds()) < 5
+    assert kwargs['message'] == "Revisar inventario"
+    assert respond.call_args[1]['replace_original'] is True
+    assert "Pospuesto" in respond.call_args[1]['blocks'][1]['elements'][0]['text']
+    agent.model.generate_content.assert_not_called()
+
+def test_snoozed_reminder_enters_index(agent, listener):
+    click(listener, ACTION_SNOOZE_10M)
+    
+    assert len(agent.reminder_handler.pending_index) == 1
+    agent.reminder_handler.client.insert_rows_json.assert_called_once()
+
+def test_done_removes_buttons(agent, listener):
+    ack, respond = click(listener, ACTION_DONE)
+    
+    ack.assert_called_once()
+    blocks = respond.call_args[1]['blocks']
+    assert [b['type'] for b in blocks] == ['section', 'context']
+    agent.reminder_handler.client.insert_rows_json.assert_not_called()
+
+def test_only_owner_can_use_buttons(agent, listener):
+    ack, respond = click(listener, ACTION_SNOOZE_10M, user_id="U2")
+    
+    assert respond.call_args[1]['response_type'] == 'ephemeral'
+    assert respond.call_args[1]['replace_original'] is False
+    assert len(agent.reminder_handler.pending_index) == 0
+
+def test_executed_reminders_are_remembered_for_snooze(agent, make_reminder):
+    handler = agent.reminder_handler
+    reminder = make_reminder("r3")
+    handler.pending_index.add(reminder)
+    handler.client.query.return_value.result.return_value = [MagicMock(
+        reminder_id="r3", slack_user_id="U1", title="Revisar inventario", trigger_type="once",
+        trigger_params='{"channel_id": "C1", "datetime": "2024-01-01T10:00:00"}'
+    )]
+    
+    handler.mark_reminder_as_executed("r3")
+    handler.client.query.reset_mock()
+    
+    assert handler.find_reminder("r3") is reminder
+    handler.client.query.assert_not_called()
+
+def test_digest_click_resolves_only_that_item(agent, listener):
+    blocks = build_digest_blocks(":bell: *Tienes 2 recordatorios*", [("• Revisar inventario", "r1"), ("• otro", "r2")])
+    body = {'user': {'id': "U1"}, 'team': {'id': 'T1'}, 'message': {'text': "resumen", 'blocks': blocks}}
+    respond = MagicMock()
+    
+    listener(ack=MagicMock(), body=body, action={'action_id': ACTION_DONE, 'value': 'r1', 'block_id': 'reminder_actions_r1'},
+             respond=respond)
+    
+    resolved = respond.call_args[1]['blocks']
+    assert [b['type'] for b in resolved] == ['section', 'section', 'context', 'section', 'actions']
+    assert resolved[4]['block_id'] == 'reminder_actions_r2'
+    assert respond.call_args[1]['text'] == "resumen"
@@ -0,0 +1,82 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from reminder_handler import ReminderHandler
+
+@pytest.fixture
+def agent(monkeypatch, make_agent):
+    monkeypatch.setenv('REMINDER_DIGEST_OPT_OUT_CHANNELS', 'CINDIVIDUAL')
+    agent = make_agent()
+    agent.reminder_handler.is_closed.return_value = False
+    agent.model.generate_content.return_value = MagicMock(parts=[MagicMock(text="formateado")])
+    return agent
+
+def test_reminders_due_together_are_sent_as_one_digest(agent, make_reminder):
+    agent._deliver_reminders([
+        make_reminder("a"),
+        make_reminder("b", when="2024-01-01T10:00:30"),
+        make_reminder("c", when="2024-01-01T10:05:00")
+    ])
+    
+    messages = [c[1]['message'] for c in agent.slack_handler.send_message.call_args_list]
+    assert len(messages) == 2
+    assert "2 recordatorios" in messages[0]
+    assert "tarea a" in messages[0] and "tarea b" in messages[0]
+    agent.reminder_handler.mark_reminders_as_executed.assert_called_once_with(["a", "b"])
+    agent.reminder_handler.mark_reminder_as_executed.assert_called_once_with("c")
+    assert agent.model.generate_content.call_count == 1
+
+def test_digest_items_have_their_own_buttons(agent, make_reminder):
+    agent._deliver_reminders([make_reminder("a"), make_reminder("b")])
+    
+    blocks = agent.slack_handler.send_message.call_args[1]['blocks']
+    actions = [b for b in blocks if b['type'] == 'actions']
+    assert [b['block_id'] for b in actions] == ["reminder_actions_a", "reminder_actions_b"]
+    assert [{e['value'] for e in b['elements']} for b in actions] == [{"a"}, {"b"}]
+
+def test_large_digest_is_split_to_fit_slack_block_limit(agent, make_reminder):
+    agent._deliver_reminders([make_reminder(f"r{i}") for i in range(30)])
+    
+    calls = agent.slack_handler.send_message.call_args_list
+    assert [len(c[1]['blocks']) for c in calls] == [49, 13]
+    assert "24 recordatorios" in calls[0][1]['message']
+    assert "6 recordatorios" in calls[1][1]['message']
+
+def test_channel_digest_mentions_each_owner(agent, make_reminder):
+    agent._deliver_reminders([
+        make_reminder("a", channel_id="C1", user_id="U1"),
+        make_reminder("b", channel_id="C1", user_id="U2")
+    ])
+    
+    message = agent.slack_handler.send_message.call_args[1]['message']
+    assert "<@U1> tarea a" in message
+    assert "<@U2> tarea b" in message
+
+def test_opted_out_channels_keep_individual_messages(agent, make_reminder):
+    agent._deliver_reminders([
+        make_reminder("a", channel_id="CINDIVIDUAL"),
+        make_reminder("b", channel_id="CINDIVIDUAL")
+    ])
+    
+    assert agent.slack_handler.send_message.call_count == 2
+    agent.reminder_handler.mark_reminders_as_executed.assert_not_called()
+
+def test_batch_mark_executed_uses_one_insert(make_reminder):
+    with patch('reminder_handler.bigquery.Client') as mock:
+        client = mock.return_value
+        client.insert_rows_json.return_value = []
+        handler = ReminderHandler('test-project', 'test-dataset')
+    for reminder_id in ("a", "b"):
+        handler.pending_index.add(make_reminder(reminder_id))
+    client.query.return_value.result.return_value = [
+        MagicMock(reminder_id=reminder_id, slack_user_id="U1", title="t", trigger_type="once", trigger_params="{}")
+        for reminder_id in ("a", "b")
+    ]
+    
+    handler.mark_reminders_as_executed(["a", "b"])
+    
+    # Los recordatorios están en el índice: no se vuelven a consultar
+    client.query.assert_not_called()
+    client.insert_rows_json.assert_called_once()
+    assert [row['status'] for row in client.insert_rows_json.call_args[0][1]] == ['executed', 'executed']
+    assert handler.is_closed("a") and handler.is_closed("b")
+    assert len(handler.pending_index) == 0
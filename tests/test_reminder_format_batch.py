@@ -0,0 +1,76 @@
+import json
+import pytest
+from unittest.mock import MagicMock
+
+@pytest.fixture
+def make_reminder(make_reminder):
+    # Cada recordatorio vence en un minuto distinto para que no se agrupen en un resumen
+    return lambda reminder_id, minute: make_reminder(reminder_id, when=f"2024-01-01T10:{minute:02d}:00")
+
+def model_text(text):
+    return MagicMock(parts=[MagicMock(text=text)])
+
+@pytest.fixture
+def agent(monkeypatch, make_agent):
+    monkeypatch.setenv('REMINDER_FORMAT_BATCH_SIZE', '3')
+    agent = make_agent()
+    agent.reminder_handler.is_closed.return_value = False
+    return agent
+
+def sent_messages(agent):
+    return [c[1]['message'] for c in agent.slack_handler.send_message.call_args_list]
+
+def test_reminders_are_formatted_in_batches(agent, make_reminder):
+    agent.model.generate_content.side_effect = lambda prompt, **kwargs: model_text(
+        json.dumps([f"formateado {i}" for i in range(prompt.count('tarea'))])
+    )
+    
+    agent._deliver_reminders([make_reminder(str(i), i) for i in range(5)])
+    
+    assert agent.model.generate_content.call_count == 2
+    assert sent_messages(agent) == ["formateado 0", "formateado 1", "formateado 2", "formateado 0", "formateado 1"]
+    assert agent.reminder_handler.mark_reminder_as_executed.call_count == 5
+
+def test_wrong_count_falls_back_to_template(agent, make_reminder):
+    agent.model.generate_content.return_value = model_text('["solo uno"]')
+    
+    agent._deliver_reminders([make_reminder("a", 0), make_reminder("b", 1)])
+    
+    assert sent_messages(agent) == [":bell: Recordatorio: tarea a", ":bell: Recordatorio: tarea b"]
+
+def test_invalid_items_fall_back_individually(agent, make_reminder):
+    agent.model.generate_content.return_value = model_text('```json\n["bonito", null]\n```')
+    
+    agent._deliver_reminders([make_reminder("a", 0), make_reminder("b", 1)])
+    
+    assert sent_messages(agent) == ["bonito", ":bell: Recordatorio: tarea b"]
+
+def test_malformed_output_falls_back(agent, make_reminder):
+    agent.model.generate_content.return_value = model_text("no es json")
+    
+    agent._deliver_reminders([make_reminder("a", 0), make_reminder("b", 1)])
+    
+    assert sent_messages(agent) == [":bell: Recordatorio: tarea a", ":bell: Recordatorio: tarea b"]
+    assert agent.model.generate_content.call_count == 1
+
+def test_single_reminder_keeps_individual_prompt(agent, make_reminder):
+    agent.model.generate_content.return_value = model_text("formateado")
+    
+    agent._deliver_reminders([make_reminder("a", 0)])
+    
+    assert sent_messages(agent) == ["formateado"]
+    assert "arreglo JSON" not in agent.model.generate_content.call_args[0][0]
+
+def test_batch_usage_is_attributed_to_each_owner(agent, make_reminder):
+    agent.model.generate_content.return_value = MagicMock(
+        parts=[MagicMock(text='["uno", "dos"]')],
+        usage_metadata=MagicMock(prompt_token_count=40, candidates_token_count=10)
+    )
+    second = make_reminder("b", 1)
+    second.user_id = "U2"
+    
+    agent._deliver_reminders([make_reminder("a", 0), second])
+    
+    users = agent.usage_tracker.aggregates('user')
+    assert (users['U1']['prompt_tokens'], users['U2']['prompt_tokens']) == (20, 20)
+    assert agent.usage_tracker.aggregates('route')['reminder_format_batch']['calls'] == 1
@@ -0,0 +1,124 @@
+import pytest
+from functools import partial
+from datetime import datetime
+from unittest.mock import MagicMock
+from reminder_index import PendingReminderIndex
+
+@pytest.fixture
+def make_reminder(make_reminder):
+    return partial(make_reminder, user_id="U123456", channel_id="C123456", when="2030-01-01T10:00:00")
+
+def test_index_lists_reminders_sorted_by_time(make_reminder):
+    index = PendingReminderIndex()
+    index.add(make_reminder("b", when="2030-01-02T09:00:00"))
+    index.add(make_reminder("a", when="2030-01-01T09:00:00"))
+    index.add(make_reminder("c", user_id="U999"))
+    
+    assert [r.reminder_id for r in index.list_for_user("U123456")] == ["a", "b"]
+    assert len(index) == 3
+    
+    index.remove("a")
+    assert "a" not in index
+    assert [r.reminder_id for r in index.list_for_user("U123456")] == ["b"]
+
+def test_create_and_execute_keep_index_in_sync(reminder_handler):
+    reminder = reminder_handler.create_reminder(
+        user_id="U123456",
+        message="llamar al jefe",
+        channel_id="C123456",
+        reminder_datetime=datetime(2030, 1, 1, 10, 0)
+    )
+    assert reminder_handler.list_user_reminders("U123456") == [reminder]
+    
+    row = MagicMock(
+        reminder_id=reminder.reminder_id,
+        slack_user_id="U123456",
+        title="llamar al jefe",
+        trigger_type="once",
+        trigger_params='{"channel_id": "C123456", "datetime": "2030-01-01T10:00:00"}'
+    )
+    reminder_handler.client.query.return_value.result.return_value = [row]
+    reminder_handler.mark_reminder_as_executed(reminder.reminder_id)
+    
+    assert reminder_handler.list_user_reminders("U123456") == []
+
+def test_cancel_reminder_records_history_row(reminder_handler, make_reminder):
+    reminder_handler.pending_index.add(make_reminder("abc"))
+    
+    cancelled = reminder_handler.cancel_reminder("U123456", "abc")
+    
+    assert cancelled.status == 'cancelled'
+    assert "abc" not in reminder_handler.pending_index
+    table, rows = reminder_handler.client.insert_rows_json.call_args[0]
+    assert table == "test-project.test-dataset.user_reminders_history"
+    assert rows[0]['status'] == 'cancelled'
+
+def test_cancel_reminder_of_other_user_is_ignored(reminder_handler, make_reminder):
+    reminder_handler.pending_index.add(make_reminder("abc"))
+    
+    assert reminder_handler.cancel_reminder("U999", "abc") is None
+    assert "abc" in reminder_handler.pending_index
+    reminder_handler.client.insert_rows_json.assert_not_called()
+
+def test_list_command_skips_model(agent, make_reminder):
+    agent.reminder_handler.list_user_reminders.return_value = [make_reminder("abcdef123")]
+    
+    response = agent.process_message("<@UREBECA> mis recordatorios", "C123456", "U123456")
+    
+    assert "tarea abcdef123" in response
+    assert "2030-01-01 10:00" in response
+    agent.model.generate_content.assert_not_called()
+
+def test_cancel_command_by_position(agent, make_reminder):
+    reminder = make_reminder("abcdef123")
+    agent.reminder_handler.list_user_reminders.return_value = [reminder]
+    agent.reminder_handler.cancel_reminder.return_value = reminder
+    
+    response = agent.process_message("cancela el recordatorio 1", "C123456", "U123456")
+    
+    agent.reminder_handler.cancel_reminder.assert_called_once_with("U123456", "abcdef123", None)
+    assert "Cancelé" in response
+    agent.model.generate_content.assert_not_called()
+
+def test_reminder_mentioning_the_list_is_not_a_command(agent):
+    assert agent._handle_reminder_command("recuérdame revisar mis recordatorios mañana", "U123456") is None
+    agent.reminder_handler.list_user_reminders.assert_not_called()
+
+def test_cancel_requires_position_or_id_prefix(agent, make_reminder):
+    agent.reminder_handler.list_user_reminders.return_value = [make_reminder("de0a1b2c")]
+    
+    assert agent._handle_reminder_command("cancela el recordatorio de mañana", "U123456") is None
+    assert agent._handle_reminder_command("cancela recordatorio de", "U123456") is None
+    agent.reminder_handler.cancel_reminder.assert_not_called()
+    
+    agent._handle_reminder_command("cancela recordatorio de0a1b", "U123456")
+    agent.reminder_handler.cancel_reminder.assert_called_once_with("U123456", "de0a1b2c", None)
+
+def test_reminder_is_slotted_and_interns_ids(make_reminder):
+    first = make_reminder("a", user_id="".join(["U", "123"]))
+    second = make_reminder("b", user_id="".join(["U", "123"]))
+    
+    assert not hasattr(first, '__dict__')
+    assert first.user_id is second.user_id
+    assert first.channel_id is second.channel_id
+
+def test_replace_all_accepts_generator_and_duplicates(make_reminder):
+    index = PendingReminderIndex()
+    index.add(make_reminder("viejo"))
+    
+    index.replace_all(make_reminder(reminder_id) for reminder_id in ("a", "b", "a"))
+    
+    assert sorted(r.reminder_id for r in index.all()) == ["a", "b"]
+    assert "viejo" not in index
+
+def test_mark_executed_uses_index_without_query(reminder_handler):
+    reminder = reminder_handler.create_reminder("U123456", "pagar", "C123456", datetime(2030, 1, 1, 10, 0))
+    reminder_handler.client.query.reset_mock()
+    
+    reminder_handler.mark_reminder_as_executed(reminder.reminder_id)
+    
+    reminder_handler.client.query.assert_not_called()
+    table, rows = reminder_handler.client.insert_rows_json.call_args[0]
+    assert rows[0]['status'] == 'executed'
+    assert rows[0]['title'] == "pagar"
+    assert reminder_handler.is_closed(reminder.reminder_id)
@@ -0,0 +1,243 @@
+import json
+import time
+import threading
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+import pytz
+from reminder_handler import ReminderHandler
+from scheduled_reminders import SlackReminderOffloader
+
+class FakeSlack:
+    def __init__(self):
+        self.scheduled = {}
+        self.fail_schedule = False
+        self.fail_delete = False
+        self.posted = set()
+        self.history_ok = True
+
+    def schedule_message(self, channel_id, message, post_at, team_id=None, blocks=None):
+        if self.fail_schedule:
+            return None
+        scheduled_id = f"Q{len(self.scheduled) + 1}"
+        self.scheduled[scheduled_id] = {'channel': channel_id, 'text': message, 'post_at': post_at}
+        return channel_id, scheduled_id
+
+    def delete_scheduled_message(self, channel_id, scheduled_message_id, team_id=None):
+        if self.fail_delete:
+            return False
+        return self.scheduled.pop(scheduled_message_id, None) is not None
+
+    def list_scheduled_messages(self, team_id=None):
+        return {scheduled_id: item['post_at'] for scheduled_id, item in self.scheduled.items()}
+
+    def scheduled_message_posted(self, channel_id, reminder_id, post_at, team_id=None):
+        return reminder_id in self.posted if self.history_ok else None
+
+    def publish(self, reminder):
+        # Slack publica el mensaje: sale de la lista y aparece en el canal
+        del self.scheduled[reminder.scheduled_message_id]
+        self.posted.add(reminder.reminder_id)
+
+def local_in(**delta):
+    return (datetime.now(pytz.timezone('America/Mexico_City')) + timedelta(**delta)).replace(tzinfo=None, microsecond=0)
+
+def model_text(text):
+    return MagicMock(parts=[MagicMock(text=text)])
+
+@pytest.fixture
+def slack():
+    return FakeSlack()
+
+@pytest.fixture
+def handler(reminder_handler):
+    return reminder_handler
+
+@pytest.fixture
+def offloader(slack):
+    render = lambda reminders: [(r.channel_id, f":bell: {r.message}", None) for r in reminders]
+    return SlackReminderOffloader(slack, render, enabled=True, min_lead_seconds=300, reconcile_interval=300)
+
+def test_reminder_is_scheduled_before_it_is_saved(handler, offloader, slack):
+    reminder = handler.create_reminder("U1", "pagar", "C1", local_in(hours=2))
+    assert reminder.scheduled_message_id is None
+
+    reminder, = handler.create_reminders("U1", [("pagar", local_in(hours=2))], "C1", offloader=offloader)
+
+    assert reminder.scheduled_message_id in slack.scheduled
+    assert slack.scheduled[reminder.scheduled_message_id]['text'] == ":bell: pagar"
+    row = handler.client.insert_rows_json.call_args[0][1][0]
+    params = json.loads(row['trigger_params'])
+    assert params['scheduled_message_id'] == reminder.scheduled_message_id
+    assert params['scheduled_channel'] == "C1"
+
+def test_near_and_rejected_reminders_stay_in_polling(handler, offloader, slack):
+    near, = handler.create_reminders("U1", [("ya", local_in(seconds=20))], "C1", offloader=offloader)
+    slack.fail_schedule = True
+    rejected, = handler.create_reminders("U1", [("luego", local_in(hours=1))], "C1", offloader=offloader)
+
+    assert near.scheduled_message_id is None
+    assert rejected.scheduled_message_id is None
+    assert slack.scheduled == {}
+
+def test_polling_skips_offloaded_reminders(handler, offloader):
+    offloaded, = handler.create_reminders("U1", [("slack", local_in(hours=1))], "C1", offloader=offloader)
+    polled = handler.create_reminder("U1", "local", "C1", local_in(seconds=10))
+    handler._watermark = datetime.now(pytz.utc)
+    offloaded.datetime = local_in(seconds=10).isoformat()
+
+    due = handler.get_pending_reminders()
+
+    assert [r.reminder_id for r in due] == [polled.reminder_id]
+
+def test_failed_save_deletes_scheduled_messages(handler, offloader, slack):
+    handler.writer.write = MagicMock(side_effect=Exception("bigquery caído"))
+
+    with pytest.raises(Exception):
+        handler.create_reminders("U1", [("pagar", local_in(hours=2))], "C1", offloader=offloader)
+    assert slack.scheduled == {}
+
+def test_reconcile_marks_delivered_and_returns_lost_to_polling(handler, offloader, slack):
+    delivered, lost, waiting = handler.create_reminders(
+        "U1", [("a", local_in(hours=1)), ("b", local_in(hours=2)), ("c", local_in(hours=3))], "C1", offloader=offloader
+    )
+    # Slack publicó el primero y descartó el segundo antes de tiempo
+    slack.publish(delivered)
+    del slack.scheduled[lost.scheduled_message_id]
+    now = datetime.now(pytz.utc) + timedelta(minutes=90)
+
+    assert offloader.reconcile(handler.pending_index.all(), now=now) == ([delivered.reminder_id], [lost])
+    # Dentro del intervalo no se vuelve a consultar a Slack
+    assert offloader.reconcile(handler.pending_index.all(), now=now) == ([], [])
+
+def test_past_due_reminder_is_delivered_only_if_seen_in_channel(handler, offloader, slack):
+    reminder, = handler.create_reminders("U1", [("a", local_in(hours=1))], "C1", offloader=offloader)
+    del slack.scheduled[reminder.scheduled_message_id]
+    later = datetime.now(pytz.utc) + timedelta(hours=2)
+
+    slack.history_ok = False
+    assert offloader.reconcile(handler.pending_index.all(), now=later, force=True) == ([], [])
+    slack.history_ok = True
+    assert offloader.reconcile(handler.pending_index.all(), now=later, force=True) == ([], [reminder])
+
+def test_reconcile_ignores_list_failures(handler, offloader, slack):
+    reminder, = handler.create_reminders("U1", [("a", local_in(hours=1))], "C1", offloader=offloader)
+    slack.list_scheduled_messages = lambda team_id=None: None
+
+    assert offloader.reconcile(handler.pending_index.all(), now=datetime.now(pytz.utc) + timedelta(hours=2)) == ([], [])
+    assert reminder.scheduled_message_id is not None
+
+def test_pending_row_keeps_scheduled_message(handler):
+    row = MagicMock(
+        reminder_id="r1", slack_user_id="U1", title="pagar", trigger_type="once", status="pending",
+        created_at=None, channel_id="D1", reminder_datetime="2030-01-01T10:00:00", timezone=None, team_id=None,
+        scheduled_message_id="Q123", scheduled_channel="D1"
+    )
+
+    reminder = handler._pending_row_to_reminder(row)
+
+    assert (reminder.scheduled_channel, reminder.scheduled_message_id) == ("D1", "Q123")
+
+@pytest.fixture
+def agent(monkeypatch, make_agent, handler, slack):
+    monkeypatch.setenv('REMINDER_SLACK_SCHEDULE', '1')
+    agent = make_agent(reminder_handler=handler)
+    agent.slack_offloader.slack_handler = slack
+    agent.timezone_resolver.get_timezone = MagicMock(return_value='America/Mexico_City')
+    return agent
+
+def test_agent_schedules_rendered_notification(agent, slack):
+    when = local_in(days=1).strftime("%Y-%m-%d %H:%M")
+    agent.model.generate_content.side_effect = [
+        model_text(json.dumps({'is_reminder': True, 'reminders': [{'datetime': when, 'description': 'pagar'}]})),
+        model_text(":moneybag: > pagar"),
+        model_text("Listo")
+    ]
+
+    assert agent.process_message("recuérdame pagar mañana", "C1", "U1") == "Listo"
+
+    scheduled, = slack.scheduled.values()
+    assert scheduled['text'] == ":moneybag: > pagar"
+
+def test_cancel_deletes_scheduled_message(agent, slack):
+    reminder, = agent.reminder_handler.create_reminders(
+        "U1", [("pagar", local_in(days=1))], "C1", offloader=agent.slack_offloader
+    )
+    slack.fail_delete = True
+
+    assert agent.process_message("cancela recordatorio 1", "C1", "U1").startswith(":warning:")
+    assert agent.reminder_handler.list_user_reminders("U1") == [reminder]
+
+    slack.fail_delete = False
+    assert agent.process_message("cancela recordatorio 1", "C1", "U1").startswith(":wastebasket:")
+    assert slack.scheduled == {}
+    assert agent.reminder_handler.list_user_reminders("U1") == []
+
+def test_failed_cancel_write_reschedules_reminder(agent, slack):
+    reminder, = agent.reminder_handler.create_reminders(
+        "U1", [("pagar", local_in(days=1))], "C1", offloader=agent.slack_offloader
+    )
+    agent.model.generate_content.return_value = model_text(":moneybag: pagar")
+    agent.reminder_handler.writer.write = MagicMock(side_effect=Exception("bigquery caído"))
+    
+    response = agent.process_message("cancela recordatorio 1", "C1", "U1")
+    
+    assert response.startswith(":warning:") and "sigue activo" in response
+    assert agent.reminder_handler.list_user_reminders("U1") == [reminder]
+    assert reminder.scheduled_message_id in slack.scheduled
+    assert not agent.reminder_handler.is_closed(reminder.reminder_id)
+
+def test_agent_reconcile_records_delivered_reminders(agent, slack):
+    reminder, = agent.reminder_handler.create_reminders(
+        "U1", [("pagar", local_in(hours=1))], "C1", offloader=agent.slack_offloader
+    )
+    slack.publish(reminder)
+    reminder.datetime = local_in(minutes=-1).isoformat()
+
+    assert agent.reconcile_scheduled_reminders(force=True) == [reminder.reminder_id]
+    assert agent.reminder_handler.is_closed(reminder.reminder_id)
+    history = agent.reminder_handler.client.insert_rows_json.call_args[0][1]
+    assert history[0]['status'] == 'executed'
+
+def test_concurrent_reconciles_record_delivery_once(agent, slack):
+    reminder, = agent.reminder_handler.create_reminders(
+        "U1", [("pagar", local_in(hours=1))], "C1", offloader=agent.slack_offloader
+    )
+    slack.publish(reminder)
+    reminder.datetime = local_in(minutes=-1).isoformat()
+    posted = slack.scheduled_message_posted
+    # Slack tarda en responder: el arranque y el ciclo de monitoreo se traslapan
+    slack.scheduled_message_posted = lambda *args, **kwargs: time.sleep(0.1) or posted(*args, **kwargs)
+    agent.reminder_handler.client.insert_rows_json.reset_mock()
+    
+    threads = [threading.Thread(target=agent.reconcile_scheduled_reminders, kwargs={'force': True}) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    
+    executed = [
+        row for call in agent.reminder_handler.client.insert_rows_json.call_args_list
+        for row in call[0][1] if row['status'] == 'executed'
+    ]
+    assert [row['reminder_id'] for row in executed] == [reminder.reminder_id]
+
+def test_lost_reminder_is_persisted_and_survives_reload(agent, slack):
+    handler = agent.reminder_handler
+    reminder, = handler.create_reminders("U1", [("pagar", local_in(hours=1))], "C1", offloader=agent.slack_offloader)
+    scheduled_id = reminder.scheduled_message_id
+    del slack.scheduled[scheduled_id]
+
+    assert agent.reconcile_scheduled_reminders(force=True) == []
+
+    history = handler.client.insert_rows_json.call_args[0][1]
+    assert [row['status'] for row in history] == ['unscheduled']
+    assert reminder.scheduled_message_id is None
+    # Otra réplica (o un reinicio) lee la fila original con el scheduled_message_id y la fila del historial
+    other = ReminderHandler('test-project', 'test-dataset', client=handler.client)
+    row = MagicMock(
+        reminder_id=reminder.reminder_id, slack_user_id="U1", title="pagar", trigger_type="once", status="pending",
+        created_at=None, channel_id="C1", reminder_datetime=reminder.datetime, timezone=None, team_id=None,
+        scheduled_message_id=scheduled_id, scheduled_channel="C1", unscheduled=True
+    )
+    assert other._pending_row_to_reminder(row).scheduled_message_id is None
@@ -0,0 +1,95 @@
+import pytest
+from functools import partial
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+import pytz
+from scheduler_snapshot import SchedulerSnapshot
+from reminder_actions import build_reminder_blocks
+
+@pytest.fixture(autouse=True)
+def snapshot_path(tmp_path, monkeypatch):
+    monkeypatch.setenv('REMINDER_SNAPSHOT_PATH', str(tmp_path / 'snapshot.json.gz'))
+
+@pytest.fixture
+def make_reminder(make_reminder):
+    return partial(make_reminder, user_id="U123456", channel_id="C123456")
+
+def test_snapshot_round_trip(tmp_path, make_reminder):
+    snapshot = SchedulerSnapshot(str(tmp_path / 'state' / 'snapshot.json.gz'))
+    reminder = make_reminder("abc", datetime(2030, 1, 1, 10, 0), timezone='Europe/Madrid')
+    
+    assert snapshot.save([reminder]) == 1
+    rows = snapshot.load()
+    
+    assert rows == [{
+        'reminder_id': 'abc',
+        'user_id': 'U123456',
+        'channel_id': 'C123456',
+        'message': 'tarea abc',
+        'datetime': '2030-01-01T10:00:00',
+        'timezone': 'Europe/Madrid',
+        'reminder_type': 'once',
+        'team_id': None,
+        'scheduled_message_id': None,
+        'scheduled_channel': None
+    }]
+
+def test_missing_snapshot_loads_nothing(tmp_path):
+    assert SchedulerSnapshot(str(tmp_path / 'nada.json.gz')).load() == []
+
+def test_handler_restores_snapshot_and_finds_overdue(reminder_handler, make_reminder):
+    now = datetime.now(pytz.timezone('America/Mexico_City')).replace(tzinfo=None)
+    reminder_handler.pending_index.add(make_reminder("vencido", now - timedelta(minutes=5)))
+    reminder_handler.pending_index.add(make_reminder("antiguo", now - timedelta(days=2)))
+    reminder_handler.pending_index.add(make_reminder("futuro", now + timedelta(hours=1)))
+    reminder_handler.save_snapshot()
+    
+    reminder_handler.pending_index.replace_all([])
+    assert reminder_handler.load_snapshot() == 3
+    
+    overdue = reminder_handler.get_overdue_reminders()
+    assert [r.reminder_id for r in overdue] == ["vencido"]
+
+def test_reconcile_keeps_reminders_created_during_query(reminder_handler):
+    def slow_query(*args, **kwargs):
+        reminder_handler.create_reminder("U1", "nuevo", "C1", datetime(2030, 1, 1, 10, 0))
+        job = MagicMock()
+        job.result.return_value = []
+        return job
+    reminder_handler.client.query.side_effect = slow_query
+    
+    reminder_handler.load_pending_index()
+    
+    assert [r.message for r in reminder_handler.list_user_reminders("U1")] == ["nuevo"]
+
+@pytest.fixture
+def agent(make_agent):
+    agent = make_agent()
+    agent.model.generate_content.return_value = MagicMock(parts=[MagicMock(text="¡Recordatorio!")])
+    agent.reminder_handler.is_closed.return_value = False
+    return agent
+
+def test_warm_start_fires_overdue_after_reconciling(agent, make_reminder):
+    reminder = make_reminder("vencido", datetime(2030, 1, 1, 10, 0))
+    calls = []
+    agent.reminder_handler.load_pending_index.side_effect = lambda: calls.append('load')
+    agent.reminder_handler.get_overdue_reminders.side_effect = lambda: calls.append('overdue') or [reminder]
+    
+    agent.warm_start().join(2)
+    
+    agent.reminder_handler.load_snapshot.assert_called_once()
+    # Un recordatorio cancelado después del snapshot no se dispara: primero se carga BigQuery
+    assert calls == ['load', 'overdue']
+    agent.slack_handler.send_message.assert_called_once_with(
+        channel_id="C123456", message="¡Recordatorio!", team_id=None,
+        blocks=build_reminder_blocks("¡Recordatorio!", "vencido")
+    )
+    agent.reminder_handler.mark_reminder_as_executed.assert_called_once_with("vencido")
+
+def test_closed_reminders_are_not_sent_twice(agent, make_reminder):
+    agent.reminder_handler.is_closed.return_value = True
+    agent.reminder_handler.get_pending_reminders.return_value = [make_reminder("x", datetime(2030, 1, 1))]
+    
+    agent.check_reminders()
+    
+    agent.slack_handler.send_message.assert_not_called()
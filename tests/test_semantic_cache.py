@@ -0,0 +1,97 @@
+import pytest
+from unittest.mock import patch
+
+np = pytest.importorskip("numpy")
+
+import semantic_cache
+from gemini_scheduler import GeminiScheduler
+from semantic_cache import GeminiEmbedder, HashingEmbedder, SemanticCache, is_cacheable, normalize_question
+
+def make_cache(tmp_path, **kwargs):
+    options = dict(embedder=HashingEmbedder(), capacity=3, threshold=0.8, path=str(tmp_path / 'cache.npz'))
+    options.update(kwargs)
+    return SemanticCache(**options)
+
+def test_normalize_question():
+    assert normalize_question("<@U123> ¿Cuál es el HORARIO?") == "cual es el horario"
+
+def test_hashing_embedder_is_deterministic():
+    embedder = HashingEmbedder(dimensions=64)
+    
+    assert np.array_equal(embedder.embed("hola mundo"), embedder.embed("Hola, mundo!"))
+    assert not np.array_equal(embedder.embed("hola mundo"), embedder.embed("adiós"))
+
+def test_returns_answer_for_similar_question(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.store("¿Cuál es el horario de la tienda?", "De 7 a 22 h")
+    
+    assert cache.lookup("cual es el horario de la tienda") == "De 7 a 22 h"
+    assert cache.lookup("¿Cómo solicito vacaciones?") is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+def test_answers_are_scoped_by_workspace(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.store("horario de la tienda", "De 7 a 22 h", scope="T1")
+    
+    assert cache.lookup("horario de la tienda", scope="T2") is None
+    assert cache.lookup("horario de la tienda") is None
+    assert cache.lookup("horario de la tienda", scope="T1") == "De 7 a 22 h"
+
+def test_time_and_identity_questions_are_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+    
+    for question in ("¿Qué hora es?", "¿qué tengo hoy?", "¿Quién soy yo?"):
+        assert not is_cacheable(question)
+        cache.store(question, "respuesta")
+    assert cache.stats()['entries'] == 0
+    assert is_cacheable("¿Cuál es el horario de la tienda?")
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = make_cache(tmp_path, capacity=2)
+    cache.store("horario de la tienda", "horario")
+    cache.store("politica de vacaciones", "vacaciones")
+    cache.lookup("horario de la tienda")
+    cache.store("telefono de soporte", "soporte")
+    
+    assert cache.lookup("horario de la tienda") == "horario"
+    assert cache.lookup("politica de vacaciones") is None
+    assert cache.stats()['entries'] == 2
+
+def test_expired_answers_are_ignored(tmp_path):
+    cache = make_cache(tmp_path, ttl_seconds=1)
+    cache.store("horario de la tienda", "horario")
+    cache._stored_at[0] -= 5
+    
+    assert cache.lookup("horario de la tienda") is None
+
+def test_persists_to_disk(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.store("horario de la tienda", "De 7 a 22 h", scope="T1")
+    assert cache.save() == 1
+    
+    restored = make_cache(tmp_path)
+    assert restored.load() == 1
+    assert restored.lookup("horario de la tienda", scope="T1") == "De 7 a 22 h"
+    assert restored.lookup("horario de la tienda", scope="T2") is None
+
+def test_disabled_cache_never_embeds(tmp_path):
+    class FailingEmbedder:
+        def embed(self, text):
+            raise AssertionError("no debería calcular embeddings")
+    
+    cache = make_cache(tmp_path, embedder=FailingEmbedder(), capacity=0)
+    cache.store("horario", "respuesta")
+    
+    assert cache.lookup("horario") is None
+    assert cache.save() == 0
+
+def test_gemini_embeddings_go_through_the_quota_scheduler(monkeypatch):
+    scheduler = GeminiScheduler(rpm=0, tpm=0)
+    monkeypatch.setattr(semantic_cache, 'get_gemini_scheduler', lambda: scheduler)
+    with patch('google.generativeai.embed_content', return_value={'embedding': [0.1, 0.2]}) as embed_content:
+        vector = GeminiEmbedder(model='models/prueba').embed("¿cuál es el horario?")
+    
+    assert vector.tolist() == pytest.approx([0.1, 0.2])
+    embed_content.assert_called_once()
+    assert scheduler.stats()['classes']['interactive']['calls'] == 1
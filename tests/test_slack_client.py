@@ -0,0 +1,111 @@
+import json
+import inspect
+import threading
+import pytest
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+from slack_sdk.http_retry.builtin_handlers import RateLimitErrorRetryHandler
+from slack_sdk.web.base_client import BaseClient
+from slack_bolt.context.context import BoltContext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import slack_client
+from slack_client import PooledWebClient, get_slack_client, pooled_request_client
+
+class FakeSlackApi(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests += 1
+        if self.server.rate_limited > 0:
+            self.server.rate_limited -= 1
+            body = json.dumps({"ok": False, "error": "ratelimited"}).encode()
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        body = json.dumps({"ok": True, "channel": "C1", "auth": self.headers.get('Authorization')}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture(autouse=True)
+def fresh_pools(monkeypatch):
+    monkeypatch.setattr(slack_client, "_shared_pools", {})
+    monkeypatch.setattr(slack_client, "_team_clients", {})
+
+@pytest.fixture
+def slack_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSlackApi)
+    server.requests = 0
+    server.rate_limited = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def fake_slack(slack_server):
+    return f"http://127.0.0.1:{slack_server.server_address[1]}/api/"
+
+def test_requests_reuse_pooled_connections(fake_slack):
+    client = PooledWebClient(token="xoxb-test", base_url=fake_slack, pool_size=2)
+    
+    for _ in range(5):
+        response = client.chat_postMessage(channel="C1", text="hola")
+        assert response["ok"]
+        assert response["auth"] == "Bearer xoxb-test"
+    
+    stats = client.connection_stats()
+    assert stats["requests"] == 5
+    assert stats["connections_opened"] == 1
+    assert stats["connections_reused"] == 4
+
+def test_shared_client_is_a_singleton(monkeypatch):
+    monkeypatch.setattr(slack_client, "_shared_client", None)
+    monkeypatch.setenv("SLACK_BOT_TOKEN", "xoxb-test")
+    
+    assert get_slack_client() is get_slack_client()
+
+def test_slack_sdk_still_exposes_the_http_hook():
+    # PooledWebClient sustituye este método interno: si slack_sdk lo renombra, el pool deja de usarse
+    hook = BaseClient._perform_urllib_http_request_internal
+    
+    assert list(inspect.signature(hook).parameters) == ["self", "url", "req"]
+    assert "_perform_urllib_http_request_internal" in inspect.getsource(BaseClient._perform_urllib_http_request)
+
+def test_bolt_request_client_is_pooled(fake_slack):
+    # Bolt crea un WebClient por solicitud y la autorización le asigna el token del workspace
+    context = BoltContext({"client": WebClient(token="xoxb-team", base_url=fake_slack, team_id="T1"), "channel_id": "C1"})
+    
+    context["client"] = pooled_request_client(context.client)
+    
+    assert isinstance(context.client, PooledWebClient)
+    assert context.client.default_params == {"team_id": "T1"}
+    assert context.say(text="hola")["auth"] == "Bearer xoxb-team"
+    assert context.client.connection_stats()["requests"] == 1
+
+def test_rate_limit_reaches_sdk_retry_handlers(slack_server, fake_slack):
+    slack_server.rate_limited = 1
+    client = PooledWebClient(token="xoxb-test", base_url=fake_slack, pool_size=2)
+    client.retry_handlers.append(RateLimitErrorRetryHandler(max_retry_count=1))
+    
+    assert client.chat_postMessage(channel="C1", text="hola")["ok"]
+    assert slack_server.requests == 2
+
+def test_rate_limit_without_handler_raises_like_the_sdk(slack_server, fake_slack):
+    slack_server.rate_limited = 1
+    client = PooledWebClient(token="xoxb-test", base_url=fake_slack, pool_size=2)
+    
+    with pytest.raises(SlackApiError) as error:
+        client.chat_postMessage(channel="C1", text="hola")
+    assert error.value.response.status_code == 429
+    assert error.value.response.headers["Retry-After"] == "0"
@@ -0,0 +1,50 @@
+import logging
+from unittest.mock import MagicMock, patch
+from google.cloud import bigquery
+from reminder_handler import ReminderHandler
+from table_partitioning import is_partitioned, migrate_table
+
+def make_table(partitioned=False):
+    table = bigquery.Table("proyecto.rebeca.user_reminders", schema=[
+        bigquery.SchemaField("reminder_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("title", "STRING", mode="NULLABLE"),
+        bigquery.SchemaField("created_at", "TIMESTAMP", mode="REQUIRED")
+    ])
+    if partitioned:
+        table.time_partitioning = bigquery.TimePartitioning(field="created_at")
+    return table
+
+def test_partitioned_table_needs_no_migration():
+    client = MagicMock()
+    client.get_table.return_value = make_table(partitioned=True)
+    
+    assert is_partitioned(client.get_table.return_value)
+    assert migrate_table(client, "proyecto.rebeca.user_reminders", apply=True) == []
+    client.query.assert_not_called()
+
+def test_migration_copies_into_partitioned_table_and_swaps_names():
+    client = MagicMock()
+    client.get_table.return_value = make_table()
+    
+    create, backup, swap = migrate_table(client, "proyecto.rebeca.user_reminders")
+    
+    assert "CREATE TABLE `proyecto.rebeca.user_reminders_particionada`" in create
+    assert "reminder_id STRING NOT NULL" in create
+    assert "title STRING,\n" in create
+    assert "PARTITION BY DATE(created_at)" in create
+    assert "AS SELECT * FROM `proyecto.rebeca.user_reminders`" in create
+    assert backup == "ALTER TABLE `proyecto.rebeca.user_reminders` RENAME TO `user_reminders_sin_particion`"
+    assert swap == "ALTER TABLE `proyecto.rebeca.user_reminders_particionada` RENAME TO `user_reminders`"
+    client.query.assert_not_called()
+    
+    migrate_table(client, "proyecto.rebeca.user_reminders", apply=True)
+    assert [c[0][0] for c in client.query.call_args_list] == [create, backup, swap]
+
+def test_handler_warns_about_unpartitioned_tables(caplog):
+    with patch('reminder_handler.bigquery.Client') as mock:
+        mock.return_value.get_table.return_value = make_table()
+        with caplog.at_level(logging.WARNING, logger='reminder_handler'):
+            ReminderHandler('proyecto', 'rebeca')
+    
+    assert "python table_partitioning.py" in caplog.text
+    mock.return_value.create_table.assert_not_called()
@@ -0,0 +1,79 @@
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from timezone_resolver import TimezoneResolver, DEFAULT_TIMEZONE
+from reminder_handler import ReminderHandler
+import pytz
+
+@pytest.fixture
+def slack_client():
+    client = MagicMock()
+    client.users_info.return_value = {'user': {'id': 'U1', 'tz': 'Europe/Madrid'}}
+    client.users_list.side_effect = [
+        {
+            'members': [{'id': 'U1', 'tz': 'Europe/Madrid'}, {'id': 'B1', 'is_bot': True}],
+            'response_metadata': {'next_cursor': 'abc'}
+        },
+        {
+            'members': [{'id': 'U2', 'tz': 'America/Bogota'}, {'id': 'U3', 'tz': 'Invalid/Zone'}],
+            'response_metadata': {'next_cursor': ''}
+        }
+    ]
+    return client
+
+def test_lookup_is_cached(slack_client):
+    resolver = TimezoneResolver(slack_client)
+    
+    assert resolver.get_timezone('U1') == 'Europe/Madrid'
+    assert resolver.get_timezone('U1') == 'Europe/Madrid'
+    
+    slack_client.users_info.assert_called_once_with(user='U1')
+    assert resolver.stats()['hits'] == 1
+
+def test_warm_up_loads_all_pages(slack_client):
+    resolver = TimezoneResolver(slack_client)
+    
+    assert resolver.warm_up() == 3
+    assert resolver.get_timezone('U2') == 'America/Bogota'
+    assert resolver.get_timezone('U3') == DEFAULT_TIMEZONE
+    
+    for _ in range(1000):
+        resolver.get_timezone('U1')
+    slack_client.users_info.assert_not_called()
+    assert resolver.stats()['hit_rate'] > 0.99
+
+def test_cache_is_keyed_by_workspace_and_bounded(slack_client):
+    resolver = TimezoneResolver(slack_client, capacity=2)
+    
+    resolver.get_timezone('U1', team_id='T1')
+    resolver.get_timezone('U1', team_id='T2')
+    assert slack_client.users_info.call_count == 2
+    
+    resolver.get_timezone('U1', team_id='T1')
+    resolver.get_timezone('U2', team_id='T1')
+    # T2/U1 era la entrada menos usada
+    assert resolver.stats()['entries'] == 2
+    resolver.get_timezone('U1', team_id='T2')
+    assert slack_client.users_info.call_count == 4
+    assert "1 aciertos" in resolver.summary()
+
+def test_slack_error_falls_back_to_default(slack_client):
+    slack_client.users_info.side_effect = Exception("ratelimited")
+    resolver = TimezoneResolver(slack_client)
+    
+    assert resolver.get_timezone('U9') == DEFAULT_TIMEZONE
+    assert resolver.get_timezone('U9') == DEFAULT_TIMEZONE
+    slack_client.users_info.assert_called_once()
+
+def test_reminder_stores_local_time_and_timezone():
+    with patch('reminder_handler.bigquery.Client') as mock:
+        mock.return_value.insert_rows_json.return_value = []
+        mock.return_value.query.return_value.result.return_value = []
+        handler = ReminderHandler('test-project', 'test-dataset')
+    
+    when = pytz.utc.localize(datetime(2030, 1, 1, 15, 0))
+    reminder = handler.create_reminder("U1", "junta", "C1", when, timezone='Europe/Madrid')
+    
+    assert reminder.datetime == "2030-01-01T16:00:00"
+    row = handler.client.insert_rows_json.call_args[0][1][0]
+    assert '"timezone": "Europe/Madrid"' in row['trigger_params']
@@ -0,0 +1,81 @@
+import json
+import threading
+import pytest
+from tracing import Tracer, FileSpanExporter, current_span, print_trace_breakdown
+from message_coalescer import MessageCoalescer
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+    
+    def export(self, spans):
+        self.spans.extend(spans)
+
+def test_nested_spans_share_trace_and_link_parents():
+    exporter = ListExporter()
+    tracer = Tracer(sample_ratio=1.0, exporter=exporter)
+    
+    with tracer.start_span("slack.process_events") as root:
+        with tracer.start_span("gemini.generate_content", route="chat") as child:
+            assert current_span() is child
+    tracer.flush()
+    
+    assert len(root.trace_id) == 32 and len(root.span_id) == 16
+    assert child.trace_id == root.trace_id
+    assert child.parent_id == root.span_id
+    assert [span.name for span in exporter.spans] == ["gemini.generate_content", "slack.process_events"]
+    assert root.traceparent == f"00-{root.trace_id}-{root.span_id}-01"
+
+def test_unsampled_traces_are_not_exported():
+    exporter = ListExporter()
+    tracer = Tracer(sample_ratio=0.0, exporter=exporter)
+    
+    with tracer.start_span("slack.process_events"):
+        pass
+    tracer.flush()
+    
+    assert exporter.spans == []
+
+def test_errors_are_recorded():
+    exporter = ListExporter()
+    tracer = Tracer(sample_ratio=1.0, exporter=exporter)
+    
+    with pytest.raises(ValueError):
+        with tracer.start_span("bigquery.insert_reminder"):
+            raise ValueError("fallo")
+    tracer.flush()
+    
+    assert exporter.spans[0].to_otlp()['status'] == {'code': 2, 'message': 'ValueError: fallo'}
+
+def test_coalescer_keeps_trace_context():
+    tracer = Tracer(sample_ratio=1.0, exporter=ListExporter())
+    seen = []
+    done = threading.Event()
+    
+    def dispatch(events, say):
+        seen.append(current_span())
+        done.set()
+    
+    coalescer = MessageCoalescer(dispatch, window_ms=20)
+    with tracer.start_span("slack.receive_event") as span:
+        coalescer.submit("key", {'text': 'hola'}, None)
+    
+    assert done.wait(1)
+    assert seen == [span]
+
+def test_file_export_and_breakdown(tmp_path, capsys):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(sample_ratio=1.0, exporter=FileSpanExporter(str(path)))
+    
+    with tracer.start_span("reminder.fire", reminder_id="abc") as root:
+        with tracer.start_span("slack.send_message"):
+            pass
+    tracer.flush()
+    
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert {line['traceId'] for line in lines} == {root.trace_id}
+    
+    print_trace_breakdown(str(path), root.trace_id)
+    output = capsys.readouterr().out
+    assert "reminder.fire" in output
+    assert "  slack.send_message" in output
@@ -0,0 +1,84 @@
+import json
+import pytest
+from traffic_recorder import TrafficRecorder, redact_text
+from tracing import Tracer
+import replay
+
+def write_cassette(path, entries):
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+
+@pytest.fixture
+def cassette(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    write_cassette(path, [
+        {'offset': 0.0, 'kind': 'slack_event', 'trace_id': 't1', 'text': 'hola', 'channel': 'D1', 'user': 'U1'},
+        {'offset': 0.1, 'kind': 'gemini', 'trace_id': 't1', 'route': 'intent',
+         'text': '{"is_reminder": false}', 'latency_ms': 20},
+        {'offset': 0.2, 'kind': 'gemini', 'trace_id': 't1', 'route': 'chat', 'text': '¡Hola!', 'latency_ms': 50},
+        {'offset': 1.0, 'kind': 'check_reminders', 'trace_id': 't2', 'reminders': [{
+            'reminder_id': 'r1', 'user_id': 'U1', 'message': 'junta', 'reminder_type': 'once',
+            'channel_id': 'C1', 'datetime': '2024-01-01T10:00:00', 'timezone': 'America/Mexico_City'
+        }]},
+        {'offset': 1.1, 'kind': 'gemini', 'trace_id': 't2', 'route': 'reminder_format',
+         'text': ':bell: junta', 'latency_ms': 30},
+        {'offset': 1.2, 'kind': 'bigquery', 'trace_id': 't2', 'op': 'mark_executed', 'latency_ms': 10},
+    ])
+    return path
+
+def test_replay_reports_latency_and_throughput(cassette):
+    report = replay.replay(str(cassette), speed=100, workers=2)
+    
+    assert report['events'] == 2
+    assert report['errors'] == 0
+    assert report['slack_messages_sent'] == 1
+    assert report['latency_ms']['slack_event']['count'] == 1
+    assert report['latency_ms']['check_reminders']['count'] == 1
+    assert report['throughput_per_sec'] > 0
+
+def test_replay_ignores_cache_and_quota_environment(cassette, monkeypatch):
+    monkeypatch.setenv('SEMANTIC_CACHE_SIZE', '64')
+    monkeypatch.setenv('GEMINI_RPM_LIMIT', '1')
+    monkeypatch.setenv('GEMINI_TPM_LIMIT', '10')
+    
+    agent, _ = replay.build_agent(replay.Cassette.load(str(cassette)), speed=100)
+    
+    assert not agent.semantic_cache.enabled
+    assert (agent.gemini_scheduler.rpm, agent.gemini_scheduler.tpm) == (0, 0)
+
+def test_compare_reports_deltas():
+    base = {'throughput_per_sec': 10.0, 'errors': 0,
+            'latency_ms': {'slack_event': {'count': 5, 'p50': 100.0, 'p95': 200.0, 'p99': 300.0}}}
+    new = {'throughput_per_sec': 12.0, 'errors': 0,
+           'latency_ms': {'slack_event': {'count': 5, 'p50': 50.0, 'p95': 200.0, 'p99': 330.0}}}
+    
+    lines = replay.compare(base, new)
+    
+    assert "(+20.0%)" in lines[0]
+    assert "slack_event p50: 100.0 ms -> 50.0 ms (-50.0%)" in lines
+    assert "slack_event p99: 300.0 ms -> 330.0 ms (+10.0%)" in lines
+
+def test_recorder_redacts_user_text(tmp_path):
+    path = tmp_path / "grabacion.jsonl"
+    recorder = TrafficRecorder(str(path), redact=True)
+    tracer = Tracer()
+    
+    with tracer.start_span("slack.receive_event") as span:
+        recorder.record('slack_event', text="pagar la renta", channel='D1', user='U1')
+        recorder.record('gemini', route='intent',
+                        text='{"is_reminder": true, "datetime": "2030-01-01 10:00", "description": "pagar"}')
+    
+    slack_entry, gemini_entry = [json.loads(line) for line in path.read_text().splitlines()]
+    assert slack_entry['text'] == redact_text("pagar la renta") == "xxxxx xx xxxxx"
+    assert slack_entry['trace_id'] == gemini_entry['trace_id'] == span.trace_id
+    intent = json.loads(gemini_entry['text'])
+    assert intent['description'] == "xxxxx"
+    assert intent['datetime'] == "2030-01-01 10:00"
+
+def test_redact_intent_with_several_reminders():
+    from traffic_recorder import redact_intent_response
+    text = '{"is_reminder": true, "reminders": [{"datetime": "2030-01-01 10:00", "description": "el pago"}]}'
+    
+    intent = json.loads(redact_intent_response(text))
+    
+    assert intent['reminders'][0]['description'] == "xx xxxx"
+    assert intent['reminders'][0]['datetime'] == "2030-01-01 10:00"
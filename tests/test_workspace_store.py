@@ -0,0 +1,90 @@
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+import slack_client
+import workspace_store
+from reminder_handler import ReminderHandler
+from reminder_index import PendingReminderIndex
+from workspace_store import WorkspaceInstallationStore, parse_workspace_tokens
+from slack_handler import event_team_id
+
+@pytest.fixture
+def store(monkeypatch):
+    store = WorkspaceInstallationStore()
+    store.register("T1", "xoxb-tiendas")
+    store.register("T2", "xoxb-logistica")
+    monkeypatch.setattr(workspace_store, "_shared_store", store)
+    monkeypatch.setattr(slack_client, "_team_clients", {})
+    return store
+
+@pytest.fixture
+def make_reminder(make_reminder):
+    return lambda reminder_id, team_id: make_reminder(
+        reminder_id, message="Revisar inventario", channel_id="C1", when=datetime(2030, 1, 1, 10, 0), team_id=team_id
+    )
+
+def test_parse_workspace_tokens():
+    assert parse_workspace_tokens("T1:xoxb-a, T2:xoxb-b") == {"T1": "xoxb-a", "T2": "xoxb-b"}
+    assert parse_workspace_tokens("") == {}
+    with pytest.raises(ValueError):
+        parse_workspace_tokens("T1")
+
+def test_authorize_resolves_bot_identity_once(store):
+    client = MagicMock()
+    client.auth_test.return_value = {"bot_id": "B1", "user_id": "UBOT"}
+    
+    first = store.authorize(None, "T1", MagicMock(), client)
+    second = store.authorize(None, "T1", MagicMock(), client)
+    
+    assert first.bot_token == second.bot_token == "xoxb-tiendas"
+    assert second.bot_user_id == "UBOT"
+    client.auth_test.assert_called_once_with(token="xoxb-tiendas")
+    assert store.authorize(None, "T9", MagicMock(), client) is None
+
+def test_team_clients_share_one_connection_pool(store):
+    tiendas = slack_client.get_slack_client(team_id="T1")
+    logistica = slack_client.get_slack_client(team_id="T2")
+    
+    assert tiendas is slack_client.get_slack_client(team_id="T1")
+    assert tiendas.token == "xoxb-tiendas"
+    assert logistica.token == "xoxb-logistica"
+    assert tiendas._pool is logistica._pool
+
+def test_index_partitions_reminders_by_team(make_reminder):
+    index = PendingReminderIndex()
+    index.add(make_reminder("r1", "T1"))
+    index.add(make_reminder("r2", "T2"))
+    
+    assert [r.reminder_id for r in index.list_for_user("U1", "T1")] == ["r1"]
+    assert [r.reminder_id for r in index.list_for_user("U1", "T2")] == ["r2"]
+    assert index.list_for_user("U1") == []
+
+def test_team_id_round_trips_through_trigger_params(make_reminder):
+    with patch('reminder_handler.bigquery.Client'):
+        handler = ReminderHandler('test-project', 'test-dataset')
+    reminder = make_reminder("r1", "T2")
+    row = MagicMock(
+        slack_user_id="U1", title=reminder.message, trigger_type="once", reminder_id="r1",
+        trigger_params=handler._trigger_params(reminder), status="pending", created_at=None
+    )
+    
+    assert handler._row_to_reminder(row).team_id == "T2"
+    assert '"team_id"' not in handler._trigger_params(make_reminder("r2", None))
+    assert handler.cancel_reminder("U1", "r1", team_id="T1") is None
+
+def test_single_workspace_event_keeps_legacy_reminders(monkeypatch, make_agent, reminder_handler, make_reminder):
+    # Bolt llena context['team_id'] aun sin SLACK_WORKSPACES; los recordatorios anteriores no tienen team_id
+    monkeypatch.setattr(workspace_store, "_shared_store", WorkspaceInstallationStore())
+    agent = make_agent(reminder_handler=reminder_handler)
+    agent.reminder_handler.pending_index.add(make_reminder("legacy", None))
+    event = {'type': 'message', 'channel': 'D1', 'user': 'U1', 'team': 'T123', 'text': 'mis recordatorios'}
+    team_id = event_team_id(event, {'team_id': 'T123'})
+    
+    assert team_id is None
+    assert "Revisar inventario" in agent.process_message("mis recordatorios", "D1", "U1", team_id=team_id)
+    assert agent.process_message("cancela recordatorio 1", "D1", "U1", team_id=team_id).startswith(":wastebasket:")
+    assert agent.reminder_handler.list_user_reminders("U1") == []
+
+def test_multi_workspace_event_uses_team(store):
+    assert event_team_id({'team': 'T2'}, {'team_id': 'T1'}) == "T1"
+    assert event_team_id({'team': 'T2'}, {}) == "T2"
@@ -0,0 +1,112 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+import pytz
+
+DEFAULT_TIMEZONE = 'America/Mexico_City'
+
+
+class TimezoneResolver:
+    """Resuelve la zona horaria de cada usuario desde su perfil de Slack con caché LRU y TTL."""
+
+    def __init__(self, client, ttl_seconds: int = None, default_timezone: str = DEFAULT_TIMEZONE,
+                 client_factory=None, capacity: int = None):
+        self.logger = logging.getLogger(__name__)
+        self.client = client
+        # Con varios workspaces, client_factory(team_id) devuelve el cliente de cada uno
+        self.client_factory = client_factory
+        self.ttl_seconds = ttl_seconds or int(os.getenv('TIMEZONE_CACHE_TTL', '86400'))
+        self.default_timezone = default_timezone
+        # Clave (team_id, user_id): los ids de usuario no son únicos entre workspaces
+        self.capacity = capacity or int(os.getenv('TIMEZONE_CACHE_SIZE', '50000'))
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _client_for(self, team_id=None):
+        if team_id is not None and self.client_factory is not None:
+            return self.client_factory(team_id)
+        return self.client
+
+    def get_timezone(self, user_id: str, team_id: str = None) -> str:
+        if not user_id:
+            return self.default_timezone
+        
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get((team_id, user_id))
+            if cached and cached[1] > now:
+                self.hits += 1
+                self._cache.move_to_end((team_id, user_id))
+                return cached[0]
+            self.misses += 1
+        
+        tz_name = self.default_timezone
+        ttl = self.ttl_seconds
+        try:
+            response = self._client_for(team_id).users_info(user=user_id)
+            tz_name = self._validate(response['user'].get('tz'))
+        except Exception as e:
+            # Reintentar antes si Slack falló, sin consultar en cada mensaje
+            self.logger.error(f"Error al obtener zona horaria de {user_id}: {str(e)}")
+            ttl = min(self.ttl_seconds, 300)
+        
+        self._store(team_id, user_id, tz_name, ttl)
+        return tz_name
+
+    def get_tzinfo(self, user_id: str, team_id: str = None):
+        return pytz.timezone(self.get_timezone(user_id, team_id))
+
+    def warm_up(self, team_id: str = None) -> int:
+        # Precargar la zona horaria de todos los usuarios con users_list paginado
+        loaded = 0
+        cursor = None
+        try:
+            client = self._client_for(team_id)
+            while True:
+                response = client.users_list(limit=200, cursor=cursor)
+                for member in response.get('members', []):
+                    if member.get('deleted') or member.get('is_bot'):
+                        continue
+                    self._store(team_id, member['id'], self._validate(member.get('tz')), self.ttl_seconds)
+                    loaded += 1
+                cursor = response.get('response_metadata', {}).get('next_cursor')
+                if not cursor:
+                    break
+        except Exception as e:
+            self.logger.error(f"Error al precargar zonas horarias: {str(e)}")
+        
+        self.logger.info(f"Zonas horarias precargadas: {loaded} usuarios")
+        return loaded
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (
+            f":earth_americas: Zonas horarias: {stats['entries']}/{self.capacity} usuarios, "
+            f"{stats['hits']} aciertos, {stats['misses']} fallos ({stats['hit_rate']:.0%})"
+        )
+
+    def _store(self, team_id, user_id: str, tz_name: str, ttl: int) -> None:
+        with self._lock:
+            self._cache[(team_id, user_id)] = (tz_name, time.monotonic() + ttl)
+            self._cache.move_to_end((team_id, user_id))
+            while len(self._cache) > self.capacity:
+                self._cache.popitem(last=False)
+
+    def _validate(self, tz_name):
+        if tz_name and tz_name in pytz.all_timezones_set:
+            return tz_name
+        return self.default_timezone
@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import threading
+import functools
+import contextvars
+import urllib.request
+from contextlib import contextmanager
+
+SERVICE_NAME = 'rebeca'
+
+_current_span = contextvars.ContextVar('rebeca_current_span', default=None)
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def _new_id(num_bytes: int) -> str:
+    # Identificadores compatibles con OpenTelemetry / W3C Trace Context (hex, distintos de cero)
+    value = 0
+    while value == 0:
+        value = random.getrandbits(num_bytes * 8)
+    return f"{value:0{num_bytes * 2}x}"
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'sampled',
+                 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, name: str, trace_id: str, parent_id: str, sampled: bool, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_otlp(self) -> dict:
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [
+                {'key': key, 'value': _otlp_value(value)} for key, value in self.attributes.items()
+            ],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 1}
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class FileSpanExporter:
+    """Escribe cada span en formato OTLP/JSON, una línea por span."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans) -> None:
+        lines = "".join(json.dumps(span.to_otlp(), ensure_ascii=False) + "\n" for span in spans)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+
+
+class OtlpHttpSpanExporter:
+    """Envía spans a un colector OpenTelemetry por OTLP/HTTP en formato JSON."""
+
+    def __init__(self, endpoint: str, timeout: int = 5):
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.timeout = timeout
+
+    def export(self, spans) -> None:
+        payload = {
+            'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+                'scopeSpans': [{'scope': {'name': SERVICE_NAME}, 'spans': [span.to_otlp() for span in spans]}]
+            }]
+        }
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class Tracer:
+    """Crea spans muestreados y los exporta en lotes desde un hilo en segundo plano."""
+
+    def __init__(self, sample_ratio: float = 0.0, exporter=None, batch_size: int = 100, flush_interval: float = 5.0):
+        self.logger = logging.getLogger(__name__)
+        self.sample_ratio = sample_ratio
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._condition = threading.Condition()
+        if exporter is not None and sample_ratio > 0:
+            threading.Thread(target=self._export_loop, name="trace-exporter", daemon=True).start()
+
+    @contextmanager
+    def start_span(self, name: str, **attributes):
+        parent = _current_span.get()
+        if parent is None:
+            trace_id = _new_id(16)
+            sampled = self.sample_ratio > 0 and random.random() < self.sample_ratio
+        else:
+            trace_id = parent.trace_id
+            sampled = parent.sampled
+        span = Span(name, trace_id, parent.span_id if parent else None, sampled, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            if sampled and self.exporter is not None:
+                with self._condition:
+                    self._buffer.append(span)
+                    if len(self._buffer) >= self.batch_size:
+                        self._condition.notify()
+
+    def flush(self) -> None:
+        with self._condition:
+            spans, self._buffer = self._buffer, []
+        if spans and self.exporter is not None:
+            try:
+                self.exporter.export(spans)
+            except Exception as e:
+                self.logger.error(f"Error al exportar trazas: {str(e)}")
+
+    def _export_loop(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait(self.flush_interval)
+            self.flush()
+
+
+def get_tracer() -> Tracer:
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            sample_ratio = float(os.getenv('TRACE_SAMPLE_RATIO', '0'))
+            endpoint = os.getenv('TRACE_OTLP_ENDPOINT')
+            if endpoint:
+                exporter = OtlpHttpSpanExporter(endpoint)
+            else:
+                exporter = FileSpanExporter(os.getenv('TRACE_EXPORT_PATH', 'data/traces.jsonl'))
+            _tracer = Tracer(sample_ratio=sample_ratio, exporter=exporter if sample_ratio > 0 else None)
+        return _tracer
+
+
+def start_span(name: str, **attributes):
+    return get_tracer().start_span(name, **attributes)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def traced(name: str):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with start_span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def print_trace_breakdown(path: str, trace_id: str = None) -> None:
+    # Mostrar el árbol de spans con la latencia de cada salto
+    spans = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            span = json.loads(line)
+            if trace_id is None or span['traceId'] == trace_id:
+                spans.append(span)
+    
+    children = {}
+    for span in spans:
+        children.setdefault(span.get('parentSpanId'), []).append(span)
+    span_ids = {span['spanId'] for span in spans}
+    roots = [span for span in spans if span.get('parentSpanId') not in span_ids]
+    
+    def show(span, depth):
+        duration_ms = (int(span['endTimeUnixNano']) - int(span['startTimeUnixNano'])) / 1e6
+        status = ' ERROR' if span['status']['code'] == 2 else ''
+        print(f"{'  ' * depth}{span['name']}: {duration_ms:.1f} ms{status}")
+        for child in sorted(children.get(span['spanId'], []), key=lambda s: int(s['startTimeUnixNano'])):
+            show(child, depth + 1)
+    
+    for root in sorted(roots, key=lambda s: int(s['startTimeUnixNano'])):
+        print(f"traza {root['traceId']}")
+        show(root, 1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python tracing.py <traces.jsonl> [trace_id]")
+        sys.exit(1)
+    print_trace_breakdown(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
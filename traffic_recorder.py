@@ -0,0 +1,119 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+import functools
+from tracing import current_span
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+# Campos con texto de usuarios que se ocultan cuando la redacción está activa
+REDACTED_FIELDS = ('text', 'message')
+
+
+def redact_text(text: str) -> str:
+    # Conservar la longitud y los espacios para no alterar el tamaño de las solicitudes
+    return re.sub(r'\S', 'x', text or '')
+
+
+def redact_intent_response(text: str) -> str:
+    # En las respuestas de intent solo se oculta la descripción para que el JSON siga siendo válido
+    start_idx = text.find('{')
+    end_idx = text.rfind('}')
+    if start_idx == -1 or end_idx == -1:
+        return redact_text(text)
+    try:
+        result = json.loads(text[start_idx:end_idx + 1])
+    except json.JSONDecodeError:
+        return redact_text(text)
+    if isinstance(result, dict):
+        items = [result] + [item for item in result.get('reminders') or [] if isinstance(item, dict)]
+        for item in items:
+            if isinstance(item.get('description'), str):
+                item['description'] = redact_text(item['description'])
+    return json.dumps(result, ensure_ascii=False)
+
+
+class TrafficRecorder:
+    """Graba eventos de Slack y respuestas de Gemini y BigQuery en un cassette JSONL."""
+
+    def __init__(self, path: str, redact: bool = False):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.redact = redact
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def record(self, kind: str, **data) -> None:
+        span = current_span()
+        entry = {
+            'offset': round(time.monotonic() - self._started, 4),
+            'kind': kind,
+            'trace_id': span.trace_id if span else None
+        }
+        entry.update(data)
+        if self.redact:
+            self._redact(entry)
+        try:
+            line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+            with self._lock:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+        except Exception as e:
+            self.logger.error(f"Error al grabar tráfico: {str(e)}")
+
+    def _redact(self, entry: dict) -> None:
+        if entry['kind'] == 'gemini':
+            if entry.get('route') == 'intent':
+                entry['text'] = redact_intent_response(entry.get('text') or '')
+            else:
+                entry['text'] = redact_text(entry.get('text'))
+            return
+        for field in REDACTED_FIELDS:
+            if isinstance(entry.get(field), str):
+                entry[field] = redact_text(entry[field])
+        for reminder in entry.get('reminders', []):
+            reminder['message'] = redact_text(reminder.get('message'))
+
+
+class NullRecorder:
+    enabled = False
+
+    def record(self, kind: str, **data) -> None:
+        pass
+
+
+def get_recorder():
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            path = os.getenv('REBECA_RECORD_PATH')
+            if path:
+                _recorder = TrafficRecorder(path, redact=os.getenv('REBECA_RECORD_REDACT', '1') == '1')
+            else:
+                _recorder = NullRecorder()
+        return _recorder
+
+
+def recorded_latency(kind: str, op: str):
+    # Grabar la latencia de una operación externa (por ejemplo, BigQuery) para reproducirla
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            recorder = get_recorder()
+            if not recorder.enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                recorder.record(kind, op=op, latency_ms=round((time.perf_counter() - started) * 1000, 2))
+        return wrapper
+    return decorator
@@ -0,0 +1,122 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+from slack_sdk.oauth.installation_store import InstallationStore, Installation, Bot
+from slack_bolt.authorization import AuthorizeResult
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def parse_workspace_tokens(value: str) -> Dict[str, str]:
+    # Formato: "T0001:xoxb-...,T0002:xoxb-..."
+    tokens = {}
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        team_id, separator, token = item.partition(':')
+        if not separator or not team_id.strip() or not token.strip():
+            raise ValueError(f"¡Error! Entrada inválida en SLACK_WORKSPACES: '{item}'")
+        tokens[team_id.strip()] = token.strip()
+    return tokens
+
+
+class WorkspaceInstallationStore(InstallationStore):
+    """Instalaciones del bot por workspace (team_id) guardadas en memoria."""
+
+    def __init__(self):
+        self._logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._bots: Dict[str, Bot] = {}
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self._logger
+
+    def register(self, team_id: str, bot_token: str, bot_id: str = '', bot_user_id: str = '') -> Bot:
+        bot = Bot(
+            team_id=team_id,
+            bot_token=bot_token,
+            bot_id=bot_id,
+            bot_user_id=bot_user_id,
+            installed_at=time.time()
+        )
+        self.save_bot(bot)
+        return bot
+
+    def save(self, installation: Installation) -> None:
+        self.save_bot(installation.to_bot())
+
+    def save_bot(self, bot: Bot) -> None:
+        with self._lock:
+            self._bots[bot.team_id] = bot
+
+    def find_bot(self, *, enterprise_id: Optional[str], team_id: Optional[str],
+                 is_enterprise_install: Optional[bool] = False) -> Optional[Bot]:
+        with self._lock:
+            return self._bots.get(team_id)
+
+    def find_installation(self, *, enterprise_id: Optional[str], team_id: Optional[str],
+                          user_id: Optional[str] = None,
+                          is_enterprise_install: Optional[bool] = False) -> Optional[Installation]:
+        # Solo se guardan tokens de bot
+        return None
+
+    def delete_bot(self, *, enterprise_id: Optional[str], team_id: Optional[str]) -> None:
+        with self._lock:
+            self._bots.pop(team_id, None)
+
+    def bot_token(self, team_id: str) -> Optional[str]:
+        bot = self.find_bot(enterprise_id=None, team_id=team_id)
+        return bot.bot_token if bot else None
+
+    def team_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._bots.keys())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._bots)
+
+    def authorize(self, enterprise_id, team_id, logger, client) -> Optional[AuthorizeResult]:
+        # Función authorize de Bolt: resuelve el token del workspace sin llamar a auth.test en cada evento
+        bot = self.find_bot(enterprise_id=enterprise_id, team_id=team_id)
+        if bot is None:
+            logger.error(f"Workspace {team_id} no instalado")
+            return None
+
+        if not bot.bot_user_id:
+            # La identidad del bot se consulta una sola vez por workspace
+            response = client.auth_test(token=bot.bot_token)
+            bot = self.register(team_id, bot.bot_token, response.get('bot_id', ''), response['user_id'])
+
+        return AuthorizeResult(
+            enterprise_id=enterprise_id,
+            team_id=team_id,
+            bot_token=bot.bot_token,
+            bot_id=bot.bot_id,
+            bot_user_id=bot.bot_user_id
+        )
+
+
+def workspace_team_id(team_id: Optional[str]) -> Optional[str]:
+    # Con un solo workspace los recordatorios se guardan sin team_id, como las filas anteriores a SLACK_WORKSPACES
+    return team_id if len(get_installation_store()) else None
+
+
+def get_installation_store() -> WorkspaceInstallationStore:
+    # Los workspaces se configuran con SLACK_WORKSPACES; vacío significa un solo workspace (SLACK_BOT_TOKEN)
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = WorkspaceInstallationStore()
+            for team_id, token in parse_workspace_tokens(os.getenv('SLACK_WORKSPACES', '')).items():
+                _shared_store.register(team_id, token)
+            if len(_shared_store):
+                logging.getLogger(__name__).info(
+                    f"Workspaces de Slack configurados: {', '.join(_shared_store.team_ids())}"
+                )
+        return _shared_store